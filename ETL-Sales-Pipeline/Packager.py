@@ -2,6 +2,14 @@ import sys
 import subprocess
 import json
 import os
+import re
+import argparse
+import hashlib
+import tempfile
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
 from colorama import init, Fore
 from tStyle import BillingStyle
 
@@ -10,6 +18,20 @@ init(autoreset=True)
 style = BillingStyle()
 PACKAGES_FILE = "new_packages.json"
 COLLECTIONS_FILE = "package_collections.json"
+PYPI_JSON_URL = "https://pypi.org/pypi/{}/json"
+OUTDATED_WORKERS = 16
+WHEELHOUSE_DIR = os.environ.get("PACKAGER_WHEELHOUSE", "wheelhouse")
+LOCK_FILE = os.environ.get("PACKAGER_LOCK_FILE", "packages.lock")
+# Offline mode (PACKAGER_OFFLINE=1 or --offline): installs only come from the wheelhouse
+# and the outdated check compares against the lockfile instead of PyPI
+OFFLINE = os.environ.get("PACKAGER_OFFLINE") == "1"
+
+try:
+    # Ships with pip/setuptools almost everywhere; only needed for version specifiers
+    from packaging.requirements import Requirement, InvalidRequirement
+    from packaging.version import Version, InvalidVersion
+except ImportError:
+    Requirement = None
 
 # -----------------------------
 # Visual Helpers
@@ -42,14 +64,46 @@ def run_pip_command(args):
         print(color_msg(f"Error: {e.stderr}", "red"))
         return None
 
+# Installed distributions read once per session (in-process, no pip subprocess);
+# cleared after every install/upgrade
+_installed_cache = None
+
+def canonical_name(name):
+    # PEP 503: "Foo_Bar", "foo.bar" and "foo-bar" are the same project
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def installed_packages(refresh=False):
+    # {canonical name: version}
+    global _installed_cache
+    if _installed_cache is None or refresh:
+        _installed_cache = {}
+        for dist in metadata.distributions():
+            name = dist.metadata["Name"]
+            # First hit on sys.path wins, like import does (venvs can shadow system packages)
+            if name:
+                _installed_cache.setdefault(canonical_name(name), dist.version)
+    return _installed_cache
+
+def invalidate_installed_cache():
+    global _installed_cache
+    _installed_cache = None
+
 def is_installed(package):
-    output = run_pip_command(["list", "--format=json"])
-    if not output:
-        return False
-    installed_packages = {pkg["name"].lower() for pkg in json.loads(output)}
-    return package.lower() in installed_packages
+    # package may carry extras/version specifiers, e.g. "pandas>=2.0"
+    installed = installed_packages()
+    if Requirement is not None:
+        try:
+            requirement = Requirement(package)
+        except InvalidRequirement:
+            return canonical_name(package) in installed
+        version = installed.get(canonical_name(requirement.name))
+        return version is not None and (not requirement.specifier or requirement.specifier.contains(
+            version, prereleases=True))
+    name = re.match(r"[A-Za-z0-9][A-Za-z0-9._-]*", package.strip())
+    # Without packaging we cannot check specifiers, so let pip decide
+    return bool(name) and name.group(0) == package.strip() and canonical_name(package) in installed
 
-def store_new_package(package):
+def store_new_packages(packages):
     try:
         if os.path.exists(PACKAGES_FILE):
             with open(PACKAGES_FILE, "r", encoding="utf-8") as f:
@@ -57,8 +111,9 @@ def store_new_package(package):
         else:
             data = []
 
-        if package not in data:
-            data.append(package)
+        new = [package for package in packages if package not in data]
+        if new:
+            data.extend(new)
             with open(PACKAGES_FILE, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2)
     except Exception as e:
@@ -85,29 +140,52 @@ def save_collections(collections):
     except Exception as e:
         print(color_msg(f"Error saving collections: {e}", "red"))
 
-def add_to_other_packages(package):
+def add_to_other_packages(packages):
     collections = load_collections()
     if not collections:
         return
     other = collections.get("OTHER PACKAGES", [])
-    if package not in other:
-        other.append(package)
+    # Packages already listed under any role are not "other"
+    known = {pkg for role in collections.values() for pkg in role}
+    new = [package for package in packages if package not in known]
+    if new:
+        other.extend(new)
         collections["OTHER PACKAGES"] = other
         save_collections(collections)
-        print(color_msg(f"{package} added to OTHER PACKAGES collection.", "yellow"))
+        for package in new:
+            print(color_msg(f"{package} added to OTHER PACKAGES collection.", "yellow"))
 
 # -----------------------------
 # Package Management
 # -----------------------------
 def install_packages(packages):
+    packages = list(dict.fromkeys(p.strip() for p in packages if p.strip()))
+    missing = []
     for package in packages:
         if is_installed(package):
             print(color_msg(f"{package} is already installed.", "yellow"))
         else:
-            print(color_msg(f"Installing {package}...", "green"))
-            run_pip_command(["install", package])
-            store_new_package(package)
-            add_to_other_packages(package)
+            missing.append(package)
+    if not missing:
+        return
+
+    # One pip run resolves every missing package together
+    print(color_msg(f"Installing {len(missing)} package(s): {' '.join(missing)}", "green"))
+    install = ["install", "--no-index", "--find-links", WHEELHOUSE_DIR] if OFFLINE else ["install"]
+    if run_pip_command(install + missing) is None and len(missing) > 1:
+        # A single bad name fails the whole batch; retry one by one to install the rest
+        print(color_msg("Batch install failed, retrying packages individually...", "yellow"))
+        for package in missing:
+            run_pip_command(install + [package])
+    invalidate_installed_cache()
+
+    installed = [package for package in missing if is_installed(package)]
+    for package in missing:
+        if package not in installed:
+            print(color_msg(f"Could not install {package}.", "red"))
+    if installed:
+        store_new_packages(installed)
+        add_to_other_packages(installed)
 
 def read_packages_from_file(filename):
     try:
@@ -118,17 +196,46 @@ def read_packages_from_file(filename):
         return []
 
 def show_installed_packages():
-    output = run_pip_command(["list"])
-    if output:
-        print_dashes()
-        print(output)
-        print_dashes()
+    installed = installed_packages(refresh=True)
+    print_dashes()
+    print(f"{'Package':<40}Version")
+    for name, version in sorted(installed.items()):
+        print(f"{name:<40}{version}")
+    print_dashes()
+
+def latest_version(name):
+    # Latest release from the PyPI JSON API; None when offline or unknown
+    try:
+        with urllib.request.urlopen(PYPI_JSON_URL.format(name), timeout=10) as response:
+            return json.load(response)["info"]["version"]
+    except Exception:
+        return None
+
+def is_newer(latest, current):
+    if Requirement is not None:
+        try:
+            return Version(latest) > Version(current)
+        except InvalidVersion:
+            pass
+    return latest != current
+
+def find_outdated_packages():
+    # One request per installed package, run concurrently
+    installed = installed_packages(refresh=True)
+    names = sorted(installed)
+    with ThreadPoolExecutor(max_workers=OUTDATED_WORKERS) as pool:
+        latest = pool.map(latest_version, names)
+    return [
+        {"name": name, "version": installed[name], "latest_version": version}
+        for name, version in zip(names, latest)
+        if version and is_newer(version, installed[name])
+    ]
 
 def check_outdated_packages():
-    output = run_pip_command(["list", "--outdated", "--format=json"])
-    if not output:
+    if OFFLINE:
+        check_lock_drift()
         return
-    outdated = json.loads(output)
+    outdated = find_outdated_packages()
     if not outdated:
         print(color_msg("All packages are up to date.", "green"))
         return
@@ -138,20 +245,137 @@ def check_outdated_packages():
         print(f"{idx}. {pkg['name']} {pkg['version']} -> {pkg['latest_version']}")
 
     choice = input("\nUpdate (a)ll, (s)elect, or (n)one? ").lower()
+    selected = []
     if choice == "a":
-        for pkg in outdated:
-            run_pip_command(["install", "--upgrade", pkg["name"]])
+        selected = [pkg["name"] for pkg in outdated]
     elif choice == "s":
         nums = input("Enter numbers separated by commas: ").split(",")
         for num in nums:
             try:
-                pkg = outdated[int(num) - 1]
-                run_pip_command(["install", "--upgrade", pkg["name"]])
+                selected.append(outdated[int(num) - 1]["name"])
             except (ValueError, IndexError):
                 print(color_msg(f"Invalid selection: {num}", "red"))
+    if selected:
+        # Upgrade everything selected in a single resolver run
+        run_pip_command(["install", "--upgrade"] + selected)
+        invalidate_installed_cache()
     else:
         print(color_msg("No updates performed.", "yellow"))
 
+# -----------------------------
+# Offline Wheelhouse & Lockfile
+# -----------------------------
+# Online once:  build a wheelhouse (wheels for the packages + all dependencies) and a
+#               lockfile pinning name==version --hash=sha256 for each of them.
+# Offline after: copy both to the host and install with --no-index --require-hashes.
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def packages_for_source(source):
+    # A collection role, "ALL" for every collection, or a requirements-style file
+    collections = load_collections() if os.path.exists(COLLECTIONS_FILE) else {}
+    if source == "ALL":
+        return list(dict.fromkeys(sum(collections.values(), [])))
+    if source in collections:
+        return collections[source]
+    return read_packages_from_file(source)
+
+def build_wheelhouse(packages, wheelhouse=None, lock_file=None, source=""):
+    wheelhouse, lock_file = wheelhouse or WHEELHOUSE_DIR, lock_file or LOCK_FILE
+    if not packages:
+        print(color_msg("No packages to lock.", "red"))
+        return None
+    os.makedirs(wheelhouse, exist_ok=True)
+    print(color_msg(f"Building wheels for {len(packages)} package(s) and their dependencies...", "green"))
+    if run_pip_command(["wheel", "--wheel-dir", wheelhouse] + packages) is None:
+        return None
+
+    # Resolve again from the wheelhouse alone, so the lock pins exactly what an offline
+    # install will pick (the wheelhouse may also hold older builds)
+    with tempfile.TemporaryDirectory() as tmp:
+        report_file = os.path.join(tmp, "report.json")
+        resolved = run_pip_command(["install", "--dry-run", "--ignore-installed", "--quiet", "--no-index",
+                                    "--find-links", wheelhouse, "--report", report_file] + packages)
+        if resolved is None:
+            return None
+        with open(report_file, "r", encoding="utf-8") as f:
+            report = json.load(f)
+
+    pins = []
+    for item in report["install"]:
+        path = urllib.request.url2pathname(urllib.parse.urlparse(item["download_info"]["url"]).path)
+        pins.append((canonical_name(item["metadata"]["name"]), item["metadata"]["version"], sha256_file(path)))
+    pins.sort()
+    with open(lock_file, "w", encoding="utf-8") as f:
+        f.write(f"# Generated by Packager.py from {source or ', '.join(packages)}\n")
+        f.write(f"# Install offline with: python Packager.py --install-lock --wheelhouse {wheelhouse}\n")
+        for name, version, digest in pins:
+            f.write(f"{name}=={version} \\\n    --hash=sha256:{digest}\n")
+    print(color_msg(f"Locked {len(pins)} packages in {lock_file}, wheels in {wheelhouse}/", "green"))
+    return pins
+
+def read_lock(lock_file=None):
+    # [(name, version, sha256)] from a lockfile written by build_wheelhouse
+    lock_file = lock_file or LOCK_FILE
+    try:
+        with open(lock_file, "r", encoding="utf-8") as f:
+            text = f.read().replace("\\\n", " ")
+    except FileNotFoundError:
+        print(color_msg(f"Lockfile not found: {lock_file}", "red"))
+        return []
+    pins = []
+    for line in text.splitlines():
+        match = re.match(r"\s*([A-Za-z0-9._-]+)==(\S+)\s+--hash=sha256:([0-9a-f]{64})", line)
+        if match:
+            pins.append((canonical_name(match.group(1)), match.group(2), match.group(3)))
+    return pins
+
+def install_from_lock(lock_file=None, wheelhouse=None):
+    # Network-free, hash-verified install of every pin that is not already present
+    wheelhouse = wheelhouse or WHEELHOUSE_DIR
+    pins = read_lock(lock_file)
+    if not pins:
+        return False
+    installed = installed_packages()
+    todo = [pin for pin in pins if installed.get(pin[0]) != pin[1]]
+    print(color_msg(f"{len(pins) - len(todo)} of {len(pins)} pinned packages already installed.", "yellow"))
+    if not todo:
+        return True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        requirements = os.path.join(tmp, "requirements.txt")
+        with open(requirements, "w", encoding="utf-8") as f:
+            for name, version, digest in todo:
+                f.write(f"{name}=={version} --hash=sha256:{digest}\n")
+        # The lock is the full dependency closure, so --no-deps keeps pip from resolving
+        result = run_pip_command(["install", "--no-index", "--find-links", wheelhouse,
+                                  "--require-hashes", "--no-deps", "-r", requirements])
+    invalidate_installed_cache()
+    if result is None:
+        return False
+    print(color_msg(f"Installed {len(todo)} package(s) from {wheelhouse}/.", "green"))
+    return True
+
+def check_lock_drift(lock_file=None):
+    # Offline stand-in for the outdated check: installed versions that differ from the lock
+    pins = read_lock(lock_file)
+    if not pins:
+        return
+    installed = installed_packages(refresh=True)
+    drift = [(name, installed.get(name), version) for name, version, _ in pins if installed.get(name) != version]
+    if not drift:
+        print(color_msg("All locked packages are installed at their pinned versions.", "green"))
+        return
+    print(color_msg("Packages differing from the lockfile:", "yellow"))
+    for idx, (name, current, pinned) in enumerate(drift, 1):
+        print(f"{idx}. {name} {current or 'not installed'} -> {pinned}")
+    if input("\nInstall pinned versions from the wheelhouse? (y/n): ").lower() == "y":
+        install_from_lock(lock_file)
+
 # -----------------------------
 # Collection Submenu
 # -----------------------------
@@ -219,9 +443,11 @@ def main():
             "Show installed packages",
             "Check for outdated packages & update",
             "Install all predefined packages (caution!)",
+            "Build offline wheelhouse & lockfile",
+            "Install from lockfile (offline)",
             "Exit"
         ])
-        choice = style.get_formatted_input("Choose an option (1-7)", "int")
+        choice = style.get_formatted_input("Choose an option (1-9)", "int")
         if choice == 1:
             style.print_info_message("Enter package names one per line. Press ENTER twice to finish.")
             packages = []
@@ -249,10 +475,34 @@ def main():
             if input("Continue? (y/n): ").lower() == "y":
                 install_packages(all_packages)
         elif choice == 7:
+            source = input("Collection name, ALL, or a package file (e.g. packages.txt): ").strip()
+            build_wheelhouse(packages_for_source(source), source=source)
+        elif choice == 8:
+            install_from_lock()
+        elif choice == 9:
             style.print_info_message("Exiting program. Goodbye!")
             break
         else:
             print(color_msg("Invalid choice. Please try again.", "red"))
 
 if __name__ == "__main__":
-    main()
+    # Non-interactive provisioning, e.g.
+    #   python Packager.py --build-lock "DATA SCIENCE"          (online build host)
+    #   python Packager.py --install-lock                        (offline ETL host)
+    parser = argparse.ArgumentParser(description="Python Package Manager")
+    parser.add_argument("--build-lock", metavar="SOURCE",
+                        help="Collection name, ALL, or a package file to build a wheelhouse + lockfile for")
+    parser.add_argument("--install-lock", action="store_true", help="Install the lockfile from the wheelhouse")
+    parser.add_argument("--wheelhouse", default=WHEELHOUSE_DIR)
+    parser.add_argument("--lock-file", default=LOCK_FILE)
+    parser.add_argument("--offline", action="store_true", help="Never contact a package index")
+    args = parser.parse_args()
+    WHEELHOUSE_DIR, LOCK_FILE = args.wheelhouse, args.lock_file
+    OFFLINE = OFFLINE or args.offline
+    if args.build_lock:
+        sys.exit(0 if build_wheelhouse(packages_for_source(args.build_lock), args.wheelhouse,
+                                       args.lock_file, args.build_lock) else 1)
+    elif args.install_lock:
+        sys.exit(0 if install_from_lock(args.lock_file, args.wheelhouse) else 1)
+    else:
+        main()
@@ -0,0 +1,713 @@
+#BENCHMARKS
+# Reproducible benchmark suite; every run is saved as JSON so runs can be compared.
+# - schema:   old df.to_sql schema (no primary key, no indexes) vs the indexed schema
+# - requests: old pandas-based request path vs plain SQLite rows + the fast JSON encoder
+# - writes:   N concurrent writer processes, old MAX(id)+1 vs rowid allocation
+# - etl:      rows/sec and peak RSS of each load path on synthetic data (sales_datagen.py)
+# - api:      load test of every /sales route against a local server, latency percentiles
+# - startup:  cold start to first request, ETL-at-import vs attaching to an existing sales.db
+# - upsert:   re-delivering an overlapping extract, full reload vs upsert load on the natural key
+# - shards:   one sales table vs per-month shards: load, date-range and full-range pages, compaction
+# Usage: python benchmarks.py [rows] [writers] [--suite etl,api] [--output results.json]
+#                             [--compare previous.json]
+import argparse
+import datetime
+import http.client
+import json
+import platform
+import socket
+import sqlite3
+import subprocess
+import multiprocessing
+import tempfile
+import threading
+import random
+from collections import deque
+import time
+import sys
+import os
+import pandas as pd
+from sales_etl import ensure_schema, to_db_rows, SALES_COLUMNS
+from sales_db import connect, dict_cursor, fetch_sale, insert_sale
+from sales_rollups import apply_sale
+from sales_json import dumps_bytes
+from sales_datagen import generate_sales_csv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUITES = ["schema", "requests", "writes", "etl", "api", "startup", "upsert", "shards"]
+
+PRODUCTS = ["Laptop", "Desk", "Radio", "Projector", "Adapter", "Monitor", "Phone", "Chair"]
+
+
+def print_dashes(count=80):
+    for _ in range(count):
+        print("=", end="")
+    print()
+
+
+def make_sales(rows, seed=42):
+    rng = random.Random(seed)
+    start = pd.Timestamp("2024-01-01")
+    df = pd.DataFrame({
+        "id": range(1, rows + 1),
+        "date": [start + pd.Timedelta(days=rng.randrange(365)) for _ in range(rows)],
+        "customer_id": [rng.randrange(1, 10000) for _ in range(rows)],
+        "product": [rng.choice(PRODUCTS) for _ in range(rows)],
+        "quantity": [rng.randrange(1, 10) for _ in range(rows)],
+        "unit_price": [rng.randrange(50, 20000) for _ in range(rows)],
+    })
+    df["total_price"] = df["quantity"] * df["unit_price"]
+    return df[SALES_COLUMNS]
+
+
+def build_legacy_db(path, df):
+    with sqlite3.connect(path) as conn:
+        df.to_sql("sales", conn, if_exists="replace", index=False)
+
+
+def build_indexed_db(path, df):
+    with sqlite3.connect(path) as conn:
+        ensure_schema(conn)
+        conn.executemany(
+            f"INSERT INTO sales ({', '.join(SALES_COLUMNS)}) VALUES ({', '.join(['?'] * len(SALES_COLUMNS))})",
+            to_db_rows(df),
+        )
+
+
+def time_query(conn, sql, params_list):
+    # Average milliseconds per query over params_list
+    started = time.perf_counter()
+    for params in params_list:
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - started) * 1000 / len(params_list)
+
+
+def run_query_benchmarks(path, rows, repeats=200, seed=7):
+    rng = random.Random(seed)
+    ids = [(rng.randrange(1, rows + 1),) for _ in range(repeats)]
+    customers = [(rng.randrange(1, 10000),) for _ in range(repeats)]
+    days = [(f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 28):02d}",) for _ in range(repeats)]
+    with sqlite3.connect(path) as conn:
+        return {
+            "point lookup by id": time_query(conn, "SELECT * FROM sales WHERE id=?", ids),
+            "filter by customer_id": time_query(conn, "SELECT * FROM sales WHERE customer_id=?", customers),
+            "single-day date range": time_query(
+                conn, "SELECT * FROM sales WHERE date >= ? AND date < date(?, '+1 day')",
+                [d + d for d in days]),
+            "SELECT MAX(id)": time_query(conn, "SELECT MAX(id) FROM sales", [()] * repeats),
+        }
+
+
+def benchmark_schema(rows):
+    df = make_sales(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "legacy.db")
+        indexed = os.path.join(tmp, "indexed.db")
+        build_legacy_db(legacy, df)
+        build_indexed_db(indexed, df)
+        before = run_query_benchmarks(legacy, rows)
+        after = run_query_benchmarks(indexed, rows)
+
+    print_dashes()
+    print(f"Schema benchmark ({rows} rows), average ms per query")
+    print_dashes()
+    print(f"{'query':<25}{'to_sql schema':>18}{'indexed schema':>18}{'speedup':>12}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<25}{before[name]:>18.3f}{after[name]:>18.3f}{speedup:>11.1f}x")
+    print_dashes()
+    return before, after
+
+
+# Modules each API process imported at startup before and after pandas/pyarrow were deferred
+LEGACY_API_IMPORTS = "import flask, pandas, sales_db, sales_cache, sales_rollups, sales_columnar, sales_etl"
+LEAN_API_IMPORTS = "import flask, sales_db, sales_cache, sales_rollups, sales_json"
+
+
+def time_startup(imports, repeats=5):
+    # Best-of wall time (ms) of a fresh interpreter importing the given modules
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", imports], cwd=HERE, check=True)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def time_requests(handler, ids):
+    # Average microseconds per call
+    started = time.perf_counter()
+    for sale_id in ids:
+        handler(sale_id)
+    return (time.perf_counter() - started) * 1e6 / len(ids)
+
+
+def benchmark_request_path(rows, repeats=2000, seed=11):
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+
+    legacy_json = DefaultJSONProvider(Flask(__name__))
+    rng = random.Random(seed)
+    ids = [rng.randrange(1, rows + 1) for _ in range(repeats)]
+    page_sql = "SELECT * FROM sales WHERE id > ? ORDER BY id LIMIT 100"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sales.db")
+        build_indexed_db(path, make_sales(rows))
+        with sqlite3.connect(path) as conn:
+            results = {
+                "GET /sales/<id>": (
+                    time_requests(lambda i: legacy_json.dumps(pd.read_sql(
+                        "SELECT * FROM sales WHERE id=?", conn, params=(i,)).to_dict(orient="records")), ids),
+                    time_requests(lambda i: dumps_bytes([fetch_sale(conn, i)]), ids),
+                ),
+                "GET /sales page of 100": (
+                    time_requests(lambda i: legacy_json.dumps(pd.read_sql(
+                        page_sql, conn, params=(i,)).to_dict(orient="records")), ids[:repeats // 4]),
+                    time_requests(lambda i: dumps_bytes(
+                        dict_cursor(conn).execute(page_sql, (i,)).fetchall()), ids[:repeats // 4]),
+                ),
+            }
+    startup = (time_startup(LEGACY_API_IMPORTS), time_startup(LEAN_API_IMPORTS))
+
+    print_dashes()
+    print(f"Request path benchmark ({rows} rows)")
+    print_dashes()
+    print(f"{'measure':<25}{'pandas path':>18}{'row factory':>18}{'speedup':>12}")
+    for name, (before, after) in results.items():
+        print(f"{name + ' (us)':<25}{before:>18.1f}{after:>18.1f}{before / after:>11.1f}x")
+    print(f"{'worker startup (ms)':<25}{startup[0]:>18.1f}{startup[1]:>18.1f}{startup[0] / startup[1]:>11.1f}x")
+    print_dashes()
+    return results, startup
+
+
+def _insert_worker(task):
+    # One writer process doing POST /sales' work: insert + rollup update per transaction
+    path, count, legacy, seed = task
+    rng = random.Random(seed)
+    conn = connect(path)
+    ids, errors = [], 0
+    for _ in range(count):
+        quantity, unit_price = rng.randrange(1, 10), rng.randrange(50, 20000)
+        sale = {"date": f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 28):02d} 00:00:00",
+                "customer_id": rng.randrange(1, 10000), "product": rng.choice(PRODUCTS),
+                "quantity": quantity, "unit_price": unit_price, "total_price": quantity * unit_price}
+        try:
+            with conn:
+                if legacy:
+                    # Old add_sale: read MAX(id) then insert, no write lock in between
+                    sale["id"] = (conn.execute("SELECT MAX(id) FROM sales").fetchone()[0] or 0) + 1
+                    conn.execute(f"INSERT INTO sales ({', '.join(sale)}) VALUES ({', '.join(['?'] * len(sale))})",
+                                 tuple(sale.values()))
+                else:
+                    sale["id"] = insert_sale(conn, sale)
+                apply_sale(conn, sale)
+            ids.append(sale["id"])
+        except sqlite3.Error:
+            errors += 1
+    conn.close()
+    return ids, errors
+
+
+def run_insert_stress(path, writers, per_writer, legacy):
+    with sqlite3.connect(path) as conn:
+        ensure_schema(conn)
+    tasks = [(path, per_writer, legacy, seed) for seed in range(writers)]
+    started = time.perf_counter()
+    with multiprocessing.Pool(writers) as pool:
+        results = pool.map(_insert_worker, tasks)
+    elapsed = time.perf_counter() - started
+    ids = [sale_id for worker_ids, _ in results for sale_id in worker_ids]
+    with sqlite3.connect(path) as conn:
+        stored = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+    return {
+        "inserted": len(ids),
+        "failed": sum(errors for _, errors in results),
+        "duplicate ids": len(ids) - len(set(ids)),
+        "rows stored": stored,
+        "inserts/s": len(ids) / elapsed,
+    }
+
+
+def benchmark_concurrent_inserts(writers=8, per_writer=500):
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run_insert_stress(os.path.join(tmp, "legacy.db"), writers, per_writer, legacy=True)
+        after = run_insert_stress(os.path.join(tmp, "atomic.db"), writers, per_writer, legacy=False)
+
+    print_dashes()
+    print(f"Concurrent insert stress ({writers} writers x {per_writer} sales)")
+    print_dashes()
+    print(f"{'measure':<25}{'MAX(id)+1':>18}{'rowid RETURNING':>18}")
+    for name in before:
+        print(f"{name:<25}{before[name]:>18,.0f}{after[name]:>18,.0f}")
+    print_dashes()
+    expected = writers * per_writer
+    if after["duplicate ids"] or after["failed"] or after["rows stored"] != expected:
+        raise RuntimeError(f"Atomic id allocation lost or duplicated sales: {after}")
+    return before, after
+
+
+# ------------------ #
+# ETL throughput
+# ------------------ #
+# Each case runs in a fresh interpreter so peak RSS belongs to that load alone.
+# argv: source, db file, workers; prints one JSON line
+# LEGACY_ETL is the original load kept only as a baseline: the whole file in one DataFrame
+# and to_sql(if_exists="replace"), which drops the sales schema. Never use it on a real db.
+LEGACY_ETL = """
+import json, sqlite3, sys, time, pandas as pd, sales_metrics
+from sales_transform import transform_chunk
+started = time.perf_counter()
+clean, rejects = transform_chunk(pd.read_csv(sys.argv[1]))
+with sqlite3.connect(sys.argv[2]) as conn:
+    clean.to_sql("sales", conn, if_exists="replace", index=False)
+print(json.dumps({"seconds": time.perf_counter() - started, "peak_rss_bytes": sales_metrics.peak_rss_bytes()}))
+"""
+STREAMING_ETL = """
+import json, sys, time, sales_etl, sales_metrics
+started = time.perf_counter()
+sales_etl.load_sales(sys.argv[1], sys.argv[2], mode="replace", workers=int(sys.argv[3]))
+print(json.dumps({"seconds": time.perf_counter() - started, "peak_rss_bytes": sales_metrics.peak_rss_bytes(),
+                  "stages": sales_metrics.stage_snapshot()}))
+"""
+LEGACY_MAX_ROWS = 2000000  # the legacy baseline holds the whole file in memory
+
+
+def run_etl_case(code, source, db_file, *args):
+    result = subprocess.run([sys.executable, "-c", code, source, db_file, *map(str, args)],
+                            cwd=HERE, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark_etl(rows, dirty=0.01, seed=42, workers=None):
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        single = generate_sales_csv(os.path.join(tmp, "sales.csv"), rows, dirty, seed)[0]
+        split = os.path.join(tmp, "parts")
+        generate_sales_csv(split, rows, dirty, seed, files=max(2, workers * 2))
+        cases = []
+        if rows <= LEGACY_MAX_ROWS:
+            cases.append(("legacy read_csv + to_sql", LEGACY_ETL, single, 1))
+        cases.append(("streaming load", STREAMING_ETL, single, 1))
+        cases.append((f"parallel load ({workers} workers)", STREAMING_ETL, split, workers))
+        for name, code, source, case_workers in cases:
+            db_file = os.path.join(tmp, f"{len(results)}.db")
+            result = run_etl_case(code, source, db_file, case_workers)
+            result["rows_per_sec"] = rows / result["seconds"]
+            results[name] = result
+
+    print_dashes()
+    print(f"ETL throughput ({rows} rows, {dirty:.1%} dirty)")
+    print_dashes()
+    print(f"{'load path':<35}{'seconds':>10}{'rows/sec':>14}{'peak RSS MB':>14}")
+    for name, result in results.items():
+        rss = (result["peak_rss_bytes"] or 0) / 1e6
+        print(f"{name:<35}{result['seconds']:>10.2f}{result['rows_per_sec']:>14,.0f}{rss:>14.1f}")
+    print_dashes()
+    return results
+
+
+# ------------------ #
+# API load test
+# ------------------ #
+# (name, method, path(rng, index), body(rng) or None); index is unique per request
+def _sale_body(rng):
+    return {"date": f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 28):02d}",
+            "customer_id": rng.randrange(1, 100000), "product": rng.choice(PRODUCTS),
+            "quantity": rng.randrange(1, 10), "unit_price": rng.randrange(50, 20000)}
+
+
+def api_routes(rows):
+    return [
+        ("GET /sales first page", "GET", lambda rng, i: "/sales?limit=100", None),
+        ("GET /sales keyset page", "GET", lambda rng, i: f"/sales?limit=100&after_id={rng.randrange(rows)}", None),
+        ("GET /sales?customer_id", "GET", lambda rng, i: f"/sales?customer_id={rng.randrange(1, 100000)}", None),
+        ("GET /sales/<id>", "GET", lambda rng, i: f"/sales/{rng.randrange(1, rows)}", None),
+        ("GET /sales/summary", "GET", lambda rng, i: "/sales/summary", None),
+        ("GET /sales/summary/products", "GET", lambda rng, i: "/sales/summary/products", None),
+        ("POST /sales", "POST", lambda rng, i: "/sales", _sale_body),
+        ("POST /sales/batch (100)", "POST", lambda rng, i: "/sales/batch",
+         lambda rng: [_sale_body(rng) for _ in range(100)]),
+        ("PUT /sales/<id>", "PUT", lambda rng, i: f"/sales/{rng.randrange(1, rows)}",
+         lambda rng: {"quantity": rng.randrange(1, 10)}),
+        ("DELETE /sales/<id>", "DELETE", lambda rng, i: f"/sales/{i + 1}", None),
+    ]
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def load_test(port, method, path, body, clients, total, seed=3):
+    # total requests spread over `clients` threads, each with its own keep-alive connection
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client(number):
+        rng = random.Random(seed * 1000 + number)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        own = []
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            payload = json.dumps(body(rng)) if body else None
+            headers = {"Content-Type": "application/json"} if body else {}
+            started = time.perf_counter()
+            try:
+                conn.request(method, path(rng, index), body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    errors[0] += 1
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            own.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(own)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, process, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def benchmark_api(rows, dirty=0.01, seed=42, clients=8, requests=500, server="auto", server_workers=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        generate_sales_csv(os.path.join(tmp, "sales.csv"), rows, dirty, seed)
+        port = free_port()
+        command = [sys.executable, os.path.join(HERE, "sales_server.py"), "--server", server, "--port", str(port),
+                   "--ingest", "sales.csv"]
+        if server_workers:
+            command += ["--workers", str(server_workers)]
+        # --ingest loads sales.csv into sales.db in tmp before serving
+        process = subprocess.Popen(command, cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   env=dict(os.environ, SALES_SOURCE="sales.csv", PYTHONPATH=HERE))
+        try:
+            wait_for_server(port, process)
+            for name, method, path, body in api_routes(rows):
+                results[name] = load_test(port, method, path, body, clients, requests)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    print_dashes()
+    print(f"API load test ({rows} rows, {clients} clients, {requests} requests per route, server={server})")
+    print_dashes()
+    print(f"{'route':<30}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, result in results.items():
+        print(f"{name:<30}{result['requests_per_sec']:>10,.0f}{result['p50_ms']:>10.2f}"
+              f"{result['p90_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>9}")
+    print_dashes()
+    return results
+
+
+# ------------------ #
+# Cold start
+# ------------------ #
+# Fresh interpreter: import the app, optionally run the ETL the way the old import-time
+# startup did, then serve one request. argv: "ingest" or "attach"; prints one JSON line
+# "app_ms" leaves out the Flask import, which every variant pays the same.
+COLD_START = """
+import importlib, json, sys, time
+started = time.perf_counter()
+import flask
+app_started = time.perf_counter()
+api = importlib.import_module("server-sideAPI")
+if sys.argv[1] == "ingest":
+    api.run_ingest()
+status = api.app.test_client().get("/sales?limit=1").status_code
+finished = time.perf_counter()
+print(json.dumps({"ms": (finished - started) * 1000, "app_ms": (finished - app_started) * 1000, "status": status}))
+"""
+
+
+def time_cold_start(cwd, mode, repeats=3, fresh_db=False):
+    # Best-of ms from the start of the import to the first response
+    best = {"ms": float("inf"), "app_ms": float("inf")}
+    for _ in range(repeats):
+        if fresh_db:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(os.path.join(cwd, "sales.db" + suffix)):
+                    os.remove(os.path.join(cwd, "sales.db" + suffix))
+        result = subprocess.run([sys.executable, "-c", COLD_START, mode], cwd=cwd, check=True,
+                                capture_output=True, text=True,
+                                env=dict(os.environ, SALES_SOURCE="sales.csv", PYTHONPATH=HERE))
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        if run["status"] != 200:
+            raise RuntimeError(f"First request failed with HTTP {run['status']}")
+        best = {key: min(best[key], run[key]) for key in best}
+    return best
+
+
+def benchmark_startup(rows, dirty=0.01, seed=42):
+    with tempfile.TemporaryDirectory() as tmp:
+        generate_sales_csv(os.path.join(tmp, "sales.csv"), rows, dirty, seed)
+        results = {
+            "ETL at import, empty db": time_cold_start(tmp, "ingest", fresh_db=True),
+            "ETL at import, unchanged csv": time_cold_start(tmp, "ingest"),
+            "attach to sales.db": time_cold_start(tmp, "attach"),
+        }
+
+    print_dashes()
+    print(f"Cold start to first request ({rows} rows)")
+    print_dashes()
+    print(f"{'startup':<35}{'total ms':>12}{'without Flask':>16}")
+    for name, result in results.items():
+        print(f"{name:<35}{result['ms']:>12.1f}{result['app_ms']:>16.1f}")
+    print_dashes()
+    return results
+
+
+# ------------------ #
+# Upsert loads
+# ------------------ #
+MODE_ETL = """
+import json, sys, time, sales_etl, sales_metrics
+started = time.perf_counter()
+result = sales_etl.load_sales(sys.argv[1], sys.argv[2], mode=sys.argv[3])
+print(json.dumps({"seconds": time.perf_counter() - started, "peak_rss_bytes": sales_metrics.peak_rss_bytes(),
+                  "result": result}))
+"""
+
+
+def benchmark_upsert(rows, dirty=0.01, seed=42, overlap=0.1):
+    # Before upserts, the only way to take a re-delivered extract without duplicates was a full reload
+    with tempfile.TemporaryDirectory() as tmp:
+        source = generate_sales_csv(os.path.join(tmp, "sales.csv"), rows, dirty, seed)[0]
+        redelivered = os.path.join(tmp, "redelivered.csv")
+        with open(source, encoding="utf-8") as f:
+            header = f.readline()
+            tail = deque(f, maxlen=max(1, int(rows * overlap)))
+        with open(redelivered, "w", encoding="utf-8") as f:
+            f.write(header)
+            f.writelines(tail)
+
+        db_file = os.path.join(tmp, "sales.db")
+        results = {
+            "full reload": run_etl_case(MODE_ETL, source, db_file, "replace"),
+            "first upsert (builds key index)": run_etl_case(MODE_ETL, redelivered, db_file, "upsert"),
+            f"upsert {overlap:.0%} overlap": run_etl_case(MODE_ETL, redelivered, db_file, "upsert"),
+            "upsert whole file": run_etl_case(MODE_ETL, source, db_file, "upsert"),
+        }
+
+    print_dashes()
+    print(f"Re-delivered extract ({rows} rows in sales, {len(tail)} rows re-delivered)")
+    print_dashes()
+    print(f"{'load':<35}{'seconds':>10}{'inserted':>11}{'updated':>10}{'unchanged':>11}")
+    for name, result in results.items():
+        counts = result["result"] if isinstance(result["result"], dict) else {"inserted": result["result"]}
+        print(f"{name:<35}{result['seconds']:>10.2f}{counts['inserted']:>11}{counts.get('updated', 0):>10}"
+              f"{counts.get('unchanged', 0):>11}")
+    print_dashes()
+    return results
+
+
+# ------------------ #
+# Sharded storage
+# ------------------ #
+SHARD_BENCH = """
+import importlib, json, sqlite3, sys, time
+import sales_shards
+api = importlib.import_module("server-sideAPI")
+client = api.app.test_client()
+started = time.perf_counter()
+api.run_ingest(sys.argv[1], mode="replace")
+result = {"load_s": time.perf_counter() - started}
+for name, path in json.loads(sys.argv[2]).items():
+    started = time.perf_counter()
+    for _ in range(int(sys.argv[3])):
+        api.response_cache.clear()
+        assert client.get(path).status_code == 200
+    result[name] = (time.perf_counter() - started) * 1000 / int(sys.argv[3])
+started = time.perf_counter()
+if sales_shards.enabled():
+    sales_shards.seal_shard(sales_shards.month_of(sys.argv[4]))
+else:
+    sqlite3.connect("sales.db").execute("VACUUM")
+result["compact_s"] = time.perf_counter() - started
+print(json.dumps(result))
+"""
+
+
+def benchmark_shards(rows, dirty=0.01, seed=42, repeats=20):
+    # Same data, same requests; only SALES_SHARD_DIR differs. Compaction is a VACUUM of
+    # sales.db vs sealing (compacting) the oldest month.
+    with tempfile.TemporaryDirectory() as tmp:
+        source = generate_sales_csv(os.path.join(tmp, "sales.csv"), rows, dirty, seed)[0]
+        first = pd.to_datetime(pd.read_csv(source, usecols=["date"], nrows=1000)["date"], errors="coerce")
+        first = first.min().strftime("%Y-%m-%d")
+        month = first[:7]
+        pages = {
+            "one month page ms": f"/sales?date_from={month}-01&date_to={month}-28&product=Laptop&limit=1000",
+            "all months page ms": "/sales?product=Laptop&limit=1000",
+        }
+        results = {}
+        for name, shard_dir in [("single sales table", None), ("month shards", "shards")]:
+            cwd = os.path.join(tmp, name.replace(" ", "_"))
+            os.makedirs(cwd)
+            env = {**os.environ, "PYTHONPATH": HERE}
+            env.pop("SALES_SHARD_DIR", None)
+            if shard_dir:
+                env["SALES_SHARD_DIR"] = shard_dir
+            output = subprocess.run([sys.executable, "-c", SHARD_BENCH, source, json.dumps(pages), str(repeats), first],
+                                    cwd=cwd, env=env, check=True, capture_output=True, text=True).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+
+    print_dashes()
+    print(f"Sharded storage ({rows} rows, pages averaged over {repeats} requests)")
+    print_dashes()
+    print(f"{'storage':<22}{'load s':>9}{'one month ms':>15}{'all months ms':>15}{'compact s':>12}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['load_s']:>9.2f}{result['one month page ms']:>15.2f}"
+              f"{result['all months page ms']:>15.2f}{result['compact_s']:>12.2f}")
+    print_dashes()
+    return results
+
+
+# ------------------ #
+# Results
+# ------------------ #
+def run_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "rows": args.rows,
+        "dirty_ratio": args.dirty,
+        "seed": args.seed,
+    }
+
+
+def flatten(results, prefix=""):
+    # {"etl": {"streaming load": {"seconds": 1.2}}} -> {"etl/streaming load/seconds": 1.2}
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_results(previous, current):
+    # Print every timing/throughput metric both runs have, with the ratio new/old
+    old, new = flatten(previous), flatten(current)
+    keys = [k for k in new if k in old and k.rsplit("/", 1)[-1] in (
+        "seconds", "rows_per_sec", "requests_per_sec", "p50_ms", "p99_ms", "peak_rss_bytes", "inserts/s")]
+    print_dashes()
+    print("Comparison with previous run (new / old)")
+    print_dashes()
+    for key in keys:
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        print(f"{key:<64}{ratio:>12.2f}x")
+    print_dashes()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sales pipeline benchmarks")
+    parser.add_argument("rows", nargs="?", type=int, default=200000)
+    parser.add_argument("writers", nargs="?", type=int, default=8, help="Concurrent writers for 'writes'")
+    parser.add_argument("--suite", default=",".join(SUITES), help=f"Comma list of: {', '.join(SUITES)}")
+    parser.add_argument("--dirty", type=float, default=0.01, help="Share of dirty rows in synthetic data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="ETL worker processes (default: CPU count)")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent API clients")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per API route")
+    parser.add_argument("--server", default="auto", help="sales_server.py --server for the API suite")
+    parser.add_argument("--server-workers", type=int, default=None)
+    parser.add_argument("--output", default="bench_results.json", help="Where to save the JSON results")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to compare against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    suites = [name.strip() for name in args.suite.split(",") if name.strip()]
+    unknown = [name for name in suites if name not in SUITES]
+    if unknown:
+        raise SystemExit(f"Unknown suite(s): {', '.join(unknown)}. Use: {', '.join(SUITES)}")
+
+    results = {"meta": run_metadata(args)}
+    if "schema" in suites:
+        before, after = benchmark_schema(args.rows)
+        results["schema"] = {name: {"to_sql_ms": before[name], "indexed_ms": after[name]} for name in before}
+    if "requests" in suites:
+        timings, startup = benchmark_request_path(args.rows)
+        results["requests"] = {name: {"pandas_us": b, "row_factory_us": a} for name, (b, a) in timings.items()}
+        results["requests"]["worker startup"] = {"pandas_ms": startup[0], "lean_ms": startup[1]}
+    if "writes" in suites:
+        before, after = benchmark_concurrent_inserts(args.writers)
+        results["writes"] = {"max_id_plus_one": before, "rowid_returning": after}
+    if "etl" in suites:
+        results["etl"] = benchmark_etl(args.rows, args.dirty, args.seed, args.workers)
+    if "api" in suites:
+        results["api"] = benchmark_api(args.rows, args.dirty, args.seed, args.clients, args.requests,
+                                       args.server, args.server_workers)
+    if "startup" in suites:
+        results["startup"] = benchmark_startup(args.rows, args.dirty, args.seed)
+    if "upsert" in suites:
+        results["upsert"] = benchmark_upsert(args.rows, args.dirty, args.seed)
+    if "shards" in suites:
+        results["shards"] = benchmark_shards(args.rows, args.dirty, args.seed)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare_results(json.load(f), results)
@@ -2,81 +2,187 @@
 import pandas as pd
 import sqlite3
 import subprocess
+import argparse
 import time
+import sys
+import os
+from sales_etl import load_sales, transform_chunk, expand_sources
+from sales_server import stop_on_sigterm
+import sales_metrics
 
 
-from sympy.codegen.ast import break_
-
 def print_dashes(count=80):
     for _ in range(count):
         print("=", end="")
     print()
 
-limit = 10000000
-
+SERVER_RESTARTS = 5
+SHUTDOWN_TIMEOUT = 35
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mini ETL Pipeline")
+    parser.add_argument("source", nargs="?", default="sales.csv",
+                        help="CSV file, directory of CSVs or glob (e.g. 'incoming/*.csv')")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes used to parse input files (default: CPU count)")
+    # Incremental by default: only new rows are appended and rows added via the API are kept.
+    parser.add_argument("--full-reload", action="store_true",
+                        help="Drop and rebuild the sales table from the source files")
+    # Upsert: re-delivered or overlapping extracts update the sales they loaded before
+    parser.add_argument("--upsert", action="store_true",
+                        help="Merge the source into sales on a natural key instead of appending")
+    parser.add_argument("--upsert-key", default=None,
+                        help="Comma list of key columns for --upsert (default: date,customer_id,product)")
+    parser.add_argument("--parquet-dir", default=None,
+                        help="Also write the loaded rows as date-partitioned Parquet (needs pyarrow)")
+    # Console output is a stage summary; --preview N also prints N raw/transformed/loaded rows
+    parser.add_argument("--preview", type=int, default=0, help="Rows to print at each stage (default: 0)")
+    parser.add_argument("--report", default="etl_report.json",
+                        help="Where to write the JSON run report (stage timings, rows, bytes, peak RSS)")
+    # API server (see sales_server.py)
+    parser.add_argument("--server", default="auto",
+                        help="auto, gunicorn, uvicorn, waitress or dev (default: best installed)")
+    parser.add_argument("--server-workers", type=int, default=None,
+                        help="API worker processes (default: CPU count)")
+    parser.add_argument("--server-threads", type=int, default=None, help="Threads per API worker")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--no-server", action="store_true", help="Only load the data, do not start the API")
+    return parser.parse_args()
 
 
 # ------------------ #
 # 1. Extract
 # ------------------ #
-# Read data from a CSV file (simulate source system)
-sales_data = pd.read_csv("sales.csv")
-print_dashes()
-print("                              Mini ETL Pipeline")
-print_dashes()
-print("Raw Data:")
-print(sales_data.head(limit))
-
+# Read data from a CSV file (simulate source system). Only the preview rows are read
+# here; the full extract runs chunked inside the load.
+def extract(files, preview=0):
+    print_dashes()
+    print("                              Mini ETL Pipeline")
+    print_dashes()
+    print(f"Input Files: {len(files)}")
+    if not preview:
+        return None
+    with sales_metrics.timed("preview"):
+        sales_data = pd.read_csv(files[0], nrows=preview)
+    print(f"Raw Data ({files[0]}, first {preview} rows):")
+    print(sales_data)
+    return sales_data
 
 
 # ------------------ #
 # 2. Transform
 # ------------------ #
-# Clean & process data
-# Example transformations:
-# - Handle missing values
-# - Calculate new column
-# - Convert date to datetime format
-sales_data.dropna(subset=["customer_id"], inplace=True) # drop rows with missing customer_id
-try:
-    sales_data["total_price"] = sales_data["quantity"] * sales_data["unit_price"]
-except KeyError:
+# Clean & process data with the shared transform stage (same code the server load uses):
+# - Validate rows and move bad ones (missing customer_id, bad dates/numbers) to rejects
+# - Compact dtypes: categorical product, downcast integers, integer-cent prices
+# - Calculate total_price and convert date to datetime format
+def transform(sales_data):
+    if sales_data is None:
+        return None
+    with sales_metrics.timed("preview"):
+        sales_data, rejected_rows = transform_chunk(sales_data)
+    print("Transformed Data:")
+    print(sales_data)
+    print(f"Rejected Rows: {len(rejected_rows)}")
+    print(rejected_rows)
     print_dashes()
-
-sales_data["date"] = pd.to_datetime(sales_data["date"], errors="coerce")
-print("Transformed Data:")
-print(sales_data.head(limit))
-print_dashes()
+    return sales_data
 
 
 # ------------------ #
 # 3. Load
 # ------------------
-# Store into SQLite (local database)
-conn = sqlite3.connect("sales.db")
-sales_data.to_sql("sales", conn, if_exists="replace", index=False)
-
-print("Data loaded into 'sales.db' SQLite database successfully!")
-print_dashes()
-# Optional: Query back to check
+# Store into SQLite (local database). Every input file is parsed and transformed in a
+# process pool, then a single writer bulk-inserts them in file order.
+def load(source, workers=None, full_reload=False, parquet_dir=None, preview=0, upsert=False, upsert_key=None):
+    load_mode = "replace" if full_reload else "upsert" if upsert else "incremental"
+    load_sales(source, "sales.db", mode=load_mode, workers=workers, parquet_dir=parquet_dir, key=upsert_key)
 
-result = pd.read_sql(f"SELECT * FROM sales LIMIT {limit};", conn)
-print("Loaded Data Preview:")
-print(result)
+    print("Data loaded into 'sales.db' SQLite database successfully!")
+    print_dashes()
+    if preview:
+        conn = sqlite3.connect("sales.db")
+        result = pd.read_sql("SELECT * FROM sales ORDER BY id LIMIT ?", conn, params=(preview,))
+        print("Loaded Data Preview:")
+        print(result)
+        conn.close()
+
+
+def report(path):
+    # Stage summary on the console, full numbers in the JSON run report
+    run = sales_metrics.write_run_report(path)
+    print(f"{'stage':<20}{'seconds':>10}{'rows in':>12}{'rows out':>12}{'rejected':>10}{'MB read':>10}")
+    for name, stage in run["stages"].items():
+        print(f"{name:<20}{stage['seconds']:>10.3f}{stage['rows_in']:>12}{stage['rows_out']:>12}"
+              f"{stage['rows_rejected']:>10}{stage['bytes_read'] / 1e6:>10.2f}")
+    if run["peak_rss_bytes"]:
+        print(f"Peak RSS: {run['peak_rss_bytes'] / 1e6:.1f} MB, run report written to {path}")
+    print_dashes()
 
-def run_server():
-    # Start server_sideapi.py
-    return subprocess.Popen(["python", "server-sideAPI.py"])
+def run_server(args):
+    # Start the production launcher; the data is already loaded, so the API only attaches
+    # to sales.db (SALES_SOURCE is the default for POST /admin/ingest)
+    command = [sys.executable, "sales_server.py", "--server", args.server, "--port", str(args.port)]
+    if args.server_workers:
+        command += ["--workers", str(args.server_workers)]
+    if args.server_threads:
+        command += ["--threads", str(args.server_threads)]
+    env = dict(os.environ, SALES_SOURCE=args.source)
+    if args.parquet_dir:
+        env["SALES_PARQUET_DIR"] = args.parquet_dir
+    if args.upsert:
+        env["SALES_LOAD_MODE"] = "upsert"
+    if args.upsert_key:
+        env["SALES_UPSERT_KEY"] = args.upsert_key
+    return subprocess.Popen(command, env=env)
+
+
+def stop_server(server):
+    # SIGTERM lets the server finish in-flight requests; kill it if it hangs
+    if server.poll() is None:
+        server.terminate()
+    try:
+        server.wait(timeout=SHUTDOWN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
 
-if __name__ == "__main__":
-    server = run_server()
-    print_dashes()
-    print("Data logged into the database Successfully.\nStarting The Server...\n----------------------[The Server Is Running!]-------------------")
 
+def supervise(args, restarts=SERVER_RESTARTS):
+    # Restart the server if it crashes; a clean exit (code 0) ends supervision.
+    # Ctrl+C or SIGTERM shuts the server down gracefully.
+    stop_on_sigterm()
+    server = run_server(args)
     try:
-        # Keep script alive
         while True:
+            code = server.wait()
+            if code == 0 or restarts == 0:
+                return code
+            restarts -= 1
+            print(f"Server exited with code {code}, restarting ({restarts} restarts left)...")
             time.sleep(1)
+            server = run_server(args)
     except KeyboardInterrupt:
         print("\n🛑 Stopping server...")
-        server.terminate()
\ No newline at end of file
+        stop_server(server)
+        return 0
+
+if __name__ == "__main__":
+    args = parse_args()
+    files = expand_sources(args.source)
+    if not files:
+        raise SystemExit(f"No CSV files found for '{args.source}'")
+
+    transform(extract(files, args.preview))
+    if args.full_reload and args.upsert:
+        raise SystemExit("--full-reload and --upsert cannot be combined")
+    load(args.source, workers=args.workers, full_reload=args.full_reload, parquet_dir=args.parquet_dir,
+         preview=args.preview, upsert=args.upsert, upsert_key=args.upsert_key)
+    report(args.report)
+    if args.no_server:
+        sys.exit(0)
+
+    print_dashes()
+    print("Data logged into the database Successfully.\nStarting The Server...\n----------------------[The Server Is Running!]-------------------")
+    sys.exit(supervise(args))
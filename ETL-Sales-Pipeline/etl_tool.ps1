@@ -13,8 +13,23 @@ function Show-Menu {
 }
 
 function Get-AllSales {
-    $resp = Invoke-RestMethod -Uri $BaseUrl -Method GET
-    $resp | Format-Table
+    # Page through the server with the keyset cursor instead of pulling every sale
+    $pageSize = 100
+    $uri = "$($BaseUrl)?limit=$pageSize"
+    $shown = 0
+    while ($true) {
+        $page = Invoke-RestMethod -Uri $uri -Method GET
+        if (-not $page.data -and $shown -eq 0) {
+            Write-Host "No sales found."
+            return
+        }
+        $page.data | Format-Table
+        $shown += @($page.data).Count
+        if ($null -eq $page.next_cursor) { break }
+        $next = Read-Host "Shown $shown sales. ENTER for next page, q to stop"
+        if ($next -eq "q") { break }
+        $uri = "$($BaseUrl)?limit=$pageSize&after_id=$($page.next_cursor)"
+    }
 }
 
 function Get-SaleByCustomer {
@@ -52,9 +67,21 @@ function Delete-Sale {
 }
 
 function Export-Sales {
+    # csv/excel exports are background jobs: poll the job, then download the finished file
     $fmt = Read-Host "Format (csv/excel)"
-    $resp = Invoke-RestMethod -Uri "$BaseUrl/export/$fmt" -Method GET
-    $resp
+    $job = Invoke-RestMethod -Uri "$BaseUrl/export/$fmt" -Method GET
+    $statusUri = "$BaseUrl/export/$($job.job_id)"
+    while ($job.status -eq "queued" -or $job.status -eq "running") {
+        Write-Host "Export $($job.status) ($($job.rows_written) rows written)..."
+        Start-Sleep -Seconds 1
+        $job = Invoke-RestMethod -Uri "$($statusUri)?status=1" -Method GET
+    }
+    if ($job.status -ne "done") {
+        Write-Host "Export $($job.status): $($job.error)"
+        return
+    }
+    Invoke-WebRequest -Uri $statusUri -Method GET -OutFile $job.filename
+    Write-Host "Saved $($job.filename)"
 }
 
 # Main loop
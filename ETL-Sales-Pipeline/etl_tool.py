@@ -1,10 +1,9 @@
 import os
-from tabulate import tabulate
-import requests
-import json
-import subprocess
+import argparse
+from sales_client import SalesClient, SalesAPIError, DEFAULT_URL, render_pages
 
-BASE_URL = "http://127.0.0.1:5000/sales"
+# Created in __main__; one pooled, keep-alive session for the whole menu session
+client = None
 def print_dashes(count=80):
     for _ in range(count):
         print("=", end="")
@@ -25,29 +24,31 @@ def print_menu():
     print("3. POST (add new sale)")
     print("4. PUT (update sale by customer_id)")
     print("5. DELETE sale by customer_id")
-    print("6. Export sales (CSV or Excel)")
+    print("6. Export sales (CSV, NDJSON or Excel)")
+    print("7. Import sales file via API (batch)")
     print("0. Exit")
     print_dashes()
 
-def get_all_sales():
-    resp = requests.get(BASE_URL)
-    sales = resp.json()
+def call(method, *args):
+    # Print the API response (or its error body) like the server returned it
+    try:
+        print(method(*args))
+    except SalesAPIError as e:
+        print(e.payload)
 
-    if not sales:
-        print("No sales found.")
-        return
 
-    # Extract keys for headers
-    headers = ["id", "customer_id", "date", "product", "quantity", "unit_price", "total_price"]
-    table = [[sale[h] for h in headers] for sale in sales]
-
-    print(tabulate(table, headers=headers, tablefmt="grid"))
+def get_all_sales(page_size=100):
+    # Page through the server with the keyset cursor instead of pulling every sale
+    try:
+        if render_pages(client.iter_pages(page_size)) == 0:
+            print("No sales found.")
+    except SalesAPIError as e:
+        print(e.payload)
 
 
 def get_sale_by_customer():
     cid = input("Enter customer_id: ")
-    resp = requests.get(f"{BASE_URL}/{cid}")
-    print(resp.json())
+    call(client.get_sale, cid)
 
 
 def add_sale():
@@ -57,8 +58,7 @@ def add_sale():
     sale["product"] = input("Product: ")
     sale["quantity"] = int(input("Quantity: "))
     sale["unit_price"] = float(input("Unit Price: "))
-    resp = requests.post(BASE_URL, json=sale)
-    print(resp.json())
+    call(client.add_sale, sale)
 
 
 def update_sale():
@@ -66,47 +66,81 @@ def update_sale():
     update = {}
     update["quantity"] = int(input("New quantity: "))
     update["unit_price"] = float(input("New unit price: "))
-    resp = requests.put(f"{BASE_URL}/{cid}", json=update)
-    print(resp.json())
+    call(client.update_sale, cid, update)
 
 
 def delete_sale():
     cid = input("Enter customer_id to delete: ")
-    resp = requests.delete(f"{BASE_URL}/{cid}")
-    print(resp.json())
+    call(client.delete_sale, cid)
 
 
 def export_sales():
-    fmt = input("Format (csv/excel): ").lower()
-    resp = requests.get(f"{BASE_URL}/export/{fmt}")
-    print(resp.json())
-
-
-# Main loop
-try:
-    while True:
-        print_menu()
-        choice = input("Choose option: ")
-        if choice == "1":
-            get_all_sales()
-        elif choice == "2":
-            get_sale_by_customer()
-        elif choice == "3":
-            add_sale()
-        elif choice == "4":
-            update_sale()
-        elif choice == "5":
-            delete_sale()
-        elif choice == "6":
-            export_sales()
-        elif choice == "0":
-            break
-        else:
-            print("Invalid choice! Try again.")
-
-except KeyboardInterrupt:
-    print("\nProgram Stopped Running...")
-
-
-
-
+    # Runs as a background job on the server; poll its progress, then download the file
+    fmt = input("Format (csv/ndjson/excel): ").lower()
+    compress = fmt != "excel" and input("Gzip compress? (y/n): ").lower() == "y"
+    try:
+        job = client.start_export(fmt, compress)
+        path = client.download_export(job["job_id"], on_progress=lambda j: print(
+            f"Export {j['status']}: {j['rows_written']}/{j['total_rows'] or '?'} rows"))
+        print(f"Exported to {path}")
+    except SalesAPIError as e:
+        print(e.payload)
+
+
+def import_sales_file(path=None, batch_size=1000, workers=4):
+    # Send a sales CSV to POST /sales/batch in concurrent batches instead of one request per sale
+    path = path or input("CSV file to import: ").strip()
+    if not os.path.exists(path):
+        print(f"File not found: {path}")
+        return None
+
+    result = client.bulk_upload(path, batch_size, workers)
+    for error in result["errors"]:
+        print(f"Row {error['row']}: {error['error']}")
+    print(f"Imported {result['inserted']} sales, {result['rejected']} rows rejected.")
+    return result
+
+
+def main_menu():
+    try:
+        while True:
+            print_menu()
+            choice = input("Choose option: ")
+            if choice == "1":
+                get_all_sales()
+            elif choice == "2":
+                get_sale_by_customer()
+            elif choice == "3":
+                add_sale()
+            elif choice == "4":
+                update_sale()
+            elif choice == "5":
+                delete_sale()
+            elif choice == "6":
+                export_sales()
+            elif choice == "7":
+                import_sales_file()
+            elif choice == "0":
+                break
+            else:
+                print("Invalid choice! Try again.")
+
+    except KeyboardInterrupt:
+        print("\nProgram Stopped Running...")
+
+
+if __name__ == "__main__":
+    # python etl_tool.py [--url URL]                       interactive menu
+    # python etl_tool.py --import sales.csv [--workers 8]  non-interactive bulk upload
+    parser = argparse.ArgumentParser(description="ETL Manager Tool")
+    parser.add_argument("--url", default=DEFAULT_URL, help="API base URL (default: $SALES_API_URL or %(default)s)")
+    parser.add_argument("--import", dest="import_file", metavar="CSV", help="Upload a sales CSV and exit")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent batch uploads")
+    args = parser.parse_args()
+
+    with SalesClient(args.url, pool_size=max(args.workers, 1)) as client:
+        if args.import_file:
+            result = import_sales_file(args.import_file, args.batch_size, args.workers)
+            raise SystemExit(0 if result and result["inserted"] else 1)
+        main_menu()
@@ -0,0 +1,101 @@
+#RESPONSE CACHE (in-process LRU + TTL for pre-serialized GET responses)
+# Every entry remembers the range of sale ids it was built from, so a write only
+# evicts the entries that could contain that id (its detail page and the list page
+# whose keyset range covers it) instead of flushing everything.
+# Each worker process has its own cache, so entries also carry the change log seq
+# (sales_changes) they were built at. When the head has moved since, the lookup asks the
+# caller whether any of those changes touched the entry's ids: writes by other workers or
+# ETL runs are seen right away, and writes to other ids still leave the entry a hit.
+import threading
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    def __init__(self, body, status, etag, expires, first_id, last_id, seq=None):
+        self.body = body
+        self.status = status
+        self.etag = etag
+        self.expires = expires
+        self.first_id = first_id
+        self.last_id = last_id  # None means open-ended (last page)
+        self.seq = seq
+
+    def covers(self, low, high):
+        if self.last_id is not None and low > self.last_id:
+            return False
+        return high >= self.first_id
+
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_etag(body):
+        return hashlib.sha1(body).hexdigest()
+
+    def get(self, key, seq=None, changed=None):
+        # seq is the current change log head; changed(entry) says whether the entry's ids
+        # changed after entry.seq (checked outside the lock, it reads the database)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                del self._entries[key]
+                entry = None
+        fresh = entry is not None and (entry.seq == seq or (changed is not None and not changed(entry)))
+        with self._lock:
+            if not fresh:
+                if entry is not None and self._entries.get(key) is entry:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            # Still valid at seq, so the next lookup only checks later changes
+            entry.seq = max(entry.seq, seq)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, status=200, first_id=0, last_id=None, seq=None):
+        entry = CacheEntry(body, status, self.make_etag(body), time.monotonic() + self.ttl, first_id, last_id,
+                           seq)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate_ids(self, low, high=None):
+        # Drop every entry whose id range overlaps [low, high]
+        high = low if high is None else high
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.covers(low, high)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,116 @@
+#CHANGE DATA CAPTURE (sales_changes log)
+# Every write to sales appends one compact entry with a monotonic sequence number:
+#   I/U/D  insert/update/delete of the ids first_id..last_id (API writes log one id,
+#          ETL loads one id range per chunk, so a 10M-row load adds a few hundred entries)
+#   R      the table was rebuilt (full reload): replicas must drop what they have
+# Entries hold no row data; GET /sales/changes joins them with the current rows, so a
+# replica always receives the latest state of each changed sale and applies inserts and
+# updates as upserts. That makes compaction lossless: a single-row entry superseded by a
+# later entry for the same id, and anything before the last R, can be dropped. Retention removes old entries and moves the horizon;
+# replicas behind the horizon must resync from GET /sales.
+import os
+
+RETENTION_DAYS = float(os.environ.get("SALES_CHANGES_RETENTION_DAYS", 7))
+OPS = {"I": "insert", "U": "update", "D": "delete", "R": "reset"}
+ROW_BATCH = 1000
+
+CHANGES_DDL = """CREATE TABLE IF NOT EXISTS sales_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    first_id INTEGER,
+    last_id INTEGER,
+    changed_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+)"""
+
+
+def ensure_changes(conn):
+    # AUTOINCREMENT: a seq is never reused, even after the newest entries are compacted
+    conn.execute(CHANGES_DDL)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_changes_row ON sales_changes (first_id, seq) "
+                 "WHERE first_id = last_id")
+
+
+def log_change(conn, op, first_id=None, last_id=None):
+    # Call inside the writing transaction, so the entry commits (or rolls back) with the change
+    if last_id is None:
+        last_id = first_id
+    conn.execute("INSERT INTO sales_changes (op, first_id, last_id) VALUES (?, ?, ?)", (op, first_id, last_id))
+
+
+def log_changes(conn, op, ids):
+    # One single-row entry per id, e.g. the sales an upsert load updated
+    conn.executemany("INSERT INTO sales_changes (op, first_id, last_id) VALUES (?, ?, ?)",
+                     ((op, sale_id, sale_id) for sale_id in ids))
+
+
+def head_seq(conn):
+    # Last seq handed out; sqlite_sequence keeps it after retention has emptied the table
+    # (MAX(seq) would fall back to 0 and make caught-up replicas look ahead of the log)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='sales_changes'").fetchone()
+    latest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sales_changes").fetchone()[0]
+    return max(row[0] if row else 0, latest, horizon(conn))
+
+
+def horizon(conn):
+    # Highest seq removed by retention; since values below it can no longer be served
+    row = conn.execute("SELECT value FROM sales_meta WHERE name='changes_horizon'").fetchone()
+    return row[0] if row else 0
+
+
+def changed_since(conn, seq, low, high=None):
+    # Whether sales low..high (high None: open-ended) may have changed after seq: an entry
+    # overlapping the range, a reset, or entries already removed by retention
+    if seq < horizon(conn):
+        return True
+    return conn.execute(
+        "SELECT 1 FROM sales_changes WHERE seq > ? AND (op = 'R' OR (last_id >= ? AND (? IS NULL OR first_id <= ?))) "
+        "LIMIT 1", (seq, low, high, high)).fetchone() is not None
+
+
+def compact_changes(conn, retention_days=RETENTION_DAYS):
+    # Returns {"compacted": n, "expired": n, "horizon": seq}; run inside a write transaction
+    last_reset = conn.execute("SELECT MAX(seq) FROM sales_changes WHERE op='R'").fetchone()[0]
+    compacted = 0
+    if last_reset:
+        compacted += conn.execute("DELETE FROM sales_changes WHERE seq < ?", (last_reset,)).rowcount
+    compacted += conn.execute(
+        """DELETE FROM sales_changes WHERE first_id = last_id AND seq < (
+               SELECT MAX(c.seq) FROM sales_changes c
+               WHERE c.first_id = sales_changes.first_id AND c.first_id = c.last_id)"""
+    ).rowcount
+
+    cutoff = f"-{retention_days} days"
+    expired_to = conn.execute("SELECT MAX(seq) FROM sales_changes WHERE changed_at < datetime('now', 'localtime', ?)",
+                              (cutoff,)).fetchone()[0]
+    expired = 0
+    if expired_to:
+        expired = conn.execute("DELETE FROM sales_changes WHERE seq <= ?", (expired_to,)).rowcount
+        conn.execute("INSERT INTO sales_meta (name, value) VALUES ('changes_horizon', ?) "
+                     "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)", (expired_to,))
+    return {"compacted": compacted, "expired": expired, "horizon": horizon(conn)}
+
+
+def read_changes(conn, since, limit):
+    # Up to limit entries after since: [(seq, op, first_id, last_id)]
+    return conn.execute("SELECT seq, op, first_id, last_id FROM sales_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                        (since, limit)).fetchall()
+
+
+def iter_change_rows(conn, entries, read=None):
+    # One dict per changed sale, in seq order. Inserts/updates carry the current row (sales
+    # deleted since are skipped; their delete entry follows); rows of one seq are consecutive.
+    # read(sql, params) returns the cursor for the rows (sales_shards.execute when sharded).
+    read = read or conn.execute
+    for seq, op, first_id, last_id in entries:
+        if op == "R":
+            yield {"seq": seq, "op": "reset"}
+            continue
+        if op == "D":
+            for sale_id in range(first_id, last_id + 1):
+                yield {"seq": seq, "op": "delete", "id": sale_id}
+            continue
+        cursor = read("SELECT * FROM sales WHERE id BETWEEN ? AND ? ORDER BY id", (first_id, last_id))
+        columns = [col[0] for col in cursor.description]
+        for rows in iter(lambda: cursor.fetchmany(ROW_BATCH), []):
+            for row in rows:
+                yield {"seq": seq, "op": OPS[op], "id": row[0], "data": dict(zip(columns, row))}
@@ -0,0 +1,242 @@
+#SALES API CLIENT
+# Reusable client for the sales API, used by etl_tool.py and usable from scripts:
+#   from sales_client import SalesClient
+#   with SalesClient("http://127.0.0.1:5000") as client:
+#       for sale in client.iter_sales(product="Laptop"):
+#           ...
+#       print(client.bulk_upload("sales.csv", workers=4))
+# All calls go through one requests.Session, so connections are pooled and kept alive
+# instead of opening a new TCP connection per request.
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_URL = os.environ.get("SALES_API_URL", "http://127.0.0.1:5000")
+# Largest ?limit= GET /sales accepts
+MAX_PAGE_SIZE = 1000
+SALE_HEADERS = ["id", "customer_id", "date", "product", "quantity", "unit_price", "total_price"]
+
+
+class SalesAPIError(Exception):
+    # Non-2xx response; payload is the decoded JSON body (or the raw text)
+    def __init__(self, status, payload):
+        super().__init__(f"HTTP {status}: {payload}")
+        self.status = status
+        self.payload = payload
+
+
+class SalesClient:
+    def __init__(self, base_url=DEFAULT_URL, timeout=30, pool_size=8, retries=3):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Retry refused connections and gateway errors; POSTs are never retried, so a
+        # timed-out upload is not inserted twice
+        retry = Retry(total=retries, connect=retries, backoff_factor=0.2,
+                      status_forcelist=[502, 503, 504], raise_on_status=False)
+        # pool_size is the number of keep-alive connections, i.e. the useful upload concurrency
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, path, **kwargs):
+        resp = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        try:
+            payload = resp.json()
+        except ValueError:
+            payload = resp.text
+        if resp.status_code >= 400:
+            raise SalesAPIError(resp.status_code, payload)
+        return payload
+
+    # ------------------ #
+    # Single sales
+    # ------------------ #
+    def get_sale(self, sale_id):
+        return self.request("GET", f"/sales/{sale_id}")
+
+    def add_sale(self, sale):
+        return self.request("POST", "/sales", json=sale)
+
+    def update_sale(self, sale_id, update):
+        return self.request("PUT", f"/sales/{sale_id}", json=update)
+
+    def delete_sale(self, sale_id):
+        return self.request("DELETE", f"/sales/{sale_id}")
+
+    def export(self, fmt):
+        return self.request("GET", f"/sales/export/{fmt}")
+
+    # ------------------ #
+    # Background exports
+    # ------------------ #
+    def start_export(self, fmt="csv", gzip=False, **filters):
+        # Queues an export job (or returns the existing one for an unchanged table)
+        return self.request("POST", "/sales/export", json={"format": fmt, "gzip": gzip, **filters})
+
+    def export_status(self, job_id):
+        return self.request("GET", f"/sales/export/{job_id}", params={"status": 1})
+
+    def wait_for_export(self, job_id, poll=1.0, timeout=None, on_progress=None):
+        started = time.monotonic()
+        while True:
+            job = self.export_status(job_id)
+            if on_progress:
+                on_progress(job)
+            if job["status"] not in ("queued", "running"):
+                return job
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Export {job_id} still {job['status']} after {timeout}s")
+            time.sleep(poll)
+
+    def download_export(self, job_id, path=None, poll=1.0, timeout=None, on_progress=None):
+        # Waits for the job, then streams the artifact to path (default: the server's file name)
+        job = self.wait_for_export(job_id, poll, timeout, on_progress)
+        if job["status"] != "done":
+            raise SalesAPIError(500, job)
+        path = path or job["filename"]
+        with self.session.get(f"{self.base_url}/sales/export/{job_id}", stream=True, timeout=self.timeout) as resp:
+            if resp.status_code >= 400:
+                raise SalesAPIError(resp.status_code, resp.text)
+            with open(path, "wb") as f:
+                for block in resp.iter_content(1024 * 1024):
+                    f.write(block)
+        return path
+
+    def summary(self, dimension=None):
+        return self.request("GET", f"/sales/summary/{dimension}" if dimension else "/sales/summary")
+
+    # ------------------ #
+    # Paginated reads
+    # ------------------ #
+    def iter_pages(self, page_size=1000, **filters):
+        # Follows the keyset cursor (after_id/next_cursor); a server that returns a plain
+        # list has no pagination, so that list is the only page
+        params = {**filters, "limit": min(page_size, MAX_PAGE_SIZE)}
+        while True:
+            page = self.request("GET", "/sales", params=params)
+            if isinstance(page, list):
+                yield page
+                return
+            if page.get("data"):
+                yield page["data"]
+            if page.get("next_cursor") is None:
+                return
+            params["after_id"] = page["next_cursor"]
+
+    def iter_sales(self, page_size=1000, **filters):
+        for page in self.iter_pages(page_size, **filters):
+            yield from page
+
+    # ------------------ #
+    # Change feed
+    # ------------------ #
+    def changes_page(self, since=0, limit=1000):
+        # Returns (changes, next_since, head_seq); SalesAPIError 410 means resync from iter_sales
+        with self.session.get(f"{self.base_url}/sales/changes", params={"since": since, "limit": limit},
+                              stream=True, timeout=self.timeout) as resp:
+            if resp.status_code >= 400:
+                try:
+                    payload = resp.json()
+                except ValueError:
+                    payload = resp.text
+                raise SalesAPIError(resp.status_code, payload)
+            changes = [json.loads(line) for line in resp.iter_lines() if line]
+            return changes, int(resp.headers["X-Next-Since"]), int(resp.headers["X-Head-Seq"])
+
+    def iter_changes(self, since=0, limit=1000):
+        # Every change after since up to the current head; keep the last seq seen as the next since
+        while True:
+            changes, since, head = self.changes_page(since, limit)
+            yield from changes
+            if since >= head:
+                return
+
+    # ------------------ #
+    # Bulk upload
+    # ------------------ #
+    def post_batch(self, batch):
+        # Returns the server result; a batch with no valid rows is a 400 that still lists errors
+        try:
+            return self.request("POST", "/sales/batch", json=batch)
+        except SalesAPIError as e:
+            if isinstance(e.payload, dict) and "errors" in e.payload:
+                return e.payload
+            raise
+
+    def bulk_upload(self, path, batch_size=1000, workers=4, on_batch=None):
+        # Streams the CSV in batches to POST /sales/batch from a bounded thread pool; at most
+        # 2 x workers batches are in memory. Error rows are numbered from the first data row.
+        totals = {"inserted": 0, "rejected": 0, "errors": []}
+        lock = threading.Lock()
+
+        def send(start, batch):
+            result = self.post_batch(batch)
+            errors = [{**e, "row": start + e["row"]} for e in result.get("errors", [])]
+            with lock:
+                totals["inserted"] += result.get("inserted", 0)
+                totals["rejected"] += len(errors)
+                totals["errors"].extend(errors)
+            if on_batch:
+                on_batch(start, result)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for start, batch in read_csv_batches(path, batch_size):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(pool.submit(send, start, batch))
+            for future in pending:
+                future.result()
+        totals["errors"].sort(key=lambda e: e["row"])
+        return totals
+
+
+def read_csv_batches(path, batch_size=1000):
+    # (index of the first row, [sale dicts]) with lower-cased, stripped column names
+    with open(path, newline="", encoding="utf-8") as f:
+        batch, start = [], 0
+        for index, row in enumerate(csv.DictReader(f)):
+            batch.append({k.strip().lower(): v for k, v in row.items() if k})
+            if len(batch) == batch_size:
+                yield start, batch
+                batch, start = [], index + 1
+        if batch:
+            yield start, batch
+
+
+def render_pages(pages, headers=SALE_HEADERS, prompt=True):
+    # Prints each page as its own table as it arrives, so large results never sit in memory.
+    # With prompt=True the user can stop after any page; returns the number of rows shown.
+    from tabulate import tabulate
+
+    shown = 0
+    pages = iter(pages)
+    page = next(pages, None)
+    while page is not None:
+        print(tabulate([[sale.get(h) for h in headers] for sale in page], headers=headers, tablefmt="grid"))
+        shown += len(page)
+        # Fetch ahead so there is no prompt after the last page
+        page = next(pages, None)
+        if page is not None and prompt:
+            if input(f"Shown {shown} sales. ENTER for next page, q to stop: ").lower() == "q":
+                break
+    return shown
@@ -0,0 +1,204 @@
+#COLUMNAR STORE (optional, needs pyarrow)
+# The ETL load can also write sales as Parquet files partitioned by sale date
+# (<root>/sale_date=YYYY-MM-DD/part-*.parquet). Exports and analytical queries read
+# only the partitions and columns they need and stream Arrow record batches.
+# Only ETL loads write the store: API inserts/updates/deletes and upsert updates never
+# reach it, and later incremental loads do not backfill them. The table version the store
+# mirrors is recorded in sales_meta, and readers use it only while that is still the
+# current version (see store_current); a full reload with a parquet dir rebuilds it.
+import os
+import shutil
+
+from sales_db import meta_value, set_meta_value, table_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+PARQUET_DIR = "sales_parquet"
+BATCH_SIZE = 64 * 1024
+COLUMNS = ["id", "date", "customer_id", "product", "quantity", "unit_price", "total_price"]
+
+
+def available():
+    return pa is not None
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed. Run 'pip install pyarrow' to use the columnar store")
+
+
+def sales_schema(columns=None):
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.timestamp("s")),
+        ("customer_id", pa.int64()),
+        ("product", pa.dictionary(pa.int32(), pa.string())),
+        ("quantity", pa.int64()),
+        ("unit_price", pa.float64()),
+        ("total_price", pa.float64()),
+    ])
+    return pa.schema([schema.field(c) for c in columns]) if columns else schema
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("sale_date", pa.string())]), flavor="hive")
+
+
+def store_exists(root=PARQUET_DIR):
+    return os.path.isdir(root) and any(os.scandir(root))
+
+
+# ------------------ #
+# Freshness
+# ------------------ #
+STORE_VERSION = "parquet_version"
+
+
+def store_in_sync(conn):
+    # True while the store holds every write; call inside the load transaction
+    return meta_value(conn, STORE_VERSION) == table_version(conn)
+
+
+def mark_store(conn):
+    # Record that the store mirrors the current table version (after bump_table_version)
+    set_meta_value(conn, STORE_VERSION, table_version(conn))
+
+
+def store_current(conn, root=PARQUET_DIR):
+    return store_exists(root) and store_in_sync(conn)
+
+
+# ------------------ #
+# Write (ETL load)
+# ------------------ #
+def clear_store(root=PARQUET_DIR):
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def write_chunk(df, root=PARQUET_DIR):
+    # df is a transformed chunk (integer-cent prices); one file per sale date partition
+    require_pyarrow()
+    if df.empty:
+        return
+    frame = df.assign(
+        unit_price=df["unit_price_cents"] / 100,
+        total_price=df["total_price_cents"] / 100,
+    )
+    table = pa.Table.from_pandas(frame[COLUMNS], schema=sales_schema(), preserve_index=False, safe=False)
+    table = table.append_column("sale_date", pc.strftime(table["date"], format="%Y-%m-%d"))
+    ds.write_dataset(
+        table, root, format="parquet", partitioning=_partitioning(),
+        basename_template=f"part-{int(df['id'].iloc[0])}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+# ------------------ #
+# Read
+# ------------------ #
+def _date_filter(date_from=None, date_to=None):
+    # Filters on the partition key so whole days are skipped without opening their files
+    expression = None
+    if date_from:
+        expression = ds.field("sale_date") >= str(date_from)[:10]
+    if date_to:
+        upper = ds.field("sale_date") <= str(date_to)[:10]
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def scanner(root=PARQUET_DIR, columns=None, date_from=None, date_to=None, batch_size=BATCH_SIZE):
+    require_pyarrow()
+    dataset = ds.dataset(root, format="parquet", partitioning=_partitioning())
+    return dataset.scanner(columns=columns or COLUMNS, filter=_date_filter(date_from, date_to),
+                           batch_size=batch_size)
+
+
+def sqlite_batches(cursor, batch_size=BATCH_SIZE):
+    # Record batches straight from a SQLite cursor, used when no Parquet store exists
+    require_pyarrow()
+    schema = sales_schema([col[0] for col in cursor.description])
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        arrays = []
+        for index, field in enumerate(schema):
+            values = [row[index] for row in rows]
+            if field.name == "date":
+                arrays.append(pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d %H:%M:%S", unit="s"))
+            else:
+                arrays.append(pa.array(values).cast(field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def revenue_by(group, root=PARQUET_DIR, date_from=None, date_to=None):
+    # Aggregate over any date range reading just the key and measure columns
+    require_pyarrow()
+    key = "sale_date" if group == "day" else group
+    table = scanner(root, [key, "quantity", "total_price"], date_from, date_to).to_table()
+    if key == "product":
+        table = table.set_column(0, key, pc.cast(table[key], pa.string()))
+    result = table.group_by(key).aggregate([
+        ("total_price", "sum"), ("quantity", "sum"), ("quantity", "count"),
+    ])
+    names = {"total_price_sum": "revenue", "quantity_sum": "quantity", "quantity_count": "orders",
+             "sale_date": "day"}
+    result = result.rename_columns([names.get(name, name) for name in result.column_names])
+    order = [("day", "ascending")] if group == "day" else [("revenue", "descending")]
+    return result.sort_by(order).to_pylist()
+
+
+# ------------------ #
+# Streamed encoders
+# ------------------ #
+class _ByteSink:
+    # File-like object pyarrow writes into; the written bytes are handed out as they arrive
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_arrow_stream(schema, batches):
+    # Arrow IPC stream: one message per record batch, no full-table materialization
+    sink = _ByteSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def iter_parquet_stream(schema, batches):
+    # Parquet file written one row group per batch; the footer comes last
+    sink = _ByteSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
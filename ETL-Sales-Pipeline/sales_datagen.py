@@ -0,0 +1,93 @@
+#SYNTHETIC SALES DATA (deterministic, for benchmarks and load tests)
+# Writes sales.csv-shaped files of any size in fixed-size chunks, so 50M rows never sit in
+# memory. Products and customers follow a Zipf-like skew (a few best sellers and regulars),
+# dates advance through the file like a real export, and a configurable share of rows is
+# dirty in the ways the transform stage rejects.
+# Usage: python sales_datagen.py out.csv --rows 1000000 [--dirty 0.02] [--seed 42] [--files 4]
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# (product, typical unit price)
+PRODUCTS = [
+    ("Laptop", 18000), ("Phone", 9000), ("Monitor", 4000), ("Projector", 4500), ("Desk", 1500),
+    ("Chair", 900), ("Radio", 3000), ("Adapter", 50), ("Keyboard", 400), ("Mouse", 150),
+    ("Headset", 700), ("Webcam", 600), ("Printer", 2500), ("Router", 1100), ("Tablet", 7000),
+    ("Speaker", 800), ("Cable", 30), ("Charger", 120), ("Camera", 12000), ("Lamp", 250),
+]
+CUSTOMERS = 100000
+START_DATE = np.datetime64("2024-01-01")
+DAYS = 730
+CHUNK_ROWS = 500000
+HEADER = ["date", "customer_id", "product", "quantity", "unit_price"]
+# Each dirty row gets one of these defects
+DEFECTS = ["missing customer_id", "invalid date", "missing product", "invalid quantity", "invalid unit_price"]
+
+
+def zipf_weights(count, skew=1.1):
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_chunk(rng, first_row, rows, total_rows, dirty_ratio=0.0):
+    # Rows [first_row, first_row + rows) of a total_rows file, as strings ready for CSV
+    product_index = rng.choice(len(PRODUCTS), size=rows, p=zipf_weights(len(PRODUCTS)))
+    base_price = np.array([price for _, price in PRODUCTS])[product_index]
+    unit_price = np.maximum(1, np.round(base_price * rng.uniform(0.8, 1.2, rows))).astype(np.int64)
+    # The customer permutation is fixed, so the same ids are the heavy buyers in every chunk
+    customer_rank = rng.choice(CUSTOMERS, size=rows, p=zipf_weights(CUSTOMERS, 0.9))
+    customer_id = np.random.default_rng(0).permutation(CUSTOMERS)[customer_rank] + 1
+    position = np.arange(first_row, first_row + rows)
+    days = (position * DAYS) // max(total_rows, 1) + rng.integers(0, 3, rows)
+    frame = pd.DataFrame({
+        "date": (START_DATE + np.minimum(days, DAYS - 1)).astype(str),
+        "customer_id": customer_id.astype(str),
+        "product": np.array([name for name, _ in PRODUCTS], dtype=object)[product_index],
+        "quantity": rng.geometric(0.45, rows).astype(str),
+        "unit_price": unit_price.astype(str),
+    })
+    if dirty_ratio:
+        dirty = np.flatnonzero(rng.random(rows) < dirty_ratio)
+        defect = rng.integers(0, len(DEFECTS), len(dirty))
+        frame.loc[dirty[defect == 0], "customer_id"] = ""
+        frame.loc[dirty[defect == 1], "date"] = "not-a-date"
+        frame.loc[dirty[defect == 2], "product"] = ""
+        frame.loc[dirty[defect == 3], "quantity"] = "x"
+        frame.loc[dirty[defect == 4], "unit_price"] = ""
+    return frame
+
+
+def generate_sales_csv(path, rows, dirty_ratio=0.0, seed=42, files=1, chunk_rows=CHUNK_ROWS):
+    # Same seed + arguments -> byte-identical files. With files > 1, path is a directory
+    # and rows are split evenly over sales_000.csv, sales_001.csv, ...
+    rng = np.random.default_rng(seed)
+    if files > 1:
+        os.makedirs(path, exist_ok=True)
+        paths = [os.path.join(path, f"sales_{index:03d}.csv") for index in range(files)]
+    else:
+        paths = [path]
+    per_file = -(-rows // files)
+    written = 0
+    for file_path in paths:
+        file_rows = min(per_file, rows - written)
+        with open(file_path, "w", encoding="utf-8", newline="") as f:
+            f.write(",".join(HEADER) + "\n")
+            for offset in range(0, file_rows, chunk_rows):
+                count = min(chunk_rows, file_rows - offset)
+                generate_chunk(rng, written + offset, count, rows, dirty_ratio).to_csv(
+                    f, header=False, index=False, lineterminator="\n")
+        written += file_rows
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic sales CSV files")
+    parser.add_argument("path", help="Output CSV (or directory when --files > 1)")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dirty", type=float, default=0.01, help="Share of rows with a defect (default: 0.01)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--files", type=int, default=1)
+    args = parser.parse_args()
+    for written_path in generate_sales_csv(args.path, args.rows, args.dirty, args.seed, args.files):
+        print(f"Wrote {written_path}")
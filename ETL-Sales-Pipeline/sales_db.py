@@ -0,0 +1,223 @@
+#SQLITE CONNECTION LAYER (shared by the API routes and the ETL loads)
+import sqlite3
+import threading
+import datetime
+import os
+from sales_rollups import ensure_rollups
+from sales_changes import ensure_changes
+
+DB_FILE = "sales.db"
+# Dates are stored as ISO 'YYYY-MM-DD HH:MM:SS' text so they sort and range-filter correctly
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+SALES_COLUMNS = ["id", "date", "customer_id", "product", "quantity", "unit_price", "total_price"]
+
+# WAL lets readers run while a writer commits; NORMAL sync is safe under WAL and
+# avoids an fsync per commit. mmap/cache sizes are per connection.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+STATEMENT_CACHE_SIZE = 256
+# INSERT ... RETURNING needs SQLite 3.35+; older libraries fall back to cursor.lastrowid
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_local = threading.local()
+
+
+def connect(db_file=DB_FILE):
+    # New tuned connection; the statement cache keeps prepared statements for reuse
+    conn = sqlite3.connect(db_file, timeout=PRAGMAS["busy_timeout"] / 1000,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def get_connection(db_file=DB_FILE):
+    # One pooled connection per thread (and per process, so forked workers never share one)
+    pool = getattr(_local, "pool", None)
+    if pool is None or _local.pid != os.getpid():
+        pool = _local.pool = {}
+        _local.pid = os.getpid()
+    conn = pool.get(db_file)
+    if conn is None:
+        conn = pool[db_file] = connect(db_file)
+    return conn
+
+
+def close_connection(db_file=DB_FILE):
+    pool = getattr(_local, "pool", None) or {}
+    conn = pool.pop(db_file, None)
+    if conn is not None:
+        conn.close()
+
+
+# ------------------ #
+# Schema
+# ------------------ #
+# Lives here rather than in sales_etl so the API can create/migrate the schema without
+# importing pandas
+# AUTOINCREMENT: ids are never reused, even after the highest sale is deleted, so change
+# log entries, cached id ranges and ids held by clients keep pointing at one sale
+SALES_DDL = """CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT,
+    customer_id INTEGER,
+    product TEXT,
+    quantity INTEGER,
+    unit_price REAL,
+    total_price REAL
+)"""
+SALES_INDEXES = {
+    "idx_sales_customer_id": "customer_id",
+    "idx_sales_date": "date",
+    "idx_sales_product": "product",
+}
+
+
+def ensure_schema(conn):
+    # Create (or migrate) the typed sales table and its secondary indexes
+    info = conn.execute("PRAGMA table_info(sales)").fetchall()
+    if info and not any(col[1] == "id" and col[5] for col in info):
+        _migrate_legacy_sales(conn, [col[1] for col in info])
+    elif info and "AUTOINCREMENT" not in _table_sql(conn, "sales").upper():
+        _migrate_to_autoincrement(conn)
+    conn.execute(SALES_DDL)
+    for name, column in SALES_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON sales ({column})")
+    ensure_rollups(conn)
+    ensure_meta(conn)
+    ensure_changes(conn)
+
+
+def _migrate_legacy_sales(conn, columns):
+    # Tables written by df.to_sql have no primary key, REAL customer ids and mixed date strings
+    print("Migrating sales table to the indexed schema...")
+    conn.execute("ALTER TABLE sales RENAME TO sales_legacy")
+    conn.execute(SALES_DDL)
+    conversions = {
+        "date": "COALESCE(strftime('%Y-%m-%d %H:%M:%S', date), date)",
+        "customer_id": "CAST(customer_id AS INTEGER)",
+    }
+    keep = [c for c in SALES_COLUMNS if c in columns]
+    select = ", ".join(conversions.get(c, c) for c in keep)
+    conn.execute(
+        f"INSERT OR IGNORE INTO sales ({', '.join(keep)}) SELECT {select} FROM sales_legacy ORDER BY id"
+    )
+    conn.execute("DROP TABLE sales_legacy")
+
+
+def _table_sql(conn, table):
+    return conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+
+
+def _migrate_to_autoincrement(conn):
+    # Tables created before ids were AUTOINCREMENT; the copy seeds sqlite_sequence with MAX(id)
+    print("Migrating sales table to never reuse ids...")
+    conn.execute("ALTER TABLE sales RENAME TO sales_reused_ids")
+    conn.execute(SALES_DDL)
+    conn.execute(f"INSERT INTO sales ({', '.join(SALES_COLUMNS)}) SELECT {', '.join(SALES_COLUMNS)} "
+                 f"FROM sales_reused_ids ORDER BY id")
+    conn.execute("DROP TABLE sales_reused_ids")
+
+
+def migrate_db(db_file=DB_FILE):
+    conn = connect(db_file)
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            ensure_schema(conn)
+    finally:
+        conn.close()
+
+
+# ------------------ #
+# Row access
+# ------------------ #
+def dict_row(cursor, row):
+    # Row factory: plain dicts keyed by column name, ready to serialize
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+def dict_cursor(conn):
+    # Cursor returning dict rows; the connection itself keeps tuple rows for bulk paths
+    cursor = conn.cursor()
+    cursor.row_factory = dict_row
+    return cursor
+
+
+def fetch_sale(conn, sale_id):
+    return dict_cursor(conn).execute("SELECT * FROM sales WHERE id=?", (sale_id,)).fetchone()
+
+
+def last_sale_id(conn):
+    # Highest id ever handed out, deleted sales included; read it under the write lock.
+    # sqlite_sequence tracks it for the sales table (sharded writes record it there too).
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='sales'").fetchone()
+    last = max(row[0] if row else 0, conn.execute("SELECT MAX(id) FROM sales").fetchone()[0] or 0)
+    import sales_shards
+
+    if sales_shards.enabled():
+        last = max(last, sales_shards.max_id())
+    return last
+
+
+def record_sale_ids(conn, last_id):
+    # For ids inserted outside the sales table (month shards), which AUTOINCREMENT cannot see
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'sales', 0 "
+                 "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name='sales')")
+    conn.execute("UPDATE sqlite_sequence SET seq=? WHERE name='sales' AND seq<?", (last_id, last_id))
+
+
+def insert_sale(conn, sale):
+    # sales.id is the rowid, so SQLite assigns the next id atomically inside the insert
+    # (no MAX(id) read, no race between concurrent writers)
+    row = {k: v for k, v in sale.items() if k != "id"}
+    sql = f"INSERT INTO sales ({', '.join(row)}) VALUES ({', '.join(['?'] * len(row))})"
+    if HAS_RETURNING:
+        return conn.execute(sql + " RETURNING id", tuple(row.values())).fetchone()[0]
+    return conn.execute(sql, tuple(row.values())).lastrowid
+
+
+# ------------------ #
+# Table version
+# ------------------ #
+# Bumped by every transaction that changes sales (ETL loads and API writes), so derived
+# artifacts such as exports can tell whether the table changed since they were built
+META_DDL = """CREATE TABLE IF NOT EXISTS sales_meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+)"""
+
+
+def ensure_meta(conn):
+    conn.execute(META_DDL)
+
+
+def bump_table_version(conn):
+    # Call inside the writing transaction
+    conn.execute("INSERT INTO sales_meta (name, value) VALUES ('version', 1) "
+                 "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+
+
+def table_version(conn):
+    return meta_value(conn, "version")
+
+
+def meta_value(conn, name, default=0):
+    row = conn.execute("SELECT value FROM sales_meta WHERE name=?", (name,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta_value(conn, name, value):
+    conn.execute("INSERT INTO sales_meta (name, value) VALUES (?, ?) "
+                 "ON CONFLICT(name) DO UPDATE SET value = excluded.value", (name, value))
+
+
+def normalize_date(value):
+    # Store API dates in the same sortable ISO form as ETL loads
+    return datetime.datetime.fromisoformat(str(value)).strftime(DATE_FORMAT)
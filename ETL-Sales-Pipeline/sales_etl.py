@@ -0,0 +1,799 @@
+#ETL LOAD HELPERS (shared by etl_pipeline.py and server-sideAPI.py)
+import pandas as pd
+import contextlib
+import hashlib
+import json
+import os
+import io
+import datetime
+import time
+import glob
+import itertools
+import pickle
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+# ensure_schema/migrate_db live in sales_db (no pandas) and are re-exported here
+from sales_db import (connect, normalize_date, ensure_schema, migrate_db, bump_table_version, last_sale_id,
+                      record_sale_ids, DATE_FORMAT, SALES_COLUMNS)
+import sales_metrics
+import sales_shards
+from sales_rollups import rebuild_rollups, apply_frame
+# The transform stage lives in sales_transform (shared with the API batch route) and is re-exported here
+from sales_transform import transform_chunk, to_db_rows, TRANSFORM_SCHEMA
+from sales_changes import log_change, log_changes, compact_changes
+
+DB_FILE = "sales.db"
+CSV_FILE = "sales.csv"
+CHUNK_SIZE = 50000
+HASH_WINDOW = 64 * 1024
+WATERMARK_TABLE = "etl_watermark"
+LOAD_MODES = ("incremental", "replace", "upsert")
+
+REJECTS_DDL = """CREATE TABLE IF NOT EXISTS sales_rejects (
+    id INTEGER PRIMARY KEY,
+    source TEXT,
+    source_row INTEGER,
+    reason TEXT,
+    raw TEXT,
+    rejected_at TEXT
+)"""
+
+
+# ------------------------ #
+# 1. Extract & Transform
+# ------------------------ #
+class _BoundedReader(io.RawIOBase):
+    # Byte stream that stops at a fixed end offset of the underlying file
+    def __init__(self, raw, remaining):
+        self.raw = raw
+        self.remaining = remaining
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:min(len(buffer), self.remaining)]
+        count = self.raw.readinto(view)
+        self.remaining -= count
+        return count
+
+
+def read_csv_chunks(csv_file, chunksize=CHUNK_SIZE, offset=0, end=None, names=None):
+    # Read the CSV (or the byte range [offset, end) of it) in bounded chunks
+    if end is None:
+        end = os.path.getsize(csv_file)
+    if end <= offset:
+        return
+    options = {"header": None, "names": names} if names else {}
+    with open(csv_file, "rb") as raw:
+        raw.seek(offset)
+        reader = io.BufferedReader(_BoundedReader(raw, end - offset))
+        text = io.TextIOWrapper(reader, encoding="utf-8", newline="")
+        try:
+            for chunk in pd.read_csv(text, chunksize=chunksize, **options):
+                yield chunk
+        except pd.errors.EmptyDataError:
+            return
+
+
+def iter_transformed_chunks(csv_file, chunksize=CHUNK_SIZE, start_id=1, **read_options):
+    # Yields (clean, rejects) pairs; ids only advance over clean rows
+    next_id = start_id
+    for chunk in read_csv_chunks(csv_file, chunksize, **read_options):
+        clean, rejects = transform_chunk(chunk, start_id=next_id)
+        next_id += len(clean)
+        yield clean, rejects
+
+
+# ------------------ #
+# 2. Load into SQLite
+# ------------------ #
+def insert_chunks(conn, chunks, source=None, parquet_dir=None):
+    # Bulk insert (clean, rejects) pairs, returns (rows inserted, rows rejected, max date seen).
+    # With parquet_dir set, every chunk is also written to the columnar store, which stays
+    # current only if it already was (see sales_columnar.py).
+    # Time spent pulling chunks is the extract_transform stage, the rest is the load stage.
+    # With sharded storage the rows go to their month shards; rows of sealed months are rejected.
+    insert_sql = f"INSERT INTO sales ({', '.join(SALES_COLUMNS)}) VALUES ({', '.join(['?'] * len(SALES_COLUMNS))})"
+    rows = 0
+    rejected = 0
+    max_date = None
+    read_seconds = 0.0
+    started = time.perf_counter()
+    chunks = iter(chunks)
+    if parquet_dir:
+        # pyarrow is only imported by loads that write the columnar store
+        import sales_columnar
+    store_in_sync = bool(parquet_dir) and sales_columnar.store_in_sync(conn)
+    with sales_shards.writer() if sales_shards.enabled() else contextlib.nullcontext() as shards:
+        while True:
+            pulled = time.perf_counter()
+            item = next(chunks, None)
+            read_seconds += time.perf_counter() - pulled
+            if item is None:
+                break
+            df, rejects = item
+            if shards is not None and not df.empty:
+                df, archived = _route_to_shards(shards, df)
+                rejects = pd.concat([rejects, archived]) if not archived.empty else rejects
+            if not rejects.empty:
+                save_rejects(conn, rejects, source)
+                rejected += len(rejects)
+            if df.empty:
+                continue
+            if shards is None:
+                conn.executemany(insert_sql, to_db_rows(df))
+            else:
+                record_sale_ids(conn, int(df["id"].max()))
+            # Chunk ids are contiguous, so the whole chunk is one change log entry
+            log_change(conn, "I", int(df["id"].min()), int(df["id"].max()))
+            apply_frame(conn, df.assign(total_price=df["total_price_cents"] / 100))
+            if parquet_dir:
+                sales_columnar.write_chunk(df, parquet_dir)
+            rows += len(df)
+            chunk_max = df["date"].max()
+            if pd.notna(chunk_max) and (max_date is None or chunk_max > max_date):
+                max_date = chunk_max
+    if rows:
+        bump_table_version(conn)
+    if store_in_sync:
+        sales_columnar.mark_store(conn)
+    sales_metrics.record("extract_transform", runs=1, seconds=read_seconds,
+                         rows_in=rows + rejected, rows_out=rows, rows_rejected=rejected)
+    sales_metrics.record("load", runs=1, seconds=time.perf_counter() - started - read_seconds, rows_in=rows,
+                         rows_out=rows)
+    return rows, rejected, max_date
+
+
+def _route_to_shards(shards, df):
+    # Insert the chunk into its month shards; returns (inserted rows, rejects for sealed months)
+    # Grouped on year * 100 + month; formatting every date as 'YYYY-MM' would cost more than the insert
+    keys = df["date"].dt.year * 100 + df["date"].dt.month
+    archived = keys.isin([k for k in keys.unique() if shards.is_sealed(f"{k // 100:04d}-{k % 100:02d}")])
+    for key, part in df[~archived].groupby(keys[~archived], sort=False):
+        shards.insert(to_db_rows(part), f"{key // 100:04d}-{key % 100:02d}")
+    return df[~archived], df[archived].assign(reason="month is archived (sealed shard)")
+
+
+def save_rejects(conn, rejects, source=None):
+    conn.execute(REJECTS_DDL)
+    raw = rejects.drop(columns="reason").astype(object)
+    raw = raw.where(raw.notna(), None).to_dict(orient="records")
+    now = datetime.datetime.now().strftime(DATE_FORMAT)
+    conn.executemany(
+        "INSERT INTO sales_rejects (source, source_row, reason, raw, rejected_at) VALUES (?, ?, ?, ?, ?)",
+        [
+            (source, int(index), reason, json.dumps(row, default=str), now)
+            for index, reason, row in zip(rejects.index, rejects["reason"], raw)
+        ],
+    )
+
+
+# ------------------ #
+# Watermark
+# ------------------ #
+def _hash_range(csv_file, start, end):
+    with open(csv_file, "rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(max(end - start, 0))).hexdigest()
+
+
+def file_fingerprint(csv_file, offset):
+    # Hash the head and the tail of the already-loaded region of the file
+    head = _hash_range(csv_file, 0, min(HASH_WINDOW, offset))
+    tail = _hash_range(csv_file, max(offset - HASH_WINDOW, 0), offset)
+    return head, tail
+
+
+def ensure_watermark_table(conn):
+    conn.execute(
+        f"""CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+            source TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            byte_offset INTEGER,
+            head_hash TEXT,
+            tail_hash TEXT,
+            columns TEXT,
+            row_count INTEGER,
+            max_date TEXT,
+            loaded_at TEXT
+        )"""
+    )
+
+
+def clear_watermarks(conn):
+    # A replace rebuilds sales from its sources alone, so no earlier file position stays valid
+    ensure_watermark_table(conn)
+    conn.execute(f"DELETE FROM {WATERMARK_TABLE}")
+
+
+def get_watermark(conn, csv_file):
+    ensure_watermark_table(conn)
+    cursor = conn.execute(
+        f"SELECT * FROM {WATERMARK_TABLE} WHERE source=?", (os.path.abspath(csv_file),)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([col[0] for col in cursor.description], row))
+
+
+def save_watermark(conn, csv_file, stat, columns, row_count, max_date):
+    head, tail = file_fingerprint(csv_file, stat.st_size)
+    if max_date is not None and not isinstance(max_date, str):
+        max_date = max_date.strftime(DATE_FORMAT)
+    conn.execute(
+        f"INSERT OR REPLACE INTO {WATERMARK_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            os.path.abspath(csv_file), stat.st_size, stat.st_mtime_ns, stat.st_size,
+            head, tail, json.dumps(columns), row_count, max_date,
+            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        ),
+    )
+
+
+def table_exists(conn, table):
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return cursor.fetchone() is not None
+
+
+# ------------------ #
+# Load modes
+# ------------------ #
+def stream_init_db(csv_file, db_file=DB_FILE, chunksize=CHUNK_SIZE, parquet_dir=None):
+    # Full reload: rebuild the sales table chunk by chunk inside a single transaction
+    stat = os.stat(csv_file)
+    columns = list(pd.read_csv(csv_file, nrows=0).columns)
+    conn = connect(db_file)
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("DROP TABLE IF EXISTS sales")
+            with sales_shards.replacing():
+                ensure_schema(conn)
+                rebuild_rollups(conn)
+                bump_table_version(conn)
+                log_change(conn, "R")
+                conn.execute(REJECTS_DDL)
+                conn.execute("DELETE FROM sales_rejects WHERE source=?", (os.path.abspath(csv_file),))
+                chunks = iter_transformed_chunks(csv_file, chunksize, end=stat.st_size)
+                sales_metrics.record("extract_transform", bytes_read=stat.st_size)
+                if parquet_dir:
+                    import sales_columnar
+
+                    sales_columnar.clear_store(parquet_dir)
+                    sales_columnar.mark_store(conn)
+                rows, rejected, max_date = insert_chunks(conn, chunks, os.path.abspath(csv_file), parquet_dir)
+                clear_watermarks(conn)
+                save_watermark(conn, csv_file, stat, columns, rows, max_date)
+    finally:
+        conn.close()
+    _report_rejects(csv_file, rejected)
+    return rows
+
+
+def incremental_load(csv_file, db_file=DB_FILE, chunksize=CHUNK_SIZE, parquet_dir=None):
+    # Append-only reload keyed on the file watermark; keeps rows added through the API.
+    # A source without a watermark (first load, or the file was moved or renamed) is appended
+    # in full; only mode="replace" (--full-reload) drops the table.
+    stat = os.stat(csv_file)
+    conn = connect(db_file)
+    try:
+        had_sales = table_exists(conn, "sales")
+        with conn:
+            conn.execute("BEGIN")
+            ensure_schema(conn)
+            ensure_watermark_table(conn)
+        watermark = get_watermark(conn, csv_file) if had_sales else None
+        if watermark is None:
+            print(f"No watermark for {csv_file}, appending all its rows.")
+        elif watermark["size"] == stat.st_size and watermark["mtime_ns"] == stat.st_mtime_ns:
+            print(f"{csv_file} unchanged since last load, skipping.")
+            return 0
+        with conn:
+            # IMMEDIATE takes the write lock before the last id is read, so API writers
+            # cannot claim ids inside the range this load reserves
+            conn.execute("BEGIN IMMEDIATE")
+            rows = _load_new_rows(conn, csv_file, stat, watermark, chunksize, parquet_dir)
+    finally:
+        conn.close()
+    print(f"Loaded {rows} new rows from {csv_file}.")
+    return rows
+
+
+def _load_new_rows(conn, csv_file, stat, watermark, chunksize, parquet_dir=None):
+    # watermark None: a source not loaded before, all of its rows are new
+    next_id = last_sale_id(conn) + 1
+    previous_max = pd.Timestamp(watermark["max_date"]) if watermark and watermark["max_date"] else None
+    offset = watermark["byte_offset"] if watermark else 0
+    appended = watermark is not None and stat.st_size > offset and file_fingerprint(csv_file, offset) == (
+        watermark["head_hash"], watermark["tail_hash"])
+    skipped = [0]
+
+    if appended:
+        # Only the bytes written after the last load are new
+        columns = json.loads(watermark["columns"])
+        chunks = iter_transformed_chunks(
+            csv_file, chunksize, start_id=next_id,
+            offset=offset, end=stat.st_size, names=columns)
+        row_count = watermark["row_count"]
+        sales_metrics.record("extract_transform", bytes_read=stat.st_size - offset)
+    else:
+        columns = list(pd.read_csv(csv_file, nrows=0).columns)
+        sales_metrics.record("extract_transform", bytes_read=stat.st_size)
+        # The reject table mirrors the current version of the file
+        conn.execute(REJECTS_DDL)
+        conn.execute("DELETE FROM sales_rejects WHERE source=?", (os.path.abspath(csv_file),))
+        if watermark is not None and not sales_shards.enabled():
+            # Rewritten file: back-dated rows can be new too, so merge it on the natural key
+            rows, row_count, max_date = _merge_rewritten(conn, csv_file, stat, chunksize, parquet_dir)
+            save_watermark(conn, csv_file, stat, columns, row_count, max_date)
+            return rows
+        # New source (everything is taken), or a rewritten file in sharded storage, which
+        # cannot merge: only rows newer than the loaded max date are taken, the rest is counted
+        chunks = (
+            (_split_late(df, previous_max, skipped), rejects)
+            for df, rejects in iter_transformed_chunks(csv_file, chunksize, end=stat.st_size)
+        )
+        chunks = _renumber(chunks, next_id)
+        row_count = 0
+
+    rows, rejected, max_date = insert_chunks(conn, chunks, os.path.abspath(csv_file), parquet_dir)
+    if max_date is None or (previous_max is not None and previous_max > max_date):
+        max_date = previous_max
+    save_watermark(conn, csv_file, stat, columns, row_count + rows, max_date)
+    _report_rejects(csv_file, rejected)
+    if skipped[0]:
+        print(f"Skipped {skipped[0]} rows of rewritten {csv_file} dated on or before {previous_max:%Y-%m-%d} "
+              f"({watermark['row_count']} were loaded from it before; sharded storage cannot merge them). "
+              f"Run a full reload to include back-dated rows.")
+    return rows
+
+
+def _split_late(df, previous_max, skipped):
+    if previous_max is None:
+        return df
+    late = df["date"] <= previous_max
+    skipped[0] += int(late.sum())
+    return df[~late]
+
+
+def _merge_rewritten(conn, csv_file, stat, chunksize, parquet_dir=None):
+    # Upsert a rewritten file on UPSERT_KEY inside the caller's transaction: rows loaded
+    # before match (or update) their sales, the rest are inserted whatever their date.
+    # Returns (rows inserted, clean rows in the file, max date)
+    key = UPSERT_KEY
+    source = os.path.abspath(csv_file)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_sales_key_{'_'.join(key)} ON sales ({', '.join(key)})")
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS upsert_keys (pos INTEGER PRIMARY KEY, {', '.join(key)})")
+    if parquet_dir:
+        import sales_columnar
+    store_in_sync = bool(parquet_dir) and sales_columnar.store_in_sync(conn)
+    counts = dict.fromkeys(["inserted", "updated", "unchanged", "duplicates"], 0)
+    rows = rejected = 0
+    max_date = None
+    for df, rejects in iter_transformed_chunks(csv_file, chunksize, end=stat.st_size):
+        if not rejects.empty:
+            save_rejects(conn, rejects, source)
+            rejected += len(rejects)
+        if df.empty:
+            continue
+        deduped = df.drop_duplicates(["unit_price_cents" if c == "unit_price" else c for c in key], keep="last")
+        counts["duplicates"] += len(df) - len(deduped)
+        inserted, updated, unchanged = _merge_partition(conn, deduped, key, parquet_dir)
+        counts["inserted"] += inserted
+        counts["updated"] += updated
+        counts["unchanged"] += unchanged
+        rows += len(df)
+        chunk_max = df["date"].max()
+        if pd.notna(chunk_max) and (max_date is None or chunk_max > max_date):
+            max_date = chunk_max
+    if counts["inserted"] or counts["updated"]:
+        bump_table_version(conn)
+    # Updated sales are not rewritten in the store, so updates leave it stale
+    if store_in_sync and not counts["updated"]:
+        sales_columnar.mark_store(conn)
+    sales_metrics.record("load", runs=1, rows_in=rows, rows_out=counts["inserted"] + counts["updated"])
+    print(f"{csv_file} was rewritten, merged on ({', '.join(key)}): {counts['inserted']} inserted, "
+          f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['duplicates']} duplicate rows.")
+    _report_rejects(csv_file, rejected)
+    return counts["inserted"], rows, max_date
+
+
+def _renumber(chunks, start_id):
+    next_id = start_id
+    for df, rejects in chunks:
+        df = df.reset_index(drop=True)
+        df["id"] = df.index + next_id
+        next_id += len(df)
+        yield df, rejects
+
+
+def _report_rejects(csv_file, rejected):
+    if rejected:
+        print(f"Rejected {rejected} rows from {csv_file} (see the sales_rejects table).")
+
+
+# ------------------ #
+# Multi-file loads
+# ------------------ #
+def expand_sources(source):
+    # A single CSV, a directory of CSVs or a glob pattern -> sorted list of files
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.csv")))
+    if glob.has_magic(source):
+        return sorted(glob.glob(source))
+    return [source] if os.path.exists(source) else []
+
+
+def _transform_file(csv_file, chunksize):
+    # Runs in a worker process: parse and transform one file; ids are assigned by the writer
+    stat = os.stat(csv_file)
+    columns = list(pd.read_csv(csv_file, nrows=0).columns)
+    chunks = list(iter_transformed_chunks(csv_file, chunksize, end=stat.st_size))
+    return csv_file, stat, columns, chunks
+
+
+def _iter_parallel(files, workers, chunksize):
+    # Yield transformed files in input order while at most 2 * workers are in flight
+    if workers <= 1:
+        for csv_file in files:
+            yield _transform_file(csv_file, chunksize)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        files = iter(files)
+        pending = deque(
+            pool.submit(_transform_file, csv_file, chunksize)
+            for csv_file in itertools.islice(files, workers * 2)
+        )
+        while pending:
+            result = pending.popleft().result()
+            csv_file = next(files, None)
+            if csv_file is not None:
+                pending.append(pool.submit(_transform_file, csv_file, chunksize))
+            yield result
+
+
+def parallel_load(files, db_file=DB_FILE, mode="incremental", workers=None, chunksize=CHUNK_SIZE,
+                  parquet_dir=None):
+    # Parse files in a process pool and funnel them into one writer with ordered bulk inserts
+    workers = workers or os.cpu_count() or 1
+    rows = rejected = skipped = 0
+    conn = connect(db_file)
+    try:
+        with conn, contextlib.ExitStack() as stack:
+            conn.execute("BEGIN IMMEDIATE")  # reserves the id range, see incremental_load
+            had_sales = table_exists(conn, "sales")
+            if mode == "replace":
+                conn.execute("DROP TABLE IF EXISTS sales")
+                stack.enter_context(sales_shards.replacing())
+            ensure_schema(conn)
+            if mode == "replace":
+                rebuild_rollups(conn)
+                bump_table_version(conn)
+                log_change(conn, "R")
+                if parquet_dir:
+                    import sales_columnar
+
+                    sales_columnar.clear_store(parquet_dir)
+                    sales_columnar.mark_store(conn)
+            conn.execute(REJECTS_DDL)
+            if mode == "replace":
+                clear_watermarks(conn)
+            else:
+                ensure_watermark_table(conn)
+
+            new_files, changed = list(files), []
+            if mode == "incremental" and had_sales:
+                new_files = []
+                for csv_file in files:
+                    watermark = get_watermark(conn, csv_file)
+                    stat = os.stat(csv_file)
+                    if watermark is None:
+                        new_files.append(csv_file)
+                    elif watermark["size"] == stat.st_size and watermark["mtime_ns"] == stat.st_mtime_ns:
+                        skipped += 1
+                    else:
+                        changed.append((csv_file, stat, watermark))
+
+            next_id = last_sale_id(conn) + 1
+            for csv_file, stat, columns, chunks in _iter_parallel(new_files, workers, chunksize):
+                source = os.path.abspath(csv_file)
+                sales_metrics.record("extract_transform", bytes_read=stat.st_size)
+                conn.execute("DELETE FROM sales_rejects WHERE source=?", (source,))
+                file_rows, file_rejected, max_date = insert_chunks(
+                    conn, _renumber(chunks, next_id), source, parquet_dir)
+                save_watermark(conn, csv_file, stat, columns, file_rows, max_date)
+                next_id += file_rows
+                rows += file_rows
+                rejected += file_rejected
+
+            # Files that were loaded before and have changed go through the incremental path
+            for csv_file, stat, watermark in changed:
+                rows += _load_new_rows(conn, csv_file, stat, watermark, chunksize, parquet_dir)
+    finally:
+        conn.close()
+
+    print(f"Loaded {rows} new rows from {len(files) - skipped} files ({skipped} unchanged, {workers} workers).")
+    _report_rejects(f"{len(new_files)} new files", rejected)
+    return rows
+
+
+# ------------------ #
+# Upsert loads
+# ------------------ #
+# mode="upsert" merges the source into sales on a natural key instead of appending, so a
+# re-delivered or overlapping extract updates the sales it loaded before rather than
+# duplicating them. Clean rows are hash-partitioned on the key (spilled to temporary files
+# once the source is larger than UPSERT_PARTITION_BYTES), each partition is deduplicated in
+# memory (the last row of a key wins) and merged in its own transaction. Existing sales are
+# found through an index on the key columns, so the cost follows the source, not the table.
+UPSERT_KEY = ("date", "customer_id", "product")
+UPSERT_KEY_COLUMNS = ("date", "customer_id", "product", "quantity", "unit_price")
+UPSERT_PARTITION_BYTES = 64 * 1024 * 1024
+UPSERT_SQL = (
+    f"INSERT INTO sales ({', '.join(SALES_COLUMNS)}) VALUES ({', '.join(['?'] * len(SALES_COLUMNS))}) "
+    f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in SALES_COLUMNS[1:])}"
+)
+
+
+def parse_upsert_key(key=None):
+    # "date,customer_id,product" or a sequence of sales columns -> tuple
+    if key is None:
+        return UPSERT_KEY
+    if isinstance(key, str):
+        key = key.split(",")
+    key = tuple(column.strip().lower() for column in key if column.strip())
+    if not key or len(set(key)) != len(key) or any(column not in UPSERT_KEY_COLUMNS for column in key):
+        raise ValueError(f"Invalid upsert key {list(key)}. Use columns from: {', '.join(UPSERT_KEY_COLUMNS)}")
+    return key
+
+
+def _key_hash(df, key):
+    # Stable per-value hash of the key columns (chunks may downcast integers differently)
+    columns = {}
+    for column in key:
+        if column == "product":
+            columns[column] = df[column].astype(str)
+        else:
+            columns[column] = df["unit_price_cents" if column == "unit_price" else column].astype("int64")
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False)
+
+
+def _db_frame(df):
+    # Transformed rows as they are stored in sales (ISO date text, prices in currency units)
+    return pd.DataFrame({
+        "id": df["id"].astype("int64"),
+        "date": df["date"].dt.strftime(DATE_FORMAT),
+        "customer_id": df["customer_id"].astype("int64"),
+        "product": df["product"].astype(str),
+        "quantity": df["quantity"].astype("int64"),
+        "unit_price": df["unit_price_cents"] / 100,
+        "total_price": df["total_price_cents"] / 100,
+    })
+
+
+def _partition_sources(conn, files, key, partitions, spill_dir, chunksize):
+    # Transform every file and split its clean rows by key hash. A partition is a list of
+    # frames, or with spill_dir a file of pickled frames. Rejects are saved per file.
+    # Returns (partitions, [(file, stat, columns, rows, max_date)], rejected)
+    if spill_dir:
+        parts = [os.path.join(spill_dir, f"part-{p:04d}.pkl") for p in range(partitions)]
+        writers = [open(path, "wb") for path in parts]
+    else:
+        parts = [[] for _ in range(partitions)]
+    loaded = []
+    rejected = 0
+    next_row = 0
+    try:
+        for csv_file in files:
+            stat = os.stat(csv_file)
+            source = os.path.abspath(csv_file)
+            columns = list(pd.read_csv(csv_file, nrows=0).columns)
+            with conn:
+                conn.execute("DELETE FROM sales_rejects WHERE source=?", (source,))
+            rows = 0
+            max_date = None
+            for df, rejects in iter_transformed_chunks(csv_file, chunksize, end=stat.st_size):
+                if not rejects.empty:
+                    with conn:
+                        save_rejects(conn, rejects, source)
+                    rejected += len(rejects)
+                if df.empty:
+                    continue
+                # Until the merge assigns sale ids, id is the row's position in the source, so
+                # the last row of a key wins across chunks and files
+                df["id"] = range(next_row, next_row + len(df))
+                next_row += len(df)
+                rows += len(df)
+                chunk_max = df["date"].max()
+                if max_date is None or chunk_max > max_date:
+                    max_date = chunk_max
+                buckets = _key_hash(df, key) % partitions
+                for p, part in df.groupby(buckets.to_numpy(), sort=False):
+                    if spill_dir:
+                        pickle.dump(part, writers[p], protocol=pickle.HIGHEST_PROTOCOL)
+                    else:
+                        parts[p].append(part)
+            loaded.append((csv_file, stat, columns, rows, max_date))
+            sales_metrics.record("extract_transform", bytes_read=stat.st_size)
+    finally:
+        if spill_dir:
+            for writer in writers:
+                writer.close()
+    return parts, loaded, rejected
+
+
+def _read_partition(part):
+    if isinstance(part, list):
+        frames = part
+    else:
+        frames = []
+        with open(part, "rb") as f:
+            while True:
+                try:
+                    frames.append(pickle.load(f))
+                except EOFError:
+                    break
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def _merge_partition(conn, df, key, parquet_dir=None):
+    # Upsert one deduplicated partition; returns (inserted, updated, unchanged)
+    rows = _db_frame(df)
+    conn.execute("DELETE FROM temp.upsert_keys")
+    conn.executemany(f"INSERT INTO temp.upsert_keys VALUES ({', '.join(['?'] * (len(key) + 1))})",
+                     rows[["id", *key]].astype(object).itertuples(index=False, name=None))
+    # CROSS JOIN keeps the partition as the outer loop: one index probe per incoming row,
+    # where the planner would otherwise scan sales against the (unanalyzed) temp table
+    join = " AND ".join(f"s.{column} = k.{column}" for column in key)
+    existing = pd.DataFrame(
+        conn.execute(f"SELECT k.pos, s.* FROM temp.upsert_keys k CROSS JOIN sales s ON {join} ORDER BY s.id").fetchall(),
+        columns=["pos", *SALES_COLUMNS],
+    )
+    # sales may already hold duplicates of a key from earlier appends; the oldest one is kept current
+    existing = existing.drop_duplicates("pos").set_index("pos")
+
+    rows = rows.set_index("id", drop=False)
+    matched = rows.loc[existing.index].assign(id=existing["id"])
+    values = SALES_COLUMNS[1:]
+    changed = (matched[values] != existing[values]).any(axis=1)
+    updated, old = matched[changed], existing[changed]
+    new = rows.drop(existing.index)
+
+    first_id = last_sale_id(conn) + 1
+    new = new.assign(id=range(first_id, first_id + len(new)))
+    writes = pd.concat([updated, new])
+    if writes.empty:
+        return 0, 0, len(matched)
+    conn.executemany(UPSERT_SQL, writes[SALES_COLUMNS].astype(object).itertuples(index=False, name=None))
+    if not new.empty:
+        log_change(conn, "I", first_id, first_id + len(new) - 1)
+    log_changes(conn, "U", updated["id"].tolist())
+    apply_frame(conn, old, sign=-1)
+    apply_frame(conn, writes)
+    if parquet_dir and not new.empty:
+        # Append-only store: updated sales reach it with the next full reload
+        import sales_columnar
+
+        sales_columnar.write_chunk(df.set_index("id", drop=False).loc[new.index].assign(id=new["id"].to_numpy()),
+                                   parquet_dir)
+    return len(new), len(updated), len(matched) - len(updated)
+
+
+def upsert_load(files, db_file=DB_FILE, key=None, chunksize=CHUNK_SIZE, parquet_dir=None):
+    # Returns {"inserted", "updated", "unchanged", "duplicates", "rejected"}
+    key = parse_upsert_key(key)
+    partitions = max(1, -(-sum(os.path.getsize(f) for f in files) // UPSERT_PARTITION_BYTES))
+    spill_dir = tempfile.mkdtemp(prefix="sales_upsert_") if partitions > 1 else None
+    counts = dict.fromkeys(["inserted", "updated", "unchanged", "duplicates", "rejected"], 0)
+    if parquet_dir:
+        import sales_columnar
+    conn = connect(db_file)
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            ensure_schema(conn)
+            conn.execute(REJECTS_DDL)
+            ensure_watermark_table(conn)
+            # Built once; later upserts on the same key only probe it
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_sales_key_{'_'.join(key)} ON sales ({', '.join(key)})")
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS upsert_keys (pos INTEGER PRIMARY KEY, {', '.join(key)})")
+
+        started = time.perf_counter()
+        parts, loaded, counts["rejected"] = _partition_sources(conn, files, key, partitions, spill_dir, chunksize)
+        rows_in = sum(item[3] for item in loaded)
+        sales_metrics.record("extract_transform", runs=1, seconds=time.perf_counter() - started,
+                             rows_in=rows_in + counts["rejected"], rows_out=rows_in,
+                             rows_rejected=counts["rejected"])
+
+        started = time.perf_counter()
+        for part in parts:
+            df = _read_partition(part)
+            if df is None:
+                continue
+            deduped = df.sort_values("id").drop_duplicates(
+                ["unit_price_cents" if c == "unit_price" else c for c in key], keep="last")
+            counts["duplicates"] += len(df) - len(deduped)
+            # One transaction per partition; a failed load can simply be run again
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                store_in_sync = bool(parquet_dir) and sales_columnar.store_in_sync(conn)
+                inserted, updated, unchanged = _merge_partition(conn, deduped, key, parquet_dir)
+                if inserted or updated:
+                    bump_table_version(conn)
+                # Updated sales are not rewritten in the store, so updates leave it stale
+                if store_in_sync and not updated:
+                    sales_columnar.mark_store(conn)
+            counts["inserted"] += inserted
+            counts["updated"] += updated
+            counts["unchanged"] += unchanged
+        with conn:
+            for csv_file, stat, columns, rows, max_date in loaded:
+                save_watermark(conn, csv_file, stat, columns, rows, max_date)
+        sales_metrics.record("load", runs=1, seconds=time.perf_counter() - started,
+                             rows_in=rows_in - counts["duplicates"], rows_out=counts["inserted"] + counts["updated"])
+    finally:
+        conn.close()
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    print(f"Upserted {len(files)} files on ({', '.join(key)}): {counts['inserted']} inserted, "
+          f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['duplicates']} duplicate rows.")
+    _report_rejects(f"{len(files)} files", counts["rejected"])
+    return counts
+
+
+def load_sales(source=CSV_FILE, db_file=DB_FILE, mode="incremental", chunksize=CHUNK_SIZE, workers=None,
+               parquet_dir=None, key=None):
+    # source is a CSV file, a directory of CSVs or a glob like "incoming/sales_*.csv".
+    # parquet_dir additionally writes the loaded rows to the columnar store (needs pyarrow).
+    # mode="upsert" merges on the natural key (see upsert_load) and returns its counts.
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode '{mode}'. Use {', '.join(repr(m) for m in LOAD_MODES)}")
+    if parquet_dir:
+        import sales_columnar
+
+        sales_columnar.require_pyarrow()
+    if sales_shards.enabled():
+        if mode == "upsert":
+            raise ValueError("Upsert loads are not supported with sharded storage (SALES_SHARD_DIR)")
+        if mode != "replace":
+            conn = connect(db_file)
+            try:
+                sales_shards.check_unsplit(conn)
+            finally:
+                conn.close()
+    if mode == "upsert":
+        files = [source] if os.path.isfile(source) else expand_sources(source)
+        if not files:
+            raise FileNotFoundError(f"No CSV files found for '{source}'")
+        rows = upsert_load(files, db_file, key, chunksize, parquet_dir)
+    elif os.path.isfile(source):
+        if mode == "replace":
+            rows = stream_init_db(source, db_file, chunksize, parquet_dir)
+        else:
+            rows = incremental_load(source, db_file, chunksize, parquet_dir)
+    else:
+        files = expand_sources(source)
+        if not files:
+            raise FileNotFoundError(f"No CSV files found for '{source}'")
+        rows = parallel_load(files, db_file, mode, workers, chunksize, parquet_dir)
+    compact_change_log(db_file)
+    return rows
+
+
+def compact_change_log(db_file=DB_FILE):
+    # Drop superseded and expired change log entries (see sales_changes.py)
+    conn = connect(db_file)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return compact_changes(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,269 @@
+#BACKGROUND EXPORT JOBS
+# POST /sales/export queues an export and answers with a job id right away. A small thread
+# pool in each API process writes the file in chunks (optionally gzip-compressed) while
+# GET /sales/export/<job> reports progress and, once the job is done, serves the artifact.
+# Jobs are rows in the export_jobs table, so any worker process can answer for any job.
+# An export is keyed on its format, compression and query plus the sales table version:
+# asking again before the table changes returns the existing job and its artifact.
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sales_db import connect, get_connection, dict_cursor, table_version, DB_FILE, DATE_FORMAT
+from sales_json import dumps_bytes
+import sales_shards
+
+EXPORT_DIR = os.environ.get("SALES_EXPORT_DIR", "exports")
+EXPORT_WORKERS = int(os.environ.get("SALES_EXPORT_WORKERS", 2))
+CHUNK_ROWS = 50000
+GZIP_LEVEL = 6
+EXCEL_MAX_ROWS = 1048575  # sheet limit minus the header row
+# format -> (file extension, mimetype, gzip allowed); xlsx is already a zip archive
+FORMATS = {
+    "csv": (".csv", "text/csv", True),
+    "ndjson": (".ndjson", "application/x-ndjson", True),
+    "excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", False),
+}
+PENDING = ("queued", "running")
+
+JOBS_DDL = """CREATE TABLE IF NOT EXISTS export_jobs (
+    id TEXT PRIMARY KEY,
+    export_key TEXT NOT NULL,
+    format TEXT NOT NULL,
+    gzip INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    total_rows INTEGER,
+    path TEXT,
+    error TEXT,
+    pid INTEGER,
+    created_at TEXT NOT NULL,
+    finished_at TEXT
+)"""
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_ready = set()  # db files whose export_jobs table exists
+
+
+def _executor():
+    # Created on first use in each process; forked API workers never share a parent's threads
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def ensure_jobs_table(conn, db_file=DB_FILE):
+    if db_file in _ready:
+        return
+    with conn:
+        conn.execute(JOBS_DDL)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_key ON export_jobs (export_key, version)")
+    _ready.add(db_file)
+
+
+def export_key(fmt, compress, sql, params):
+    return hashlib.sha1(json.dumps([fmt, bool(compress), sql, list(params)]).encode("utf-8")).hexdigest()
+
+
+def _now():
+    return datetime.datetime.now().strftime(DATE_FORMAT)
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        return True  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _is_orphaned(job):
+    # Queued/running in a worker process that has since exited
+    return job["status"] in PENDING and job["pid"] != os.getpid() and not _pid_alive(job["pid"])
+
+
+def _update(conn, job_id, **fields):
+    with conn:
+        conn.execute(f"UPDATE export_jobs SET {', '.join(f'{k}=?' for k in fields)} WHERE id=?",
+                     (*fields.values(), job_id))
+
+
+# ------------------ #
+# Jobs
+# ------------------ #
+def submit_export(fmt, sql, params, compress=False, db_file=DB_FILE, shard_filters=None):
+    # Returns (job, created). An identical export of the current table version is reused
+    # while it is pending or its artifact still exists. shard_filters (date range and limit
+    # of the query) select the shards to read with sharded storage.
+    key = export_key(fmt, compress, sql, params)
+    conn = get_connection(db_file)
+    ensure_jobs_table(conn, db_file)
+    with conn:
+        # IMMEDIATE: two workers receiving the same request at once still create one job
+        conn.execute("BEGIN IMMEDIATE")
+        version = table_version(conn)
+        for job in dict_cursor(conn).execute(
+                "SELECT * FROM export_jobs WHERE export_key=? AND version>=? AND status IN ('queued', 'running', 'done') "
+                "ORDER BY created_at DESC", (key, version)).fetchall():
+            reusable = os.path.exists(job["path"]) if job["status"] == "done" else not _is_orphaned(job)
+            if reusable:
+                return job, False
+        job = {"id": uuid.uuid4().hex, "export_key": key, "format": fmt, "gzip": int(bool(compress)),
+               "version": version, "status": "queued", "pid": os.getpid(), "created_at": _now()}
+        conn.execute(f"INSERT INTO export_jobs ({', '.join(job)}) VALUES ({', '.join(['?'] * len(job))})",
+                     tuple(job.values()))
+    _executor().submit(_run_export, job, sql, params, db_file, shard_filters or {})
+    return get_job(job["id"], db_file), True
+
+
+def get_job(job_id, db_file=DB_FILE):
+    conn = get_connection(db_file)
+    ensure_jobs_table(conn, db_file)
+    job = dict_cursor(conn).execute("SELECT * FROM export_jobs WHERE id=?", (job_id,)).fetchone()
+    if job is not None and _is_orphaned(job):
+        _update(conn, job_id, status="failed", error="Export worker exited before finishing", finished_at=_now())
+        job = dict_cursor(conn).execute("SELECT * FROM export_jobs WHERE id=?", (job_id,)).fetchone()
+    return job
+
+
+def describe(job):
+    # JSON view of a job row for the API
+    extension = FORMATS[job["format"]][0] + (".gz" if job["gzip"] else "")
+    progress = None
+    if job["total_rows"]:
+        progress = round(100 * job["rows_written"] / job["total_rows"], 1)
+    elif job["status"] == "done":
+        progress = 100.0
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "format": job["format"],
+        "gzip": bool(job["gzip"]),
+        "table_version": job["version"],
+        "rows_written": job["rows_written"],
+        "total_rows": job["total_rows"],
+        "progress": progress,
+        "filename": f"sales_export_v{job['version']}{extension}",
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+def _run_export(job, sql, params, db_file, shard_filters=None):
+    progress = get_connection(db_file)
+    snapshot = connect(db_file)
+    part = None
+    try:
+        # One read transaction, so version, row count and rows all come from the same snapshot
+        snapshot.execute("BEGIN")
+        version = table_version(snapshot)
+        if sales_shards.enabled():
+            # Shards share no snapshot; the rows may be newer than the version read above
+            total = sales_shards.count(sql, params, **shard_filters)
+            cursor = sales_shards.execute(sql, params, **shard_filters)
+        else:
+            total = snapshot.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+            cursor = snapshot.execute(sql, params)
+        _update(progress, job["id"], status="running", version=version, total_rows=total)
+        if job["format"] == "excel" and total > EXCEL_MAX_ROWS:
+            raise ValueError(f"{total} rows do not fit in one Excel sheet, export csv instead")
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        extension = FORMATS[job["format"]][0] + (".gz" if job["gzip"] else "")
+        path = os.path.join(EXPORT_DIR, f"sales_export_v{version}_{job['id']}{extension}")
+        part = path + ".part"
+        written = 0
+
+        def on_chunk(rows):
+            nonlocal written
+            written += rows
+            _update(progress, job["id"], rows_written=written)
+
+        WRITERS[job["format"]](cursor, part, job["gzip"], on_chunk)
+        os.replace(part, path)
+        _update(progress, job["id"], status="done", path=path, rows_written=written, finished_at=_now())
+        _expire_superseded(progress, job["export_key"], version)
+    except Exception as e:
+        _update(progress, job["id"], status="failed", error=str(e), finished_at=_now())
+        if part and os.path.exists(part):
+            os.remove(part)
+    finally:
+        snapshot.rollback()
+        snapshot.close()
+
+
+def _expire_superseded(conn, key, version):
+    # Artifacts of older table versions can never be served again
+    old = conn.execute("SELECT id, path FROM export_jobs WHERE export_key=? AND version<? AND status='done'",
+                       (key, version)).fetchall()
+    for job_id, path in old:
+        if path and os.path.exists(path):
+            os.remove(path)
+        _update(conn, job_id, status="expired")
+
+
+# ------------------ #
+# Chunked writers
+# ------------------ #
+def _chunks(cursor):
+    return iter(lambda: cursor.fetchmany(CHUNK_ROWS), [])
+
+
+def _open(path, compress, mode):
+    text = {"encoding": "utf-8", "newline": ""} if "t" in mode else {}
+    if compress:
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL, **text)
+    return open(path, mode, **text)
+
+
+def write_csv(cursor, path, compress, on_chunk):
+    with _open(path, compress, "wt") as f:
+        writer = csv.writer(f)
+        writer.writerow([col[0] for col in cursor.description])
+        for rows in _chunks(cursor):
+            writer.writerows(rows)
+            on_chunk(len(rows))
+
+
+def write_ndjson(cursor, path, compress, on_chunk):
+    columns = [col[0] for col in cursor.description]
+    with _open(path, compress, "wb") as f:
+        for rows in _chunks(cursor):
+            f.write(b"".join(dumps_bytes(dict(zip(columns, row))) + b"\n" for row in rows))
+            on_chunk(len(rows))
+
+
+def write_excel(cursor, path, compress, on_chunk):
+    # openpyxl's write-only mode streams rows to disk instead of building the sheet in memory
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Excel exports need openpyxl installed on the server")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("sales")
+    sheet.append([col[0] for col in cursor.description])
+    for rows in _chunks(cursor):
+        for row in rows:
+            sheet.append(row)
+        on_chunk(len(rows))
+    workbook.save(path)
+
+
+WRITERS = {"csv": write_csv, "ndjson": write_ndjson, "excel": write_excel}
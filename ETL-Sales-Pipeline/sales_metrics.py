@@ -0,0 +1,172 @@
+#METRICS (ETL stage + API route instrumentation)
+# Process-wide counters rendered as Prometheus text (GET /metrics) or as a JSON run
+# report (etl_pipeline.py --report). Stages:
+# - extract_transform: writer time spent reading/parsing/validating chunks (waiting on
+#   the worker pool for parallel loads), rows in/out/rejected and bytes read
+# - load: time spent inserting rows, updating rollups and writing Parquet
+# Metrics are per process; with several API workers each one reports its own.
+import datetime
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGE_FIELDS = ["runs", "seconds", "rows_in", "rows_out", "rows_rejected", "bytes_read"]
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+_lock = threading.Lock()
+_stages = {}
+_routes = {}
+_started = time.time()
+
+
+def _vm_hwm():
+    # Linux high-water mark of this process image; unlike ru_maxrss it is reset by exec,
+    # so a subprocess does not inherit the peak of the process that started it
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_bytes():
+    # Peak resident set size of this process and its finished children (e.g. ETL workers)
+    if resource is not None:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        own = _vm_hwm() or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        return max(own, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+# ------------------ #
+# ETL stages
+# ------------------ #
+def record(stage, **counts):
+    # Add seconds/rows/bytes to a stage; call once per stage run with runs=1
+    with _lock:
+        totals = _stages.setdefault(stage, dict.fromkeys(STAGE_FIELDS, 0))
+        for name, value in counts.items():
+            totals[name] += value
+
+
+@contextmanager
+def timed(stage, **counts):
+    # with timed("load", rows_out=n): ... records the wall time of the block
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, runs=1, seconds=time.perf_counter() - started, **counts)
+
+
+def stage_snapshot():
+    with _lock:
+        return {name: {**totals, "seconds": round(totals["seconds"], 6)} for name, totals in _stages.items()}
+
+
+def run_report(**extra):
+    # JSON-friendly summary of everything recorded in this process so far
+    finished = time.time()
+    return {
+        "started_at": datetime.datetime.fromtimestamp(_started).isoformat(timespec="seconds"),
+        "finished_at": datetime.datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+        "seconds": round(finished - _started, 3),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "stages": stage_snapshot(),
+        **extra,
+    }
+
+
+def write_run_report(path, **extra):
+    report = run_report(**extra)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+# ------------------ #
+# API routes
+# ------------------ #
+def observe_request(route, method, status, seconds):
+    with _lock:
+        stats = _routes.get((route, method))
+        if stats is None:
+            stats = _routes[(route, method)] = {
+                "statuses": {}, "count": 0, "seconds": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)}
+        stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+        stats["count"] += 1
+        stats["seconds"] += seconds
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                stats["buckets"][index] += 1
+
+
+def route_snapshot():
+    with _lock:
+        return {
+            f"{method} {route}": {
+                "requests": stats["count"],
+                "seconds": round(stats["seconds"], 6),
+                "avg_ms": round(stats["seconds"] * 1000 / stats["count"], 3),
+                "statuses": dict(stats["statuses"]),
+            }
+            for (route, method), stats in _routes.items()
+        }
+
+
+# ------------------ #
+# Prometheus text format
+# ------------------ #
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels.items()) + "}"
+
+
+def render_prometheus():
+    lines = []
+    stages = stage_snapshot()
+    for field in STAGE_FIELDS:
+        name = f"sales_etl_stage_{field}_total"
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f"{name}{_labels(stage=stage)} {totals[field]}" for stage, totals in stages.items())
+
+    with _lock:
+        routes = {key: {**stats, "statuses": dict(stats["statuses"]), "buckets": list(stats["buckets"])}
+                  for key, stats in _routes.items()}
+    lines.append("# TYPE sales_http_requests_total counter")
+    for (route, method), stats in routes.items():
+        lines.extend(f"sales_http_requests_total{_labels(route=route, method=method, status=status)} {count}"
+                     for status, count in stats["statuses"].items())
+    lines.append("# TYPE sales_http_request_duration_seconds histogram")
+    for (route, method), stats in routes.items():
+        for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+            lines.append(f"sales_http_request_duration_seconds_bucket"
+                         f"{_labels(route=route, method=method, le=bound)} {count}")
+        lines.append(f"sales_http_request_duration_seconds_bucket"
+                     f"{_labels(route=route, method=method, le='+Inf')} {stats['count']}")
+        lines.append(f"sales_http_request_duration_seconds_sum{_labels(route=route, method=method)} "
+                     f"{stats['seconds']:.6f}")
+        lines.append(f"sales_http_request_duration_seconds_count{_labels(route=route, method=method)} "
+                     f"{stats['count']}")
+
+    rss = peak_rss_bytes()
+    if rss is not None:
+        lines.append("# TYPE sales_process_peak_rss_bytes gauge")
+        lines.append(f"sales_process_peak_rss_bytes {rss}")
+    lines.append("# TYPE sales_process_start_time_seconds gauge")
+    lines.append(f"sales_process_start_time_seconds {_started:.3f}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,132 @@
+#AGGREGATE ROLLUPS (revenue, quantity and order count by day, product and customer)
+# Kept up to date incrementally by the ETL loads and the API write routes, so summary
+# queries read a few small tables instead of scanning sales.
+
+# table -> (key column, SQL expression over sales that produces the key)
+ROLLUPS = {
+    "sales_daily": ("day", "substr(date, 1, 10)"),
+    "sales_by_product": ("product", "product"),
+    "sales_by_customer": ("customer_id", "customer_id"),
+}
+ROLLUP_KEY_TYPES = {"day": "TEXT", "product": "TEXT", "customer_id": "INTEGER"}
+# WITHOUT ROWID: an INTEGER PRIMARY KEY would alias the rowid, turning a NULL key into a
+# fresh rowid and rejecting non-integer keys; here keys are plain NOT NULL values
+ROLLUP_DDL = """CREATE TABLE {table} (
+    {key} {type} NOT NULL PRIMARY KEY,
+    revenue_cents INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID"""
+
+
+def _to_cents(value):
+    return int(round(float(value or 0) * 100))
+
+
+def ensure_rollups(conn):
+    # Create missing rollup tables and fill them from the current sales table
+    for table, (key, _) in ROLLUPS.items():
+        exists = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)
+        ).fetchone()
+        if exists and "WITHOUT ROWID" in exists[0].upper():
+            continue
+        if exists:
+            _migrate_rollup(conn, table)
+            continue
+        conn.execute(ROLLUP_DDL.format(table=table, key=key, type=ROLLUP_KEY_TYPES[key]))
+        _fill_rollup(conn, table)
+
+
+def _migrate_rollup(conn, table):
+    # Rollups created with a rowid-aliased key: recreate and refill from sales. With sharded
+    # storage sales.db holds no sales, so the existing buckets are copied instead.
+    import sales_shards
+
+    key = ROLLUPS[table][0]
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_rowid")
+    conn.execute(ROLLUP_DDL.format(table=table, key=key, type=ROLLUP_KEY_TYPES[key]))
+    if sales_shards.enabled():
+        conn.execute(f"INSERT INTO {table} SELECT * FROM {table}_rowid WHERE {key} IS NOT NULL")
+    else:
+        _fill_rollup(conn, table)
+    conn.execute(f"DROP TABLE {table}_rowid")
+
+
+def _fill_rollup(conn, table):
+    key, expression = ROLLUPS[table]
+    conn.execute(
+        f"""INSERT INTO {table} ({key}, revenue_cents, quantity, orders)
+            SELECT {expression}, CAST(ROUND(SUM(total_price) * 100) AS INTEGER),
+                   SUM(quantity), COUNT(*)
+            FROM sales WHERE {expression} IS NOT NULL GROUP BY {expression}"""
+    )
+
+
+def rebuild_rollups(conn):
+    # Full recompute, used after a full reload of the sales table
+    for table in ROLLUPS:
+        conn.execute(f"DELETE FROM {table}")
+        _fill_rollup(conn, table)
+
+
+def _apply(conn, table, deltas):
+    # deltas: iterable of (key, revenue_cents, quantity, orders); negative values subtract
+    key = ROLLUPS[table][0]
+    deltas = list(deltas)
+    conn.executemany(
+        f"""INSERT INTO {table} ({key}, revenue_cents, quantity, orders) VALUES (?, ?, ?, ?)
+            ON CONFLICT({key}) DO UPDATE SET
+                revenue_cents = revenue_cents + excluded.revenue_cents,
+                quantity = quantity + excluded.quantity,
+                orders = orders + excluded.orders""",
+        deltas,
+    )
+    conn.executemany(f"DELETE FROM {table} WHERE {key}=? AND orders <= 0", [(d[0],) for d in deltas])
+
+
+def apply_sale(conn, sale, sign=1):
+    # Add (sign=1) or remove (sign=-1) one sale dict from every rollup. A sale without a
+    # key cannot be added (ValueError); removing one skips the rollups it was never in.
+    keys = {
+        "day": str(sale.get("date") or "")[:10] or None,
+        "product": sale.get("product"),
+        "customer_id": sale.get("customer_id"),
+    }
+    if sign > 0:
+        missing = [key for key, value in keys.items() if value is None]
+        if missing:
+            raise ValueError(f"Sale has no rollup key {', '.join(missing)}")
+    revenue = sign * _to_cents(sale.get("total_price"))
+    quantity = sign * int(sale.get("quantity") or 0)
+    for table, (key, _) in ROLLUPS.items():
+        if keys[key] is not None:
+            _apply(conn, table, [(keys[key], revenue, quantity, sign)])
+
+
+def apply_frame(conn, df, sign=1):
+    # Add (sign=1) or remove (sign=-1) a batch of sales (date, product, customer_id, quantity,
+    # total_price) vectorized
+    import pandas as pd  # only batch/ETL paths need pandas; the single-row routes stay lean
+
+    if df.empty:
+        return
+    dates = df["date"]
+    days = dates.dt.strftime("%Y-%m-%d") if pd.api.types.is_datetime64_any_dtype(dates) else dates.astype(str).str[:10]
+    frame = pd.DataFrame({
+        "day": days,
+        "product": df["product"].astype(str),
+        "customer_id": df["customer_id"],
+        "revenue_cents": (df["total_price"].astype(float) * 100).round().astype("int64"),
+        "quantity": df["quantity"].astype("int64"),
+    })
+    for table, (key, _) in ROLLUPS.items():
+        grouped = frame.groupby(key, observed=True).agg(
+            revenue_cents=("revenue_cents", "sum"),
+            quantity=("quantity", "sum"),
+            orders=("quantity", "size"),
+        )
+        _apply(conn, table, (
+            (k.item() if hasattr(k, "item") else k, sign * int(r), sign * int(q), sign * int(o))
+            for k, r, q, o in grouped.itertuples(name=None)
+        ))
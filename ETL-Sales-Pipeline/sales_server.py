@@ -0,0 +1,135 @@
+#PRODUCTION SERVER LAUNCHER
+# Serves the Flask app from server-sideAPI.py with several workers instead of the
+# single-threaded debug server:
+# - gunicorn: pre-forked worker processes x threads (Linux/macOS). The app is imported
+#   once in the master and the workers fork from it.
+# - uvicorn: ASGI. The app runs in a thread pool per worker process, so SQLite calls
+#   never block the event loop. Each worker imports the app itself.
+# - waitress: one multi-threaded process (works on Windows).
+# - dev: Flask's built-in server, threaded.
+# SIGINT/SIGTERM stop accepting connections and let in-flight requests finish.
+# Importing the app does not load any data; --ingest loads SOURCE into sales.db first.
+# Usage: python sales_server.py [--server auto] [--workers N] [--threads N] [--host H] [--port P]
+#                               [--ingest [SOURCE]]
+import argparse
+import importlib
+import importlib.util
+import os
+import signal
+import sys
+
+SERVERS = ["auto", "gunicorn", "uvicorn", "waitress", "dev"]
+APP_MODULE = "server-sideAPI"
+GRACEFUL_TIMEOUT = 30
+
+
+def load_app():
+    # importlib accepts the hyphenated module name that a plain import statement cannot
+    return importlib.import_module(APP_MODULE).app
+
+
+def __getattr__(name):
+    # "sales_server:asgi_app" is what uvicorn worker processes import
+    if name == "asgi_app":
+        from uvicorn.middleware.wsgi import WSGIMiddleware
+        return WSGIMiddleware(load_app(), workers=int(os.environ.get("SALES_THREADS", 4)))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def pick_server(name):
+    if name != "auto":
+        return name
+    if os.name != "nt" and installed("gunicorn"):
+        return "gunicorn"
+    for candidate in ("uvicorn", "waitress"):
+        if installed(candidate):
+            return candidate
+    return "dev"
+
+
+def run_gunicorn(app, host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class SalesApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("graceful_timeout", GRACEFUL_TIMEOUT)
+
+        def load(self):
+            return app
+
+    SalesApplication().run()
+
+
+def run_uvicorn(host, port, workers, threads):
+    import uvicorn
+
+    # Worker processes look the app up by name, so pass the thread count through the environment
+    os.environ["SALES_THREADS"] = str(threads)
+    uvicorn.run("sales_server:asgi_app", host=host, port=port, workers=workers,
+                timeout_graceful_shutdown=GRACEFUL_TIMEOUT, log_level="info")
+
+
+def run_waitress(app, host, port, threads):
+    import waitress
+
+    waitress.serve(app, host=host, port=port, threads=threads)
+
+
+def stop_on_sigterm():
+    # waitress and the dev server only stop on Ctrl+C; treat SIGTERM the same way
+    def handler(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handler)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the sales API")
+    parser.add_argument("--server", choices=SERVERS, default=os.environ.get("SALES_SERVER", "auto"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SALES_WORKERS", os.cpu_count() or 1)),
+                        help="Worker processes (gunicorn/uvicorn, default: CPU count)")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("SALES_THREADS", 4)),
+                        help="Threads per worker")
+    parser.add_argument("--host", default=os.environ.get("SALES_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SALES_PORT", 5000)))
+    parser.add_argument("--ingest", nargs="?", const="", default=None, metavar="SOURCE",
+                        help="Load SOURCE (default: $SALES_SOURCE or sales.csv) into sales.db before serving")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = pick_server(args.server)
+    print(f"Starting {server} on http://{args.host}:{args.port} "
+          f"({args.workers} workers x {args.threads} threads)")
+    app = load_app()
+    if args.ingest is not None:
+        # Once, before any worker starts
+        importlib.import_module(APP_MODULE).run_ingest(args.ingest or None)
+
+    if server == "gunicorn":
+        run_gunicorn(app, args.host, args.port, args.workers, args.threads)
+    elif server == "uvicorn":
+        run_uvicorn(args.host, args.port, args.workers, args.threads)
+    else:
+        stop_on_sigterm()
+        try:
+            if server == "waitress":
+                run_waitress(app, args.host, args.port, args.threads)
+            else:
+                app.run(host=args.host, port=args.port, threaded=True, debug=False)
+        except KeyboardInterrupt:
+            pass
+    print("Server stopped.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,540 @@
+#SHARDED STORAGE (optional, one SQLite file per month of sales)
+# With SALES_SHARD_DIR set, sales rows live in <dir>/sales_YYYY_MM.db instead of the sales
+# table of sales.db, which keeps everything else (rollups, change log, watermarks, jobs).
+# - ETL loads and API writes route rows by the month of their date. Ids stay global: they
+#   are allocated under the sales.db write lock from the highest id of any shard.
+# - Reads run the same SQL on each shard the date filters select (pages on a thread pool)
+#   and merge the rows by id, so keyset pages and streams keep their order.
+# - seal_shard() compacts a month (VACUUM) and makes it read-only. Writes to a sealed month
+#   are refused until it is unsealed, so archived months can be backed up once.
+# Writes commit their shards just before sales.db. WAL databases cannot commit atomically
+# together, so a crash between the two can leave shard rows that the rollups miss.
+# Move an existing database in and out with: python sales_shards.py split|merge
+import argparse
+import datetime
+import heapq
+import itertools
+import os
+import pathlib
+import re
+import shutil
+import sqlite3
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from operator import itemgetter
+
+from sales_db import connect, fetch_sale, SALES_DDL, SALES_INDEXES, SALES_COLUMNS, DB_FILE
+
+SHARD_DIR = os.environ.get("SALES_SHARD_DIR") or None
+READ_WORKERS = int(os.environ.get("SALES_SHARD_READERS", 4))
+HOT_MONTHS = int(os.environ.get("SALES_SHARD_HOT_MONTHS", 2))
+SHARD_FILE = re.compile(r"sales_(\d{4})_(\d{2})(\.sealed)?\.db")
+INSERT_SQL = f"INSERT INTO sales ({', '.join(SALES_COLUMNS)}) VALUES ({', '.join(['?'] * len(SALES_COLUMNS))})"
+COPY_ROWS = 50000
+
+_local = threading.local()
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class ShardSealedError(Exception):
+    # A write targets a month whose shard is sealed
+    def __init__(self, month):
+        super().__init__(f"Sales of {month} are archived (sealed shard); unseal the month to change them")
+        self.month = month
+
+
+def enabled():
+    return SHARD_DIR is not None
+
+
+def month_of(date):
+    # 'YYYY-MM' of an ISO date string (or a date/datetime)
+    return str(date)[:7]
+
+
+def shard_path(month, sealed=False):
+    year, mon = month.split("-")
+    return os.path.join(SHARD_DIR, f"sales_{year}_{mon}{'.sealed' if sealed else ''}.db")
+
+
+def list_shards():
+    # {month: sealed} in month order
+    if not os.path.isdir(SHARD_DIR):
+        return {}
+    shards = {}
+    for name in sorted(os.listdir(SHARD_DIR)):
+        match = SHARD_FILE.fullmatch(name)
+        if match:
+            shards[f"{match[1]}-{match[2]}"] = bool(match[3])
+    return shards
+
+
+def prune(shards, date_from=None, date_to=None):
+    # Months that can hold sales matching the GET /sales date filters
+    low = month_of(date_from) if date_from else None
+    high = month_of(date_to) if date_to else None
+    return [m for m in shards if (low is None or m >= low) and (high is None or m <= high)]
+
+
+def ensure_shard_schema(conn):
+    conn.execute(SALES_DDL)
+    for name, column in SALES_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON sales ({column})")
+
+
+# ------------------ #
+# Connections
+# ------------------ #
+def _open(path, sealed):
+    if sealed:
+        # immutable: the file never changes, so readers skip locking entirely
+        return sqlite3.connect(pathlib.Path(path).absolute().as_uri() + "?mode=ro&immutable=1", uri=True)
+    return connect(path)
+
+
+def shard_connection(month, sealed=False):
+    # Pooled per thread and process like sales_db.get_connection. A shard replaced on disk
+    # (full reload, seal/unseal in another process) is reopened.
+    pool = getattr(_local, "pool", None)
+    if pool is None or _local.pid != os.getpid():
+        pool = _local.pool = {}
+        _local.pid = os.getpid()
+    path = shard_path(month, sealed)
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        inode = None
+    entry = pool.get(path)
+    if entry is not None and entry[1] != inode:
+        entry[0].close()
+        entry = None
+    if entry is None:
+        conn = _open(path, sealed)
+        entry = pool[path] = (conn, os.stat(path).st_ino)
+    return entry[0]
+
+
+def close_shards():
+    for conn, _ in (getattr(_local, "pool", None) or {}).values():
+        conn.close()
+    _local.pool = {}
+
+
+def _empty():
+    # In-memory sales table; answers queries (and their column names) when no shard matches
+    conn = getattr(_local, "empty", None)
+    if conn is None:
+        conn = _local.empty = sqlite3.connect(":memory:")
+        ensure_shard_schema(conn)
+    return conn
+
+
+def _executor():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="shard")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+# ------------------ #
+# Reads
+# ------------------ #
+# Queries must be "SELECT id, ... FROM sales ... ORDER BY id [LIMIT ?]": every shard returns
+# its rows in id order and the merge keeps that order (and re-applies the limit).
+class MergedCursor:
+    # The subset of the sqlite3 cursor API the routes and exports use
+    def __init__(self, cursors, limit=None):
+        self.description = cursors[0].description
+        self._cursors = cursors
+        rows = heapq.merge(*cursors, key=itemgetter(0)) if len(cursors) > 1 else iter(cursors[0])
+        self._rows = itertools.islice(rows, limit)
+
+    def __iter__(self):
+        return self._rows
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1000):
+        return list(itertools.islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        for cursor in self._cursors:
+            cursor.close()
+
+
+def execute(sql, params=(), date_from=None, date_to=None, limit=None):
+    # Lazily merged cursor over the selected shards, for streams and exports
+    shards = list_shards()
+    cursors = [shard_connection(m, shards[m]).execute(sql, params) for m in prune(shards, date_from, date_to)]
+    return MergedCursor(cursors or [_empty().execute(sql, params)], limit)
+
+
+def _fetch(month, sealed, sql, params):
+    cursor = shard_connection(month, sealed).execute(sql, params)
+    return cursor.description, cursor.fetchall()
+
+
+def _lowest_id(month, sealed):
+    return shard_connection(month, sealed).execute("SELECT MIN(id) FROM sales").fetchone()[0]
+
+
+def fetch_all(sql, params=(), date_from=None, date_to=None, limit=None):
+    # Runs the query on the selected shards in parallel (SQLite releases the GIL while it
+    # reads) and merges the results; returns (column names, rows). A page (limit set) visits
+    # the shards in order of their lowest id, READ_WORKERS at a time, and stops once it is
+    # full and no shard left can hold a lower id: ids grow with load order, so a page
+    # usually reads one wave however many months match.
+    shards = list_shards()
+    months = prune(shards, date_from, date_to)
+    wave_size = len(months)
+    if limit is not None and len(months) > 1:
+        lowest = {m: _lowest_id(m, shards[m]) for m in months}
+        months = sorted((m for m in months if lowest[m] is not None), key=lowest.get)
+        wave_size = READ_WORKERS
+    if len(months) <= 1:
+        cursor = execute(sql, params, date_from, date_to, limit)
+        return [col[0] for col in cursor.description], cursor.fetchall()
+    columns, rows = None, []
+    start = 0
+    while start < len(months):
+        # The first wave is the lowest shard alone: it often fills the page by itself
+        wave = months[start:start + (wave_size if start else 1)]
+        start += len(wave)
+        if limit is not None and len(rows) >= limit and lowest[wave[0]] > rows[-1][0]:
+            break
+        results = list(_executor().map(lambda m: _fetch(m, shards[m], sql, params), wave))
+        columns = columns or [col[0] for col in results[0][0]]
+        rows = list(itertools.islice(heapq.merge(rows, *(r for _, r in results), key=itemgetter(0)), limit))
+    return columns, rows
+
+
+def count(sql, params=(), date_from=None, date_to=None, limit=None):
+    shards = list_shards()
+    months = prune(shards, date_from, date_to)
+    counts = _executor().map(
+        lambda m: shard_connection(m, shards[m]).execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0],
+        months)
+    total = sum(counts)
+    return total if limit is None else min(total, limit)
+
+
+def find_sale(sale_id):
+    # (month, sale dict) or (None, None); probes the newest months first, where most lookups land
+    shards = list_shards()
+    for month in reversed(list(shards)):
+        sale = fetch_sale(shard_connection(month, shards[month]), sale_id)
+        if sale is not None:
+            return month, sale
+    return None, None
+
+
+def max_id():
+    # Highest sale id in any shard; read it under the sales.db write lock before inserting
+    shards = list_shards()
+    ids = [shard_connection(m, shards[m]).execute("SELECT MAX(id) FROM sales").fetchone()[0] for m in shards]
+    return max([i for i in ids if i is not None], default=0)
+
+
+def check_unsplit(conn):
+    # Sharded mode never reads the sales table of sales.db; refuse to run while it holds rows
+    if not enabled() or not conn.execute("SELECT 1 FROM sqlite_master WHERE name='sales'").fetchone():
+        return
+    if conn.execute("SELECT 1 FROM sales LIMIT 1").fetchone():
+        raise RuntimeError(f"{DB_FILE} still holds sales; move them with 'python sales_shards.py split' "
+                           f"or unset SALES_SHARD_DIR")
+
+
+# ------------------ #
+# Writes
+# ------------------ #
+class ShardWriter:
+    # Opens one transaction per shard it writes to and commits them all on exit. Use it
+    # inside the sales.db write transaction:  with writer() as shards: shards.insert(rows)
+    def __init__(self):
+        self.shards = list_shards()
+        self._open = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for conn in self._open.values():
+            if exc_type is None:
+                conn.commit()
+            else:
+                conn.rollback()
+        self._open = {}
+
+    def is_sealed(self, month):
+        return self.shards.get(month, False)
+
+    def connection(self, month):
+        if self.is_sealed(month):
+            raise ShardSealedError(month)
+        conn = self._open.get(month)
+        if conn is None:
+            if month not in self.shards:
+                os.makedirs(SHARD_DIR, exist_ok=True)
+            conn = shard_connection(month)
+            conn.execute("BEGIN IMMEDIATE")
+            if month not in self.shards:
+                ensure_shard_schema(conn)
+                self.shards[month] = False
+            self._open[month] = conn
+        return conn
+
+    def insert(self, rows, month=None):
+        # rows: tuples in SALES_COLUMNS order (id, date, ...); routed by date unless month is given
+        if month is not None:
+            self.connection(month).executemany(INSERT_SQL, rows)
+            return
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(month_of(row[1]), []).append(row)
+        for month in by_month:
+            if self.is_sealed(month):
+                raise ShardSealedError(month)
+        for month, month_rows in by_month.items():
+            self.connection(month).executemany(INSERT_SQL, month_rows)
+
+    def update(self, month, sale, update):
+        # sale: the current row; a new date in another month moves the sale to that shard
+        new_month = month_of(update.get("date", sale["date"]))
+        if new_month == month:
+            columns = [f"{k}=?" for k in update]
+            self.connection(month).execute(f"UPDATE sales SET {', '.join(columns)} WHERE id=?",
+                                           (*update.values(), sale["id"]))
+            return
+        moved = {**sale, **update}
+        self.connection(new_month)
+        self.delete(month, sale["id"])
+        self.insert([tuple(moved.get(c) for c in SALES_COLUMNS)], new_month)
+
+    def delete(self, month, sale_id):
+        return self.connection(month).execute("DELETE FROM sales WHERE id=?", (sale_id,)).rowcount
+
+
+def writer():
+    return ShardWriter()
+
+
+def _rmtree(path):
+    # Sealed shards are read-only files, which Windows will not delete as they are
+    def make_writable(func, target, _):
+        os.chmod(target, stat.S_IWRITE)
+        func(target)
+
+    shutil.rmtree(path, onerror=make_writable)
+
+
+@contextmanager
+def replacing():
+    # Full reload: the current shards are moved aside, deleted when the block succeeds and
+    # restored when it fails. Enter it inside the sales.db write transaction.
+    if not enabled():
+        yield
+        return
+    backup = SHARD_DIR.rstrip("/\\") + ".replaced"
+    if os.path.isdir(backup):
+        _rmtree(backup)
+    if os.path.isdir(SHARD_DIR):
+        os.replace(SHARD_DIR, backup)
+    try:
+        yield
+    except BaseException:
+        if os.path.isdir(SHARD_DIR):
+            _rmtree(SHARD_DIR)
+        if os.path.isdir(backup):
+            os.replace(backup, SHARD_DIR)
+        raise
+    if os.path.isdir(backup):
+        _rmtree(backup)
+
+
+# ------------------ #
+# Sealing & compaction
+# ------------------ #
+@contextmanager
+def _writers_paused(db_file=DB_FILE):
+    # Every writer locks sales.db before its shards, so holding that lock means no shard is
+    # mid-write (readers carry on)
+    conn = connect(db_file)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield
+    finally:
+        conn.close()
+
+
+def _remove_db(path):
+    for name in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def compact_shard(month, db_file=DB_FILE):
+    # VACUUM one writable month; other shards (and sales.db) are not rewritten
+    shards = list_shards()
+    if month not in shards:
+        raise ValueError(f"No shard for {month}")
+    if shards[month]:
+        raise ValueError(f"{month} is sealed; it was compacted when it was sealed")
+    with _writers_paused(db_file):
+        conn = connect(shard_path(month))
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+
+def seal_shard(month, db_file=DB_FILE):
+    # Write a compacted, read-only copy of the month and drop the writable file; returns
+    # False if it was already sealed. Readers holding the old file reopen the sealed one.
+    shards = list_shards()
+    if month not in shards:
+        raise ValueError(f"No shard for {month}")
+    if shards[month]:
+        return False
+    path, sealed = shard_path(month), shard_path(month, sealed=True)
+    staged = sealed + ".tmp"
+    with _writers_paused(db_file):
+        conn = connect(path)
+        try:
+            conn.execute("VACUUM INTO ?", (staged,))
+        finally:
+            conn.close()
+        # A sealed shard is one self-contained file (no WAL), so it can be opened immutable
+        conn = sqlite3.connect(staged)
+        try:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            conn.close()
+        os.chmod(staged, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(staged, sealed)
+        _remove_db(path)
+    return True
+
+
+def unseal_shard(month, db_file=DB_FILE):
+    shards = list_shards()
+    if not shards.get(month):
+        return False
+    sealed = shard_path(month, sealed=True)
+    with _writers_paused(db_file):
+        os.chmod(sealed, stat.S_IREAD | stat.S_IWRITE | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(sealed, shard_path(month))
+    return True
+
+
+def months_to_seal(keep_hot=HOT_MONTHS, today=None):
+    # Unsealed months before the last keep_hot calendar months (this month included)
+    today = today or datetime.date.today()
+    index = today.year * 12 + today.month - 1 - (keep_hot - 1)
+    cutoff = f"{index // 12:04d}-{index % 12 + 1:02d}"
+    return [m for m, sealed in list_shards().items() if not sealed and m < cutoff]
+
+
+# ------------------ #
+# Moving sales in and out
+# ------------------ #
+def split(db_file=DB_FILE):
+    # Move every row of the sales table of db_file into month shards
+    conn = connect(db_file)
+    moved = 0
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute("SELECT * FROM sales ORDER BY id")
+            with writer() as shards:
+                for rows in iter(lambda: cursor.fetchmany(COPY_ROWS), []):
+                    shards.insert(rows)
+                    moved += len(rows)
+            conn.execute("DELETE FROM sales")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return moved
+
+
+def merge(db_file=DB_FILE):
+    # Move every shard (sealed ones included) back into the sales table of db_file
+    conn = connect(db_file)
+    moved = 0
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for month, sealed in list_shards().items():
+                cursor = shard_connection(month, sealed).execute("SELECT * FROM sales ORDER BY id")
+                for rows in iter(lambda: cursor.fetchmany(COPY_ROWS), []):
+                    conn.executemany(INSERT_SQL, rows)
+                    moved += len(rows)
+        close_shards()
+        if os.path.isdir(SHARD_DIR):
+            _rmtree(SHARD_DIR)
+    finally:
+        conn.close()
+    return moved
+
+
+def describe_shards():
+    shards = list_shards()
+    rows = []
+    for month, sealed in shards.items():
+        path = shard_path(month, sealed)
+        count = shard_connection(month, sealed).execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+        rows.append({"month": month, "sealed": sealed, "rows": count, "bytes": os.path.getsize(path)})
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Manage per-month sales shards")
+    parser.add_argument("--dir", default=SHARD_DIR, help="Shard directory (default: SALES_SHARD_DIR)")
+    parser.add_argument("--db", default=DB_FILE, help="Main database (default: sales.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Months, rows, size and sealed state")
+    commands.add_parser("split", help="Move the sales table of --db into shards")
+    commands.add_parser("merge", help="Move every shard back into the sales table of --db")
+    seal = commands.add_parser("seal", help="Compact and make months read-only")
+    seal.add_argument("months", nargs="*", help="YYYY-MM (default: all but the hot months)")
+    seal.add_argument("--keep-hot", type=int, default=HOT_MONTHS, help="Recent months left writable")
+    unseal = commands.add_parser("unseal", help="Make sealed months writable again")
+    unseal.add_argument("months", nargs="+")
+    compact = commands.add_parser("compact", help="VACUUM writable months")
+    compact.add_argument("months", nargs="+")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.dir:
+        raise SystemExit("Set SALES_SHARD_DIR or pass --dir")
+    SHARD_DIR = args.dir
+    if args.command == "list":
+        for shard in describe_shards():
+            print(f"{shard['month']}  {'sealed' if shard['sealed'] else 'hot':<7}{shard['rows']:>12} rows"
+                  f"{shard['bytes'] / 1e6:>10.1f} MB")
+    elif args.command == "split":
+        print(f"Moved {split(args.db)} sales into {len(list_shards())} month shards in {SHARD_DIR}.")
+    elif args.command == "merge":
+        print(f"Moved {merge(args.db)} sales back into {args.db}.")
+    elif args.command == "seal":
+        for month in args.months or months_to_seal(args.keep_hot):
+            print(f"{month}: {'sealed' if seal_shard(month, args.db) else 'already sealed'}")
+    elif args.command == "unseal":
+        for month in args.months:
+            print(f"{month}: {'unsealed' if unseal_shard(month, args.db) else 'not sealed'}")
+    else:
+        for month in args.months:
+            compact_shard(month, args.db)
+            print(f"{month}: compacted")
@@ -0,0 +1,129 @@
+#TRANSFORM STAGE (shared by the ETL loads and the API write routes)
+# One set of validation rules for every way sales enter the database: a row that the
+# ETL would send to sales_rejects is rejected by POST /sales/batch and by POST/PUT
+# /sales with the same reason. check_sales applies the rules to a DataFrame, check_sale
+# to one sale dict; keep the two in step (tests/test_batch_validation.py runs both).
+# pandas is imported by the frame functions only, so single-row writes stay lean.
+import math
+
+from sales_db import normalize_date, DATE_FORMAT, SALES_COLUMNS
+
+# Declared dtypes of the transform stage output. Prices are integer cents so totals
+# are exact; they are converted back to currency units only when written to SQLite.
+TRANSFORM_SCHEMA = {
+    "id": "int64",
+    "date": "datetime64",
+    "customer_id": "smallest int",
+    "product": "category",
+    "quantity": "smallest int",
+    "unit_price_cents": "int64",
+    "total_price_cents": "int64",
+}
+
+
+def check_sales(df, date_format=None):
+    # Parse the raw sale columns once, vectorized, and apply the rules. Returns (parsed
+    # columns, reason per row: None when the row is valid); the first failing check wins.
+    # CSV chunks infer one date format; JSON batches pass date_format="ISO8601".
+    import pandas as pd
+
+    parsed = {
+        "date": pd.to_datetime(df["date"], errors="coerce", format=date_format),
+        "customer_id": pd.to_numeric(df["customer_id"], errors="coerce"),
+        "product": df["product"].astype("string").str.strip(),
+        "quantity": pd.to_numeric(df["quantity"], errors="coerce"),
+        "unit_price": pd.to_numeric(df["unit_price"], errors="coerce"),
+    }
+    customer_id, quantity, unit_price = parsed["customer_id"], parsed["quantity"], parsed["unit_price"]
+    checks = [
+        (df["customer_id"].isna(), "missing customer_id"),
+        (customer_id.isna() | (customer_id % 1 != 0), "invalid customer_id"),
+        (parsed["date"].isna(), "invalid date"),
+        (parsed["product"].isna() | (parsed["product"] == ""), "missing product"),
+        (quantity.isna() | (quantity % 1 != 0) | (quantity <= 0), "invalid quantity"),
+        (unit_price.isna() | (unit_price < 0) | (unit_price == math.inf), "invalid unit_price"),
+    ]
+    reason = pd.Series(None, index=df.index, dtype=object)
+    for mask, message in checks:
+        reason = reason.mask(mask.fillna(True) & reason.isna(), message)
+    return parsed, reason
+
+
+def _number(value):
+    # Scalar pd.to_numeric(errors="coerce"): the value as a float, None when it is not a number
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value) if isinstance(value, (int, float, str)) else None
+    except ValueError:
+        return None
+    return None if number is None or math.isnan(number) else number
+
+
+def check_sale(sale):
+    # check_sales for one sale dict (JSON values): returns (normalized sale fields, None)
+    # or (None, reason), with the same checks in the same order
+    customer_id = _number(sale.get("customer_id"))
+    quantity = _number(sale.get("quantity"))
+    unit_price = _number(sale.get("unit_price"))
+    product = sale.get("product")
+    product = None if product is None else str(product).strip()
+    try:
+        date = normalize_date(sale.get("date")) if sale.get("date") is not None else None
+    except ValueError:
+        date = None
+    if sale.get("customer_id") is None:
+        return None, "missing customer_id"
+    if customer_id is None or not customer_id.is_integer():
+        return None, "invalid customer_id"
+    if date is None:
+        return None, "invalid date"
+    if not product:
+        return None, "missing product"
+    if quantity is None or not quantity.is_integer() or quantity <= 0:
+        return None, "invalid quantity"
+    if unit_price is None or unit_price < 0 or unit_price == math.inf:
+        return None, "invalid unit_price"
+    return {"date": date, "customer_id": int(customer_id), "product": product,
+            "quantity": int(quantity), "unit_price": unit_price}, None
+
+
+def transform_chunk(df, start_id=1):
+    # Shared transform stage: returns (clean rows in TRANSFORM_SCHEMA, rejected raw rows + reason)
+    import pandas as pd
+
+    # Normalize column names
+    df.columns = df.columns.str.strip().str.lower()
+
+    # Rejected rows are kept for the reject table, not coerced to NaN
+    parsed, reason = check_sales(df)
+    bad = reason.notna()
+    good = ~bad
+    rejects = df[bad].assign(reason=reason[bad])
+
+    clean = pd.DataFrame({
+        "date": parsed["date"][good],
+        "customer_id": pd.to_numeric(parsed["customer_id"][good], downcast="integer"),
+        "product": parsed["product"][good].astype("category"),
+        "quantity": pd.to_numeric(parsed["quantity"][good], downcast="integer"),
+        "unit_price_cents": (parsed["unit_price"][good] * 100).round().astype("int64"),
+    })
+    # Calculate total_price in exact integer cents
+    clean["total_price_cents"] = clean["quantity"].astype("int64") * clean["unit_price_cents"]
+
+    # Add unique ID, continuing from the previous chunk
+    clean = clean.reset_index(drop=True)
+    clean.insert(0, "id", clean.index + start_id)
+
+    return clean, rejects
+
+
+def to_db_rows(df):
+    # Store dates as ISO text, cents as currency units and map NaN/NaT to NULL
+    if "unit_price_cents" in df.columns:
+        df = df.assign(unit_price=df["unit_price_cents"] / 100,
+                       total_price=df["total_price_cents"] / 100)
+    df = df[[c for c in SALES_COLUMNS if c in df.columns]].copy()
+    df["date"] = df["date"].dt.strftime(DATE_FORMAT)
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
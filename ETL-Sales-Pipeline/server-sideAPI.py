@@ -1,66 +1,119 @@
 #ETL SERVER + API
-import pandas as pd
-import sqlite3
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, g, send_file
+from werkzeug.datastructures import ImmutableMultiDict
 import os
+import contextlib
 import datetime
-
+import json
+import csv
+import io
+import threading
+import hmac
+import time
+import sales_metrics
+import sales_shards
+from sales_db import (connect, get_connection, dict_cursor, fetch_sale, insert_sale, normalize_date,
+                      last_sale_id, record_sale_ids, bump_table_version, migrate_db, SALES_COLUMNS)
+from sales_changes import (log_change, compact_changes, head_seq, horizon, read_changes, iter_change_rows,
+                           changed_since, RETENTION_DAYS)
+from sales_cache import ResponseCache
+from sales_json import FastJSONProvider, dumps_bytes
+from sales_rollups import apply_sale, apply_frame, ROLLUPS
+from sales_transform import check_sale
+
+# pandas (sales_transform/sales_etl), pyarrow (sales_columnar) and the export job code are
+# imported only by the ingest, batch and export paths (sales_etl itself loads pyarrow only for
+# loads with a parquet dir); point lookups and single-row writes use plain SQLite rows.
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 DB_FILE = "sales.db"
 CSV_FILE = "sales.csv"
 
 
-# ------------------------ #
-# 1. Extract & Transform
-# ------------------------ #
-def load_and_transform(csv_file):
-    # Load CSV
-    df = pd.read_csv(csv_file)
+# ------------------ #
+# Initialize DB
+# ------------------ #
+# The API attaches to an existing sales.db and never runs the ETL at import, so workers,
+# reloader restarts and tests start in milliseconds. Loading is an explicit step:
+# etl_pipeline.py, sales_server.py --ingest or POST /admin/ingest (all use run_ingest).
+# The default incremental mode only loads rows appended to the CSV since the last run and
+# keeps rows added via the API. SALES_SOURCE may also be a directory or glob of per-store
+# daily files, which are parsed in parallel by SALES_LOAD_WORKERS processes.
+# SALES_LOAD_MODE=upsert merges re-delivered rows on the SALES_UPSERT_KEY columns instead.
+LOAD_MODE = os.environ.get("SALES_LOAD_MODE", "incremental")
+LOAD_MODES = ("incremental", "replace", "upsert")
+UPSERT_KEY = os.environ.get("SALES_UPSERT_KEY") or None
+SALES_SOURCE = os.environ.get("SALES_SOURCE", CSV_FILE)
+LOAD_WORKERS = int(os.environ.get("SALES_LOAD_WORKERS", os.cpu_count() or 1))
+# Optional Parquet store (needs pyarrow) written by the load and used by exports/analytics
+PARQUET_DIR = os.environ.get("SALES_PARQUET_DIR") or None
+# With SALES_SHARD_DIR set, sales rows live in one SQLite file per month (sales_shards.py);
+# reads only open the months their date filters select and fan out over them
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_database():
+    # Create or migrate the schema once per process, on first use (a no-op on a current db)
+    global _schema_ready
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                migrate_db(DB_FILE)
+                sales_shards.check_unsplit(get_connection(DB_FILE))
+                _schema_ready = True
+
+
+def run_ingest(source=None, mode=None, key=None):
+    # Load source into sales.db; pandas and the ETL code are imported only here.
+    # Returns the rows loaded, or the inserted/updated/unchanged counts of an upsert.
+    from sales_etl import load_sales
+
+    ensure_database()
+    rows = load_sales(source or SALES_SOURCE, DB_FILE, mode=mode or LOAD_MODE, workers=LOAD_WORKERS,
+                      parquet_dir=PARQUET_DIR, key=key or UPSERT_KEY)
+    # Cached pages predate the load
+    response_cache.clear()
+    return rows
 
-    # Normalize column names
-    df.columns = df.columns.str.strip().str.lower()
 
-    # Drop rows with missing customer_id
-    df.dropna(subset=["customer_id"], inplace=True)
+# ------------------ #
+# 3. Flask API Routes
+# ------------------ #
 
-    # Ensure correct data types
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce")
-    df["unit_price"] = pd.to_numeric(df["unit_price"], errors="coerce")
+# Per-route timing for GET /metrics (label is the URL rule, so ids don't explode cardinality)
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    ensure_database()
 
-    # Calculate total_price
-    df["total_price"] = df["quantity"] * df["unit_price"]
 
-    # Add unique ID
-    df.reset_index(drop=True, inplace=True)
-    df.insert(0, "id", df.index + 1)
+@app.after_request
+def observe_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    sales_metrics.observe_request(route, request.method, response.status_code,
+                                  time.perf_counter() - g.started)
+    g.observed = True
+    return response
 
-    return df
 
+@app.teardown_request
+def observe_failure(error):
+    # Unhandled exceptions skip after_request
+    if error is not None and not g.get("observed") and "started" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        sales_metrics.observe_request(route, request.method, 500, time.perf_counter() - g.started)
 
-# ------------------ #
-# 2. Load into SQLite
-# ------------------ #
-def init_db(df, db_file=DB_FILE):
-    with sqlite3.connect(db_file) as conn:
-        df.to_sql("sales", conn, if_exists="replace", index=False)
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    # Prometheus text by default, ?format=json for a readable report
+    if request.args.get("format") == "json":
+        return jsonify(sales_metrics.run_report(routes=sales_metrics.route_snapshot()))
+    return Response(sales_metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
-# ------------------ #
-# Initialize DB
-# ------------------ #
-if os.path.exists(CSV_FILE):
-    sales_df = load_and_transform(CSV_FILE)
-    init_db(sales_df)
-else:
-    sales_df = pd.DataFrame()
-    print(f"{CSV_FILE} not found! Start with empty database.")
-
-
-# ------------------ #
-# 3. Flask API Routes
-# ------------------ #
 
 # Home
 @app.route("/")
@@ -68,79 +121,402 @@ def home():
     return jsonify({"message": "Welcome to the ETL Sales API. Use /sales endpoints."})
 
 
-# Get all sales
+# Paging & filters for GET /sales
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def build_sales_query(args, paginate=True):
+    # Compile query-string filters into parameterized SQL using a keyset cursor on id.
+    # Streamed responses (paginate=False) only apply a limit when one is given.
+    if paginate:
+        limit = args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+        if limit is None or not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"'limit' must be an integer between 1 and {MAX_PAGE_SIZE}")
+    else:
+        limit = args.get("limit", type=int)
+        if "limit" in args and (limit is None or limit < 1):
+            raise ValueError("'limit' must be a positive integer")
+
+    fields = args.get("fields")
+    if fields:
+        columns = [f.strip().lower() for f in fields.split(",") if f.strip()]
+        unknown = [c for c in columns if c not in SALES_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        # id is always returned, it is the pagination cursor
+        columns = ["id"] + [c for c in columns if c != "id"]
+    else:
+        columns = SALES_COLUMNS
+
+    where = []
+    params = []
+    after_id = args.get("after_id")
+    if after_id is not None:
+        if not after_id.isdigit():
+            raise ValueError("'after_id' must be an integer")
+        where.append("id > ?")
+        params.append(int(after_id))
+    if args.get("date_from"):
+        where.append("date >= ?")
+        params.append(args["date_from"])
+    if args.get("date_to"):
+        where.append("date < date(?, '+1 day')")
+        params.append(args["date_to"])
+    if args.get("customer_id"):
+        where.append("customer_id = ?")
+        params.append(args["customer_id"])
+    if args.get("product"):
+        where.append("product = ?")
+        params.append(args["product"])
+
+    sql = f"SELECT {', '.join(columns)} FROM sales"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params, limit
+
+
+# Streaming responses
+STREAM_BATCH_SIZE = 1000
+STREAM_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def requested_stream_format():
+    # ?format=ndjson|csv wins over the Accept header
+    fmt = request.args.get("format", "").lower()
+    if fmt in STREAM_MIMETYPES:
+        return fmt
+    accepted = list(request.accept_mimetypes.values())
+    for fmt, mimetype in STREAM_MIMETYPES.items():
+        if mimetype in accepted:
+            return fmt
+    return None
+
+
+def shard_filters(args, limit=None):
+    # Date range (picks the shards) and row limit (re-applied after merging) of a sales query
+    return {"date_from": args.get("date_from"), "date_to": args.get("date_to"), "limit": limit}
+
+
+def read_sales(sql, params, filters=None):
+    # Cursor over a build_sales_query() query; merged across shards with sharded storage
+    if sales_shards.enabled():
+        return sales_shards.execute(sql, params, **(filters or {}))
+    return get_connection(DB_FILE).execute(sql, params)
+
+
+def iter_encoded_rows(sql, params, fmt, filters=None):
+    # Walk a SQLite cursor with fetchmany and yield encoded batches; memory stays bounded
+    cursor = read_sales(sql, params, filters)
+    try:
+        columns = [col[0] for col in cursor.description]
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            if fmt == "csv":
+                writer.writerows(rows)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                # Same encoder as the JSON routes, so NaN/inf are written as null
+                yield b"".join(dumps_bytes(dict(zip(columns, row))) + b"\n" for row in rows)
+        if fmt == "csv" and buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        cursor.close()
+
+
+def stream_response(sql, params, fmt, filename=None, filters=None):
+    response = Response(iter_encoded_rows(sql, params, fmt, filters), mimetype=STREAM_MIMETYPES[fmt])
+    if filename:
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+# Response cache for GET /sales and /sales/<id> (per process). Entries are validated
+# against the shared change log, so writes to their ids by other workers or ETL runs are
+# seen on the next request; invalidate_ids only frees this worker's entries early.
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("SALES_CACHE_ENTRIES", 1024)),
+    ttl=float(os.environ.get("SALES_CACHE_TTL", 30)),
+)
+
+
+def cache_key():
+    return request.path + "?" + "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+
+
+def cached_response(entry):
+    # 304 with no body when the client already has this version
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, status=entry.status, mimetype="application/json")
+    response.set_etag(entry.etag)
+    return response
+
+
+def cache_seq():
+    # Change log head, advanced by every write in any process
+    return head_seq(get_connection(DB_FILE))
+
+
+def entry_changed(entry):
+    # Only the log entries written since the cache entry was built are looked at
+    return changed_since(get_connection(DB_FILE), entry.seq, entry.first_id, entry.last_id)
+
+
+def cache_json(key, payload, status=200, first_id=0, last_id=None, seq=None):
+    body = app.json.dumps(payload).encode("utf-8") + b"\n"
+    return response_cache.put(key, body, status, first_id, last_id, seq)
+
+
+# Get sales (paginated)
 @app.route("/sales", methods=["GET"])
 def get_sales():
-    with sqlite3.connect(DB_FILE) as conn:
-        df = pd.read_sql("SELECT * FROM sales", conn)
-    return jsonify(df.to_dict(orient="records"))
+    fmt = requested_stream_format()
+    try:
+        sql, params, limit = build_sales_query(request.args, paginate=fmt is None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if fmt:
+        return stream_response(sql, params, fmt, filters=shard_filters(request.args, limit))
+
+    key = cache_key()
+    # Read before the rows: a write in between leaves the entry older than the next lookup
+    seq = cache_seq()
+    entry = response_cache.get(key, seq, entry_changed)
+    if entry is None:
+        if sales_shards.enabled():
+            # Pages read their shards in parallel
+            columns, rows = sales_shards.fetch_all(sql, params, **shard_filters(request.args, limit))
+            records = [dict(zip(columns, row)) for row in rows]
+        else:
+            records = dict_cursor(get_connection(DB_FILE)).execute(sql, params).fetchall()
+        next_cursor = int(records[-1]["id"]) if len(records) == limit else None
+        # A keyset page covers ids (after_id, next_cursor]; the last page is open-ended
+        entry = cache_json(key, {"data": records, "next_cursor": next_cursor, "limit": limit},
+                           first_id=int(request.args.get("after_id", 0)) + 1, last_id=next_cursor, seq=seq)
+    return cached_response(entry)
 
 
 # Get sale by id
 @app.route("/sales/<int:sale_id>", methods=["GET"])
 def get_sale_by_id(sale_id):
-    with sqlite3.connect(DB_FILE) as conn:
-        df = pd.read_sql("SELECT * FROM sales WHERE id=?", conn, params=(sale_id,))
-    if df.empty:
-        return jsonify({"error": "Sale not found"}), 404
-    return jsonify(df.to_dict(orient="records"))
+    key = cache_key()
+    seq = cache_seq()
+    entry = response_cache.get(key, seq, entry_changed)
+    if entry is None:
+        if sales_shards.enabled():
+            sale = sales_shards.find_sale(sale_id)[1]
+        else:
+            sale = fetch_sale(get_connection(DB_FILE), sale_id)
+        if sale is None:
+            entry = cache_json(key, {"error": "Sale not found"}, 404, sale_id, sale_id, seq)
+        else:
+            entry = cache_json(key, [sale], 200, sale_id, sale_id, seq)
+    return cached_response(entry)
+
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+
+REQUIRED_FIELDS = ["date", "customer_id", "product", "quantity", "unit_price"]
+MAX_BATCH_SIZE = 100000
+
+
+# Write routes open the shard transactions they need next to the sales.db one; writes to
+# a sealed (archived) month are refused
+def sales_writer():
+    return sales_shards.writer() if sales_shards.enabled() else contextlib.nullcontext()
+
+
+@app.errorhandler(sales_shards.ShardSealedError)
+def sealed_month(error):
+    return jsonify({"error": str(error), "month": error.month}), 409
 
 
 # Add new sale
 @app.route("/sales", methods=["POST"])
 def add_sale():
-    new_sale = request.get_json()
-    if not new_sale:
+    new_sale = request.get_json(silent=True)
+    if not new_sale or not isinstance(new_sale, dict):
         return jsonify({"error": "Invalid JSON data"}), 400
 
-    # Validate required fields
-    required = ["date", "customer_id", "product", "quantity", "unit_price"]
-    for field in required:
-        if field not in new_sale:
-            return jsonify({"error": f"Missing field '{field}'"}), 400
+    # The ETL transform's rules, with the same reasons as /sales/batch
+    sale, reason = check_sale(new_sale)
+    if reason:
+        return jsonify({"error": reason}), 400
 
     # Calculate total_price
-    new_sale["total_price"] = new_sale["quantity"] * new_sale["unit_price"]
+    new_sale = {**sale, "total_price": sale["quantity"] * sale["unit_price"]}
+
+    # Pooled per-thread connection; "with conn" commits (or rolls back) the write.
+    # The id comes back from the INSERT itself, so concurrent writers never collide.
+    conn = get_connection(DB_FILE)
+    with conn, sales_writer() as shards:
+        if shards is None:
+            new_sale["id"] = insert_sale(conn, new_sale)
+        else:
+            # Shard ids are allocated under the sales.db write lock
+            conn.execute("BEGIN IMMEDIATE")
+            new_sale["id"] = last_sale_id(conn) + 1
+            record_sale_ids(conn, new_sale["id"])
+            shards.insert([tuple(new_sale.get(c) for c in SALES_COLUMNS)])
+        apply_sale(conn, new_sale)
+        bump_table_version(conn)
+        log_change(conn, "I", new_sale["id"])
+    response_cache.invalidate_ids(new_sale["id"])
 
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        # Assign next id
-        cursor.execute("SELECT MAX(id) FROM sales")
-        max_id = cursor.fetchone()[0] or 0
-        new_sale["id"] = max_id + 1
+    return jsonify({"message": "Sale Added Successfully", "data": new_sale}), 201
 
-        keys = ", ".join(new_sale.keys())
-        question_marks = ", ".join(["?"] * len(new_sale))
-        values = tuple(new_sale.values())
-        cursor.execute(f"INSERT INTO sales ({keys}) VALUES ({question_marks})", values)
-        conn.commit()
 
-    return jsonify({"message": "Sale Added Successfully", "data": new_sale}), 201
+def parse_batch_body():
+    # JSON array, or NDJSON (one sale per line); returns (rows, per-row parse errors)
+    if request.mimetype == "application/x-ndjson":
+        rows, errors = [], []
+        lines = [line for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        for index, line in enumerate(lines):
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append({})
+                errors.append({"row": index, "error": "Invalid JSON line"})
+        return rows, errors
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of sales or an NDJSON body")
+    return rows, []
+
+
+def validate_batch(rows, errors):
+    # Vectorized checks over the whole batch with the ETL transform's rules (a row the ETL
+    # would reject is rejected here with the same reason); returns the valid rows as a DataFrame
+    import pandas as pd
+    from sales_transform import check_sales
+
+    df = pd.DataFrame([row if isinstance(row, dict) else {} for row in rows])
+    df = df.reindex(columns=list(dict.fromkeys(REQUIRED_FIELDS + list(df.columns))))
+    bad = pd.Series(False, index=df.index)
+    for index in (e["row"] for e in errors):
+        bad[index] = True
+
+    parsed, reason = check_sales(df, date_format="ISO8601")
+    for index in df.index[reason.notna() & ~bad]:
+        errors.append({"row": int(index), "error": reason[index]})
+    bad |= reason.notna()
+
+    for field, values in parsed.items():
+        df[field] = values
+    df["total_price"] = df["quantity"] * df["unit_price"]
+    errors.sort(key=lambda e: e["row"])
+    return df[~bad]
+
+
+# Add many sales in one request
+@app.route("/sales/batch", methods=["POST"])
+def add_sales_batch():
+    try:
+        rows, errors = parse_batch_body()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not rows:
+        return jsonify({"error": "No sales in request"}), 400
+    if len(rows) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large, send at most {MAX_BATCH_SIZE} sales"}), 400
+
+    from sales_transform import to_db_rows
+
+    valid = validate_batch(rows, errors)
+    if valid.empty:
+        return jsonify({"error": "No valid sales in batch", "inserted": 0, "errors": errors}), 400
+
+    conn = get_connection(DB_FILE)
+    with conn, sales_writer() as shards:
+        # Reserve the whole id range at once; IMMEDIATE blocks other writers until commit
+        conn.execute("BEGIN IMMEDIATE")
+        first_id = last_sale_id(conn) + 1
+        valid = valid.assign(id=range(first_id, first_id + len(valid)))
+        if shards is None:
+            columns = [c for c in SALES_COLUMNS if c in valid.columns]
+            conn.executemany(
+                f"INSERT INTO sales ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+                to_db_rows(valid),
+            )
+        else:
+            shards.insert(to_db_rows(valid))
+            record_sale_ids(conn, first_id + len(valid) - 1)
+        apply_frame(conn, valid)
+        bump_table_version(conn)
+        log_change(conn, "I", first_id, first_id + len(valid) - 1)
+    response_cache.invalidate_ids(first_id, first_id + len(valid) - 1)
+
+    return jsonify({
+        "message": "Sales Added Successfully",
+        "inserted": len(valid),
+        "first_id": first_id,
+        "last_id": first_id + len(valid) - 1,
+        "errors": errors,
+    }), 201
 
 
 # Update sale by id
 @app.route("/sales/<int:sale_id>", methods=["PUT"])
 def update_sale(sale_id):
-    update_data = request.get_json()
-    if not update_data:
+    update_data = request.get_json(silent=True)
+    if not update_data or not isinstance(update_data, dict):
         return jsonify({"error": "Invalid JSON data"}), 400
-
-    # Recalculate total_price if quantity/unit_price are updated
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        df = pd.read_sql("SELECT * FROM sales WHERE id=?", conn, params=(sale_id,))
-        if df.empty:
+    for field in update_data:
+        if field not in REQUIRED_FIELDS:
+            return jsonify({"error": f"Unknown field '{field}'"}), 400
+
+    conn = get_connection(DB_FILE)
+    with conn, sales_writer() as shards:
+        conn.execute("BEGIN IMMEDIATE")
+        if shards is None:
+            old_sale = fetch_sale(conn, sale_id)
+        else:
+            month, old_sale = sales_shards.find_sale(sale_id)
+        if old_sale is None:
             return jsonify({"error": "Sale not found"}), 404
 
-        if "quantity" in update_data or "unit_price" in update_data:
-            quantity = update_data.get("quantity", df.at[0, "quantity"])
-            unit_price = update_data.get("unit_price", df.at[0, "unit_price"])
-            update_data["total_price"] = quantity * unit_price
+        # The updated sale must pass the same rules as a new one
+        sale, reason = check_sale({**old_sale, **update_data})
+        if reason:
+            return jsonify({"error": reason}), 400
+        update_data = {field: sale[field] for field in update_data}
 
-        columns = [f"{k}=?" for k in update_data.keys()]
-        values = tuple(update_data.values()) + (sale_id,)
-        cursor.execute(f"UPDATE sales SET {', '.join(columns)} WHERE id=?", values)
-        conn.commit()
+        # Recalculate total_price if quantity/unit_price are updated
+        if "quantity" in update_data or "unit_price" in update_data:
+            update_data["total_price"] = sale["quantity"] * sale["unit_price"]
+
+        if shards is None:
+            columns = [f"{k}=?" for k in update_data.keys()]
+            values = tuple(update_data.values()) + (sale_id,)
+            conn.execute(f"UPDATE sales SET {', '.join(columns)} WHERE id=?", values)
+        else:
+            # A new date in another month moves the sale to that month's shard
+            shards.update(month, old_sale, update_data)
+
+        # Move the sale out of its old rollup buckets and into the new ones
+        apply_sale(conn, old_sale, sign=-1)
+        apply_sale(conn, {**old_sale, **update_data})
+        bump_table_version(conn)
+        log_change(conn, "U", sale_id)
+    response_cache.invalidate_ids(sale_id)
 
     return jsonify({"message": "Sale Updated Successfully", "data": update_data})
 
@@ -148,34 +524,351 @@ def update_sale(sale_id):
 # Delete sale by id
 @app.route("/sales/<int:sale_id>", methods=["DELETE"])
 def delete_sale(sale_id):
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM sales WHERE id=?", (sale_id,))
-        deleted = cursor.rowcount
-        conn.commit()
+    conn = get_connection(DB_FILE)
+    with conn, sales_writer() as shards:
+        conn.execute("BEGIN IMMEDIATE")
+        if shards is None:
+            old_sale = fetch_sale(conn, sale_id)
+        else:
+            month, old_sale = sales_shards.find_sale(sale_id)
+        deleted = 0
+        if old_sale is not None:
+            if shards is None:
+                deleted = conn.execute("DELETE FROM sales WHERE id=?", (sale_id,)).rowcount
+            else:
+                deleted = shards.delete(month, sale_id)
+            apply_sale(conn, old_sale, sign=-1)
+            bump_table_version(conn)
+            log_change(conn, "D", sale_id)
+    response_cache.invalidate_ids(sale_id)
 
     if deleted == 0:
         return jsonify({"error": "Sale not found"}), 404
     return jsonify({"message": "Sale Deleted Successfully"})
 
 
-# Export sales to CSV or Excel
+# Sales summaries (read only the rollup tables)
+SUMMARY_TABLES = {"daily": "sales_daily", "products": "sales_by_product", "customers": "sales_by_customer"}
+SUMMARY_ORDER = {"revenue": "revenue_cents", "quantity": "quantity", "orders": "orders"}
+
+
+def summary_rows(cursor):
+    columns = [col[0] for col in cursor.description]
+    rows = []
+    for row in cursor.fetchall():
+        record = dict(zip(columns, row))
+        record["revenue"] = record.pop("revenue_cents") / 100
+        rows.append(record)
+    return rows
+
+
+@app.route("/sales/summary", methods=["GET"])
+def get_sales_summary():
+    cursor = get_connection(DB_FILE).execute(
+        "SELECT COALESCE(SUM(revenue_cents), 0) AS revenue_cents, COALESCE(SUM(quantity), 0) AS quantity, "
+        "COALESCE(SUM(orders), 0) AS orders, MIN(day) AS first_day, MAX(day) AS last_day FROM sales_daily"
+    )
+    return jsonify(summary_rows(cursor)[0])
+
+
+@app.route("/sales/summary/<string:dimension>", methods=["GET"])
+def get_sales_summary_by(dimension):
+    table = SUMMARY_TABLES.get(dimension)
+    if table is None:
+        return jsonify({"error": f"Invalid summary. Use one of: {', '.join(SUMMARY_TABLES)}"}), 400
+    key = ROLLUPS[table][0]
+
+    where = []
+    params = []
+    if dimension == "daily":
+        if request.args.get("date_from"):
+            where.append("day >= ?")
+            params.append(request.args["date_from"][:10])
+        if request.args.get("date_to"):
+            where.append("day <= ?")
+            params.append(request.args["date_to"][:10])
+        order = key
+    else:
+        order = SUMMARY_ORDER.get(request.args.get("order", "revenue"))
+        if order is None:
+            return jsonify({"error": f"Invalid order. Use one of: {', '.join(SUMMARY_ORDER)}"}), 400
+        order += " DESC"
+
+    sql = f"SELECT {key}, revenue_cents, quantity, orders FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order}"
+    limit = request.args.get("limit", type=int)
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return jsonify(summary_rows(get_connection(DB_FILE).execute(sql, params)))
+
+
+# Columnar exports & analytics
+COLUMNAR_MIMETYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.stream"}
+
+
+def columnar_export(fmt):
+    # Stream Arrow record batches; read from the Parquet store while it is current, else from
+    # SQLite, so csv and parquet exports of the same table always agree
+    import sales_columnar
+
+    if not sales_columnar.available():
+        return jsonify({"error": "Columnar exports need pyarrow installed on the server"}), 501
+
+    fields = request.args.get("fields")
+    columns = [f.strip().lower() for f in fields.split(",")] if fields else list(SALES_COLUMNS)
+    unknown = [c for c in columns if c not in SALES_COLUMNS]
+    if unknown:
+        return jsonify({"error": f"Unknown field(s): {', '.join(unknown)}"}), 400
+    date_from = request.args.get("date_from")
+    date_to = request.args.get("date_to")
+
+    if PARQUET_DIR and sales_columnar.store_current(get_connection(DB_FILE), PARQUET_DIR):
+        scanner = sales_columnar.scanner(PARQUET_DIR, columns, date_from, date_to)
+        schema, batches = scanner.projected_schema, scanner.to_batches()
+    else:
+        args = {k: v for k, v in request.args.items() if k in ("date_from", "date_to")}
+        args["fields"] = ",".join(columns)
+        sql, params, _ = build_sales_query(ImmutableMultiDict(args), paginate=False)
+        cursor = read_sales(sql, params, shard_filters(args))
+        schema = sales_columnar.sales_schema([col[0] for col in cursor.description])
+        batches = sales_columnar.sqlite_batches(cursor)
+
+    encode = sales_columnar.iter_arrow_stream if fmt == "arrow" else sales_columnar.iter_parquet_stream
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    response = Response(encode(schema, batches), mimetype=COLUMNAR_MIMETYPES[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename=sales_export_{timestamp}.{fmt}"
+    return response
+
+
+@app.route("/sales/analytics/revenue", methods=["GET"])
+def get_revenue_analytics():
+    # Ad-hoc date-range aggregates over the Parquet store (rollups only cover all-time totals)
+    import sales_columnar
+
+    group = request.args.get("by", "day")
+    if group not in ("day", "product", "customer_id"):
+        return jsonify({"error": "Invalid 'by'. Use day, product or customer_id"}), 400
+    if not sales_columnar.available() or not PARQUET_DIR or not sales_columnar.store_exists(PARQUET_DIR):
+        return jsonify({"error": "Columnar store not enabled (set SALES_PARQUET_DIR and install pyarrow)"}), 501
+    if not sales_columnar.store_in_sync(get_connection(DB_FILE)):
+        return jsonify({"error": "Columnar store is behind sales.db (API writes or upsert updates since it was "
+                                 "built); run a full reload with a parquet dir to rebuild it"}), 409
+    return jsonify(sales_columnar.revenue_by(
+        group, PARQUET_DIR, request.args.get("date_from"), request.args.get("date_to")))
+
+
+# Background export jobs: csv, ndjson and excel files are written by a worker pool
+# (sales_exports.py) instead of inside the request
+def export_job_payload(job):
+    import sales_exports
+
+    payload = sales_exports.describe(job)
+    payload["status_url"] = f"/sales/export/{job['id']}"
+    return payload
+
+
+def queue_export(fmt, options):
+    import sales_exports
+
+    compress = str(options.pop("gzip", "")).lower() in ("1", "true", "yes")
+    if compress and not sales_exports.FORMATS[fmt][2]:
+        return jsonify({"error": f"'{fmt}' files are already compressed, gzip is not supported"}), 400
+    try:
+        sql, params, limit = build_sales_query(ImmutableMultiDict(options), paginate=False)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job, created = sales_exports.submit_export(fmt, sql, params, compress, DB_FILE, shard_filters(options, limit))
+    # 202 for a new job; 200 when an identical export of this table version already exists
+    return jsonify(export_job_payload(job)), 202 if created else 200
+
+
+@app.route("/sales/export", methods=["POST"])
+def start_export():
+    # Options (format, gzip and the GET /sales filters) come from the query string or a JSON body
+    import sales_exports
+
+    body = request.get_json(silent=True)
+    options = {**request.args.to_dict(), **(body if isinstance(body, dict) else {})}
+    fmt = str(options.pop("format", "csv")).lower()
+    if fmt not in sales_exports.FORMATS:
+        return jsonify({"error": "Invalid format. Use 'csv', 'ndjson' or 'excel'"}), 400
+    return queue_export(fmt, {k: str(v) for k, v in options.items()})
+
+
+def export_job_response(job_id):
+    # Progress while the job runs, the file once it is done (?status=1 always returns JSON)
+    import sales_exports
+
+    job = sales_exports.get_job(job_id, DB_FILE)
+    if job is None:
+        return jsonify({"error": "Export job not found"}), 404
+    payload = export_job_payload(job)
+    if job["status"] == "done" and not request.args.get("status"):
+        if not os.path.exists(job["path"]):
+            return jsonify({**payload, "error": "Export file was removed, request the export again"}), 410
+        mimetype = "application/gzip" if job["gzip"] else sales_exports.FORMATS[job["format"]][1]
+        return send_file(os.path.abspath(job["path"]), mimetype=mimetype, as_attachment=True,
+                         download_name=payload["filename"])
+    if job["status"] in sales_exports.PENDING:
+        response = jsonify(payload)
+        response.status_code = 202
+        response.headers["Retry-After"] = "1"
+        return response
+    if job["status"] == "expired":
+        return jsonify({**payload, "error": "The table changed since this export, request it again"}), 410
+    return jsonify(payload), 500 if job["status"] == "failed" else 200
+
+
+# Export sales
+# ndjson is always streamed back; csv is streamed when asked for via Accept/format/?stream=1;
+# parquet and arrow stream record batches. Other csv and excel exports become background
+# jobs; any other value is looked up as an export job id.
 @app.route("/sales/export/<string:format>", methods=["GET"])
 def export_sales(format):
-    with sqlite3.connect(DB_FILE) as conn:
-        df = pd.read_sql("SELECT * FROM sales", conn)
-
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    if format.lower() == "csv":
-        filename = f"sales_export_{timestamp}.csv"
-        df.to_csv(filename, index=False)
-        return jsonify({"message": f"Exported to {filename}"})
-    elif format.lower() == "excel":
-        filename = f"sales_export_{timestamp}.xlsx"
-        df.to_excel(filename, index=False)
-        return jsonify({"message": f"Exported to {filename}"})
-    else:
-        return jsonify({"error": "Invalid format. Use 'csv' or 'excel'"}), 400
+    fmt = format.lower()
+    if fmt in COLUMNAR_MIMETYPES:
+        return columnar_export(fmt)
+    if fmt == "ndjson" or (fmt == "csv" and (requested_stream_format() or request.args.get("stream"))):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        return stream_response("SELECT * FROM sales ORDER BY id", [], fmt,
+                               filename=f"sales_export_{timestamp}.{fmt}")
+    if fmt in ("csv", "excel"):
+        return queue_export(fmt, request.args.to_dict())
+    if len(format) == 32:
+        return export_job_response(format)
+    return jsonify({"error": "Invalid format. Use 'csv', 'ndjson', 'excel', 'parquet' or 'arrow'"}), 400
+
+
+# Change feed (see sales_changes.py)
+# GET /sales/changes?since=<seq> streams NDJSON, one line per changed sale, for up to
+# limit change log entries after since. X-Next-Since is the since for the next call and
+# X-Head-Seq the newest seq; a since older than the retention horizon gets 410, and the
+# replica has to resync from GET /sales.
+CHANGES_PAGE_SIZE = 1000
+MAX_CHANGES_PAGE_SIZE = 10000
+
+
+def iter_encoded_changes(conn, entries):
+    try:
+        batch = []
+        read = sales_shards.execute if sales_shards.enabled() else None
+        for change in iter_change_rows(conn, entries, read):
+            batch.append(dumps_bytes(change))
+            if len(batch) == STREAM_BATCH_SIZE:
+                yield b"\n".join(batch) + b"\n"
+                batch = []
+        if batch:
+            yield b"\n".join(batch) + b"\n"
+    finally:
+        conn.close()
+
+
+@app.route("/sales/changes", methods=["GET"])
+def get_changes():
+    try:
+        since = int(request.args.get("since", 0))
+        limit = int(request.args.get("limit", CHANGES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "'since' and 'limit' must be integers"}), 400
+    if since < 0 or not 1 <= limit <= MAX_CHANGES_PAGE_SIZE:
+        return jsonify({"error": f"'since' must be >= 0 and 'limit' between 1 and {MAX_CHANGES_PAGE_SIZE}"}), 400
+
+    # Own connection in one read transaction: the entries and the rows they are joined
+    # with come from the same snapshot while the body streams
+    conn = connect(DB_FILE)
+    try:
+        conn.execute("BEGIN")
+        head, oldest = head_seq(conn), horizon(conn)
+        if since < oldest or since > head:
+            conn.close()
+            return jsonify({"error": "Changes since this seq are no longer available, resync from /sales",
+                            "since": since, "horizon": oldest, "head": head}), 410
+        entries = read_changes(conn, since, limit)
+    except Exception:
+        conn.close()
+        raise
+
+    response = Response(iter_encoded_changes(conn, entries), mimetype="application/x-ndjson")
+    response.headers["X-Next-Since"] = str(entries[-1][0] if entries else since)
+    response.headers["X-Head-Seq"] = str(head)
+    return response
+
+
+# Admin: ingest
+# One load at a time per process, in a background thread; the load itself takes the
+# database write lock, so loads started in different workers run one after another.
+# With SALES_ADMIN_TOKEN set the X-Admin-Token header must match, otherwise only local
+# callers are allowed.
+ADMIN_TOKEN = os.environ.get("SALES_ADMIN_TOKEN")
+ingest_state = {"status": "idle"}
+ingest_lock = threading.Lock()
+
+
+def admin_allowed():
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN)
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+
+def ingest_worker(source, mode, key):
+    try:
+        rows = run_ingest(source, mode, key)
+        update = {"status": "done", "rows": rows}
+    except Exception as e:
+        update = {"status": "failed", "error": str(e)}
+    with ingest_lock:
+        ingest_state.update(update, finished_at=datetime.datetime.now().isoformat(timespec="seconds"))
+
+
+@app.route("/admin/ingest", methods=["POST"])
+def start_ingest():
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    body = request.get_json(silent=True) or {}
+    source = body.get("source") or SALES_SOURCE
+    mode = body.get("mode") or LOAD_MODE
+    key = body.get("key") or UPSERT_KEY
+    if mode not in LOAD_MODES:
+        return jsonify({"error": "Invalid mode. Use 'incremental', 'replace' or 'upsert'"}), 400
+
+    with ingest_lock:
+        if ingest_state["status"] == "running":
+            return jsonify(ingest_state), 409
+        ingest_state.clear()
+        ingest_state.update(status="running", source=source, mode=mode, key=key if mode == "upsert" else None,
+                            started_at=datetime.datetime.now().isoformat(timespec="seconds"))
+        state = dict(ingest_state)
+    threading.Thread(target=ingest_worker, args=(source, mode, key), daemon=True).start()
+    return jsonify(state), 202
+
+
+@app.route("/admin/ingest", methods=["GET"])
+def get_ingest_status():
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    with ingest_lock:
+        return jsonify(dict(ingest_state))
+
+
+# Drop superseded and expired change log entries (ETL loads also compact when they finish)
+@app.route("/admin/changes/compact", methods=["POST"])
+def compact_change_log():
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    body = request.get_json(silent=True) or {}
+    try:
+        retention_days = float(body.get("retention_days", RETENTION_DAYS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'retention_days' must be a number"}), 400
+    conn = get_connection(DB_FILE)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        result = compact_changes(conn, retention_days)
+        result["head"] = head_seq(conn)
+    return jsonify(result)
 
 
 # ------------------ #
@@ -0,0 +1,38 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sales_db import close_connection  # noqa: E402
+
+SALES_CSV = """date,customer_id,product,quantity,unit_price
+2024-01-05,1,Laptop,1,900
+2024-01-06,2,Desk,2,150.5
+2024-02-01,3,Radio,3,20
+"""
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Every module uses the relative sales.db / sales.csv, so each test runs in its own directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sales.csv").write_text(SALES_CSV, encoding="utf-8")
+    yield tmp_path
+    close_connection("sales.db")
+
+
+@pytest.fixture
+def api(workdir):
+    module = importlib.import_module("server-sideAPI")
+    module._schema_ready = False
+    module.response_cache.clear()
+    module.run_ingest()
+    return module
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from sales_etl import load_sales
+from sales_transform import transform_chunk
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VALID = {"date": "2024-03-01", "customer_id": 7, "product": "Phone", "quantity": 2, "unit_price": 10}
+
+INVALID = [
+    ({"quantity": "-4"}, "invalid quantity"),
+    ({"quantity": 0}, "invalid quantity"),
+    ({"quantity": 1.5}, "invalid quantity"),
+    ({"customer_id": 7.5}, "invalid customer_id"),
+    ({"unit_price": -1}, "invalid unit_price"),
+    ({"unit_price": "abc"}, "invalid unit_price"),
+    ({"date": "not-a-date"}, "invalid date"),
+    ({"product": "   "}, "missing product"),
+    ({"customer_id": None}, "missing customer_id"),
+    ({"unit_price": "inf"}, "invalid unit_price"),
+]
+
+
+@pytest.mark.parametrize("change, reason", INVALID)
+def test_batch_rejects_what_the_etl_rejects(client, change, reason):
+    sale = {**VALID, **change}
+    _, rejects = transform_chunk(pd.DataFrame([{k: None if v is None else str(v) for k, v in sale.items()}]))
+    assert list(rejects["reason"]) == [reason]
+
+    response = client.post("/sales/batch", json=[VALID, sale])
+    body = response.get_json()
+    assert response.status_code == 201
+    assert body["inserted"] == 1
+    assert body["errors"] == [{"row": 1, "error": reason}]
+
+
+@pytest.mark.parametrize("change, reason", INVALID)
+def test_single_row_writes_reject_what_the_batch_rejects(client, change, reason):
+    response = client.post("/sales", json={**VALID, **change})
+    assert response.status_code == 400 and response.get_json()["error"] == reason
+    response = client.put("/sales/1", json=change)
+    assert response.status_code == 400 and response.get_json()["error"] == reason
+    assert client.get("/sales/1").get_json()[0]["quantity"] == 1
+
+
+def test_single_row_writes_accept_numeric_strings(client):
+    response = client.post("/sales", json={**VALID, "quantity": "3", "unit_price": "2.5", "product": " Pen "})
+    assert response.status_code == 201
+    assert response.get_json()["data"]["product"] == "Pen"
+    assert response.get_json()["data"]["total_price"] == 7.5
+    response = client.put("/sales/1", json={"quantity": "2"})
+    assert response.status_code == 200 and response.get_json()["data"]["total_price"] == 1800
+    assert client.put("/sales/1", json={"id": 5}).status_code == 400
+
+
+def test_rejected_rows_are_not_stored(client):
+    client.post("/sales/batch", json=[{**VALID, "quantity": "-4"}])
+    totals = [s["total_price"] for s in client.get("/sales?limit=100").get_json()["data"]]
+    assert all(total >= 0 for total in totals)
+
+
+def test_batch_of_only_invalid_rows_is_a_400(client):
+    response = client.post("/sales/batch", json=[{**VALID, "quantity": "-4"}, {"date": "2024-01-01"}])
+    assert response.status_code == 400
+    assert [e["row"] for e in response.get_json()["errors"]] == [0, 1]
+
+
+def test_batch_route_does_not_import_the_etl_or_columnar_store(workdir):
+    # Fresh interpreter: the first batch should pay for pandas only, not the ETL module or
+    # the columnar store (pandas itself may load pyarrow for its string dtype)
+    load_sales("sales.csv")
+    code = ("import importlib, sys; api = importlib.import_module('server-sideAPI'); "
+            "r = api.app.test_client().post('/sales/batch', json=[{'date': '2024-03-01', 'customer_id': 1, "
+            "'product': 'Pen', 'quantity': 1, 'unit_price': 2}]); "
+            "print(r.status_code, 'sales_columnar' in sys.modules, 'sales_etl' in sys.modules)")
+    env = {k: v for k, v in os.environ.items() if k != "SALES_PARQUET_DIR"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True,
+                            env={**env, "PYTHONPATH": APP_DIR})
+    assert result.stdout.split()[-3:] == ["201", "False", "False"]
+
+
+def test_single_row_write_does_not_import_pandas(workdir):
+    load_sales("sales.csv")
+    code = ("import importlib, sys; api = importlib.import_module('server-sideAPI'); "
+            "r = api.app.test_client().post('/sales', json={'date': '2024-03-01', 'customer_id': 1, "
+            "'product': 'Pen', 'quantity': 1, 'unit_price': 2}); "
+            "print(r.status_code, 'pandas' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True,
+                            env={**os.environ, "PYTHONPATH": APP_DIR})
+    assert result.stdout.split()[-2:] == ["201", "False"]
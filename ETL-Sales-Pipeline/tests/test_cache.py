@@ -0,0 +1,60 @@
+from sales_changes import log_change
+from sales_db import connect, bump_table_version
+
+SALE = {"date": "2024-03-01", "customer_id": 4, "product": "Lamp", "quantity": 1, "unit_price": 30}
+
+
+def write_from_other_worker(sql, params, op, sale_id):
+    # A separate connection stands in for another gunicorn worker; its cache is not ours
+    conn = connect("sales.db")
+    with conn:
+        conn.execute(sql, params)
+        bump_table_version(conn)
+        log_change(conn, op, sale_id)
+    conn.close()
+
+
+def test_write_by_another_worker_is_not_served_from_cache(client):
+    assert client.get("/sales/1").get_json()[0]["quantity"] == 1
+    etag = client.get("/sales/1").headers["ETag"]
+
+    write_from_other_worker("UPDATE sales SET quantity=5 WHERE id=?", (1,), "U", 1)
+
+    response = client.get("/sales/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]["quantity"] == 5
+
+
+def test_page_is_rebuilt_after_another_worker_deletes(client):
+    assert len(client.get("/sales?limit=10").get_json()["data"]) == 3
+    write_from_other_worker("DELETE FROM sales WHERE id=?", (2,), "D", 2)
+    assert [s["id"] for s in client.get("/sales?limit=10").get_json()["data"]] == [1, 3]
+
+
+def test_unchanged_table_is_a_cache_hit(api, client):
+    client.get("/sales/1")
+    hits = api.response_cache.hits
+    client.get("/sales/1")
+    assert api.response_cache.hits == hits + 1
+
+
+def test_write_to_another_id_keeps_the_entry(api, client):
+    client.get("/sales/1")
+    client.get("/sales/2")
+    client.get("/sales?limit=10")
+    created = client.post("/sales", json=SALE).get_json()["data"]["id"]
+    write_from_other_worker("UPDATE sales SET quantity=9 WHERE id=?", (2,), "U", 2)
+
+    hits = api.response_cache.hits
+    assert client.get("/sales/1").get_json()[0]["quantity"] == 1
+    assert api.response_cache.hits == hits + 1
+    assert client.get("/sales/2").get_json()[0]["quantity"] == 9
+    assert api.response_cache.hits == hits + 1
+    # The open-ended last page covers the new sale
+    assert created in [s["id"] for s in client.get("/sales?limit=10").get_json()["data"]]
+
+
+def test_reset_invalidates_every_entry(api, client):
+    client.get("/sales/1")
+    write_from_other_worker("UPDATE sales SET quantity=7 WHERE id=?", (1,), "R", None)
+    assert client.get("/sales/1").get_json()[0]["quantity"] == 7
@@ -0,0 +1,36 @@
+import json
+
+from sales_changes import compact_changes, head_seq
+from sales_db import connect
+
+SALE = {"date": "2024-03-01", "customer_id": 4, "product": "Lamp", "quantity": 1, "unit_price": 30}
+
+
+def expire_all():
+    conn = connect("sales.db")
+    with conn:
+        conn.execute("UPDATE sales_changes SET changed_at='2000-01-01 00:00:00'")
+        result = compact_changes(conn)
+    conn.close()
+    return result
+
+
+def test_caught_up_replica_survives_full_expiry(client):
+    client.post("/sales", json=SALE)
+    since = int(client.get("/sales/changes?since=0").headers["X-Next-Since"])
+
+    result = expire_all()
+    assert result["horizon"] == since and result["expired"] >= 1
+
+    response = client.get(f"/sales/changes?since={since}")
+    assert response.status_code == 200 and response.data == b""
+    assert response.headers["X-Head-Seq"] == str(since)
+    assert client.get(f"/sales/changes?since={since - 1}").status_code == 410
+
+    # New writes continue after the expired seqs
+    client.post("/sales", json=SALE)
+    feed = [json.loads(line) for line in client.get(f"/sales/changes?since={since}").data.splitlines()]
+    assert [(c["seq"], c["op"]) for c in feed] == [(since + 1, "insert")]
+    conn = connect("sales.db")
+    assert head_seq(conn) == since + 1
+    conn.close()
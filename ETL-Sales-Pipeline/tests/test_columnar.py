@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq  # noqa: E402
+
+
+@pytest.fixture
+def columnar_client(api, monkeypatch):
+    monkeypatch.setattr(api, "PARQUET_DIR", "sales_parquet")
+    api.run_ingest(mode="replace")
+    return api.app.test_client()
+
+
+def parquet_ids(client):
+    table = pq.read_table(io.BytesIO(client.get("/sales/export/parquet").data))
+    return table.column("id").to_pylist()
+
+
+def test_store_answers_while_current(columnar_client):
+    assert parquet_ids(columnar_client) == [1, 2, 3]
+    assert columnar_client.get("/sales/analytics/revenue?by=product").status_code == 200
+
+
+def test_api_write_makes_exports_fall_back_to_sqlite(columnar_client):
+    columnar_client.delete("/sales/2")
+    sale = {"date": "2024-03-01", "customer_id": 4, "product": "Phone", "quantity": 1, "unit_price": 99}
+    new_id = columnar_client.post("/sales", json=sale).get_json()["data"]["id"]
+
+    assert parquet_ids(columnar_client) == [1, 3, new_id]
+    assert columnar_client.get("/sales/analytics/revenue?by=product").status_code == 409
+
+
+def test_full_reload_makes_the_store_current_again(api, columnar_client):
+    columnar_client.delete("/sales/2")
+    api.run_ingest(mode="replace")
+    assert columnar_client.get("/sales/analytics/revenue?by=product").status_code == 200
@@ -0,0 +1,46 @@
+import json
+import sqlite3
+
+from sales_db import connect, ensure_schema
+
+SALE = {"date": "2024-03-01", "customer_id": 4, "product": "Lamp", "quantity": 1, "unit_price": 30}
+
+
+def changes(client, since=0):
+    return [json.loads(line) for line in client.get(f"/sales/changes?since={since}").data.splitlines()]
+
+
+def test_deleted_highest_id_is_not_reused(client):
+    deleted = client.post("/sales", json=SALE).get_json()["data"]["id"]
+    assert client.delete(f"/sales/{deleted}").status_code == 200
+    since = changes(client)[-1]["seq"]
+
+    created = client.post("/sales", json=dict(SALE, product="Chair")).get_json()["data"]["id"]
+    assert created > deleted
+    batch = client.post("/sales/batch", json=[SALE]).get_json()
+    assert batch["inserted"] == 1 and batch["first_id"] > created
+
+    # The old insert entry no longer resolves to a row; the new sale only shows up under its own id
+    feed = changes(client)
+    assert not [c for c in feed if c["op"] != "delete" and c.get("id") == deleted]
+    assert [c["data"]["product"] for c in changes(client, since) if c["op"] == "insert"] == ["Chair", "Lamp"]
+
+
+def test_existing_table_is_migrated_without_losing_ids(workdir):
+    conn = sqlite3.connect("sales.db")
+    conn.execute("CREATE TABLE sales (id INTEGER PRIMARY KEY, date TEXT, customer_id INTEGER, product TEXT, "
+                 "quantity INTEGER, unit_price REAL, total_price REAL)")
+    conn.executemany("INSERT INTO sales VALUES (?, '2024-01-01', 1, 'Pen', 1, 2.0, 2.0)", [(1,), (7,)])
+    conn.commit()
+    conn.close()
+
+    conn = connect("sales.db")
+    with conn:
+        ensure_schema(conn)
+    assert [r[0] for r in conn.execute("SELECT id FROM sales")] == [1, 7]
+    with conn:
+        conn.execute("DELETE FROM sales WHERE id=7")
+        conn.execute("INSERT INTO sales (date, customer_id, product, quantity, unit_price, total_price) "
+                     "VALUES ('2024-01-02', 1, 'Pen', 1, 2.0, 2.0)")
+    assert conn.execute("SELECT MAX(id) FROM sales").fetchone()[0] == 8
+    conn.close()
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+from sales_db import connect, ensure_schema
+from sales_rollups import apply_sale
+
+SALE = {"date": "2024-03-01", "customer_id": 4, "product": "Lamp", "quantity": 1, "unit_price": 5}
+
+
+def customers(client):
+    return {c["customer_id"]: (c["orders"], c["revenue"]) for c in client.get("/sales/summary/customers").get_json()}
+
+
+def test_null_customer_is_rejected_before_the_rollup(client):
+    before = customers(client)
+    assert client.post("/sales", json=dict(SALE, customer_id=None)).status_code == 400
+    assert client.put("/sales/1", json={"customer_id": None}).status_code == 400
+    assert customers(client) == before
+
+
+def test_non_integer_customer_key_does_not_alias_the_rowid(client):
+    conn = connect("sales.db")
+    with conn:
+        apply_sale(conn, dict(SALE, customer_id=7.5, total_price=5))
+    assert customers(client)[7.5] == (1, 5.0)
+    with conn:
+        apply_sale(conn, dict(SALE, customer_id=7.5, total_price=5), sign=-1)
+        with pytest.raises(ValueError):
+            apply_sale(conn, dict(SALE, customer_id=None, total_price=5))
+    conn.close()
+    assert 7.5 not in customers(client) and set(customers(client)) == {1, 2, 3}
+
+
+def test_rowid_rollups_are_migrated(workdir):
+    conn = sqlite3.connect("sales.db")
+    conn.execute("CREATE TABLE sales (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, customer_id INTEGER, "
+                 "product TEXT, quantity INTEGER, unit_price REAL, total_price REAL)")
+    conn.execute("INSERT INTO sales VALUES (1, '2024-01-01', 9, 'Pen', 2, 1.5, 3.0)")
+    conn.execute("CREATE TABLE sales_by_customer (customer_id INTEGER PRIMARY KEY, revenue_cents INTEGER NOT NULL "
+                 "DEFAULT 0, quantity INTEGER NOT NULL DEFAULT 0, orders INTEGER NOT NULL DEFAULT 0)")
+    conn.execute("INSERT INTO sales_by_customer VALUES (10, -500, -1, -1)")  # phantom from a NULL key
+    conn.commit()
+    conn.close()
+
+    conn = connect("sales.db")
+    with conn:
+        ensure_schema(conn)
+    assert conn.execute("SELECT * FROM sales_by_customer").fetchall() == [(9, 300, 2, 1)]
+    assert "WITHOUT ROWID" in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name='sales_by_customer'").fetchone()[0]
+    conn.close()
@@ -0,0 +1,21 @@
+import json
+
+from sales_db import connect
+
+
+def strict_loads(line):
+    def reject(constant):
+        raise ValueError(f"non-standard JSON constant {constant}")
+    return json.loads(line, parse_constant=reject)
+
+
+def test_ndjson_export_writes_non_finite_floats_as_null(client):
+    conn = connect("sales.db")
+    with conn:
+        conn.execute("UPDATE sales SET total_price=? WHERE id=2", (float("inf"),))
+    conn.close()
+
+    response = client.get("/sales/export/ndjson")
+    rows = [strict_loads(line) for line in response.data.splitlines()]
+    assert [r["id"] for r in rows] == [1, 2, 3]
+    assert rows[1]["total_price"] is None and rows[0]["total_price"] == 900
@@ -0,0 +1,53 @@
+import sqlite3
+
+from sales_etl import load_sales
+
+SALE = {"date": "2024-03-01", "customer_id": 4, "product": "Lamp", "quantity": 1, "unit_price": 30}
+
+
+def products(db_file="sales.db"):
+    conn = sqlite3.connect(db_file)
+    try:
+        return sorted(r[0] for r in conn.execute("SELECT product FROM sales"))
+    finally:
+        conn.close()
+
+
+def test_moved_source_is_appended_and_keeps_api_rows(workdir, client):
+    assert client.post("/sales", json=SALE).status_code == 201
+    (workdir / "incoming").mkdir()
+    (workdir / "sales.csv").rename(workdir / "incoming" / "sales.csv")
+
+    assert load_sales("incoming/sales.csv") == 3
+    assert products() == ["Desk", "Desk", "Lamp", "Laptop", "Laptop", "Radio", "Radio"]
+    assert load_sales("incoming/sales.csv") == 0
+
+
+def test_full_reload_replaces_and_clears_watermarks(workdir, client):
+    assert client.post("/sales", json=SALE).status_code == 201
+    (workdir / "other.csv").write_text("date,customer_id,product,quantity,unit_price\n"
+                                       "2024-04-01,5,Pen,1,2\n", encoding="utf-8")
+    load_sales("other.csv")
+
+    assert load_sales("sales.csv", mode="replace") == 3
+    assert products() == ["Desk", "Laptop", "Radio"]
+    conn = sqlite3.connect("sales.db")
+    assert [r[0] for r in conn.execute("SELECT source FROM etl_watermark")] == [str(workdir / "sales.csv")]
+    conn.close()
+    # other.csv lost its rows with the replace; without a watermark it is loaded again
+    assert load_sales("other.csv") == 1
+
+
+def test_rewritten_source_keeps_back_dated_rows(workdir, client):
+    assert client.post("/sales", json=SALE).status_code == 201
+    (workdir / "sales.csv").write_text(
+        "date,customer_id,product,quantity,unit_price\n"
+        "2024-01-05,1,Laptop,1,900\n"
+        "2024-01-06,2,Desk,2,150.5\n"
+        "2024-01-07,5,Mug,1,4\n"
+        "2024-01-08,6,Hat,1,12\n"
+        "2024-02-01,3,Radio,3,20\n", encoding="utf-8")
+
+    assert load_sales("sales.csv") == 2
+    assert products() == ["Desk", "Hat", "Lamp", "Laptop", "Mug", "Radio"]
+    assert load_sales("sales.csv") == 0